@@ -0,0 +1,56 @@
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from app.utils.embeddings import EMBEDDING_BATCH_SIZE, EmbeddingService
+
+
+def synthetic_sentences(count: int, seed: int):
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(300)] + ["the", "of", "and", "a", "process", "energy", "system"]
+    return [
+        " ".join(rng.choice(vocabulary) for _ in range(rng.randint(8, 25))).capitalize() + "."
+        for _ in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Measure embedding throughput: one text per call, concurrent micro-batched calls, and cache hits"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sentences', type=int, default=512, help="Sentences encoded per run")
+        parser.add_argument('--clients', type=int, default=16, help="Concurrent callers in the micro-batched run")
+        parser.add_argument('--batch-size', type=int, default=EMBEDDING_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count, clients = options['sentences'], options['clients']
+        # Cache disabled, so every run measures the model
+        service = EmbeddingService(capacity=0, batch_size=options['batch_size'])
+        service.encode(["Warm-up sentence."])
+
+        sentences = synthetic_sentences(count, seed=1)
+        started = time.perf_counter()
+        for sentence in sentences:
+            service.model.encode([sentence], show_progress_bar=False)
+        self.report("one sentence per model call", count, time.perf_counter() - started)
+
+        sentences = synthetic_sentences(count, seed=2)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            list(executor.map(lambda sentence: service.encode([sentence]), sentences))
+        stats = service.stats()
+        self.report(f"{clients} concurrent callers, micro-batched", count, time.perf_counter() - started,
+                    f" (mean batch {stats['mean_batch_size']})")
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cached = EmbeddingService(cache_dir=cache_dir, batch_size=options['batch_size'])
+            sentences = synthetic_sentences(count, seed=3)
+            cached.encode(sentences)
+            started = time.perf_counter()
+            cached.encode(sentences)
+            self.report("from the vector cache", count, time.perf_counter() - started)
+            cached.close()
+
+    def report(self, label: str, count: int, seconds: float, extra: str = ""):
+        self.stdout.write(f"{label:>40}: {count / seconds:,.0f} sentences/s{extra}")
@@ -0,0 +1,100 @@
+import random
+from django.core.management.base import BaseCommand
+from app.utils.batching import SUMMARY_BATCH_TOKENS, BatchPacker, count_tokens
+from app.utils.sections import DocumentSection
+from app.utils.summarize import DocumentSectioner
+
+
+def legacy_batches(sections, max_batch_size=12000):
+    """The character-count packer this command benchmarks against"""
+    batches = []
+    current_batch = []
+    current_size = 0
+    for section in sections:
+        section_text = f"## {section.title}\n{section.content}"
+        section_size = len(section_text)
+        if section_size > max_batch_size:
+            if current_batch:
+                batches.append("\n\n".join(current_batch))
+                current_batch = []
+                current_size = 0
+            current_chunk = []
+            current_chunk_size = 0
+            for word in section_text.split():
+                word_size = len(word) + 1
+                if current_chunk_size + word_size > max_batch_size // 2 and current_chunk:
+                    batches.append(f"## {section.title} (Part {len(batches) + 1})\n" + " ".join(current_chunk))
+                    current_chunk = [word]
+                    current_chunk_size = word_size
+                else:
+                    current_chunk.append(word)
+                    current_chunk_size += word_size
+            if current_chunk:
+                batches.append(f"## {section.title} (Part {len(batches) + 1})\n" + " ".join(current_chunk))
+        elif current_size + section_size <= max_batch_size:
+            current_batch.append(section_text)
+            current_size += section_size
+        else:
+            batches.append("\n\n".join(current_batch))
+            current_batch = [section_text]
+            current_size = section_size
+    if current_batch:
+        batches.append("\n\n".join(current_batch))
+    return batches
+
+
+def synthetic_document(kind: str, seed: int):
+    """Sections shaped like a slide deck, lecture notes or a textbook chapter"""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(300)] + ["the", "of", "and", "a", "process", "energy", "system"]
+
+    def sentences(count):
+        return " ".join(
+            " ".join(rng.choice(vocabulary) for _ in range(rng.randint(8, 25))).capitalize() + "."
+            for _ in range(count)
+        )
+
+    shapes = {
+        'slides': (120, lambda: sentences(rng.randint(1, 6))),
+        'notes': (40, lambda: sentences(rng.randint(10, 80))),
+        'textbook': (12, lambda: sentences(rng.randint(150, 600))),
+    }
+    count, body = shapes[kind]
+    return [DocumentSection(title=f"{kind.title()} section {i + 1}", content=body()) for i in range(count)]
+
+
+class Command(BaseCommand):
+    help = "Compare batch count and prompt fill of the character packer and the token packer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="Documents to use instead of the synthetic corpus")
+        parser.add_argument('--budget', type=int, default=SUMMARY_BATCH_TOKENS, help="Token budget per batch")
+
+    def handle(self, *args, **options):
+        budget = options['budget']
+        if options['paths']:
+            sectioner = DocumentSectioner()
+            corpus = [(path, sectioner.extract_document_sections(path).sections) for path in options['paths']]
+        else:
+            corpus = [(f"synthetic {kind}", synthetic_document(kind, seed))
+                      for seed, kind in enumerate(('slides', 'notes', 'textbook'))]
+
+        # The character packer gets the same budget, converted at its own 4 characters per token
+        totals = {'chars': [0, 0], 'tokens': [0, 0]}
+        for name, sections in corpus:
+            legacy = [count_tokens(batch) for batch in legacy_batches(sections, budget * 4)]
+            plan = BatchPacker(budget).pack(sections)
+            for key, tokens in (('chars', legacy), ('tokens', plan.tokens)):
+                totals[key][0] += len(tokens)
+                totals[key][1] += sum(tokens)
+            legacy_fill = sum(legacy) / (len(legacy) * budget) if legacy else 0.0
+            self.stdout.write(
+                f"{name}: {len(sections)} sections, "
+                f"character packer {len(legacy)} batches ({legacy_fill:.0%} full, largest {max(legacy, default=0)} tokens), "
+                f"token packer {len(plan.batches)} batches ({plan.fill_ratio:.0%} full, largest {max(plan.tokens, default=0)} tokens)"
+            )
+
+        for key, label in (('chars', "character packer"), ('tokens', "token packer")):
+            batches, tokens = totals[key]
+            fill = tokens / (batches * budget) if batches else 0.0
+            self.stdout.write(f"{label:>16}: {batches} batches in total, {fill:.0%} of the {budget}-token budget used")
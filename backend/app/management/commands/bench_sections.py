@@ -0,0 +1,71 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from app.utils.sections import DocumentSection, SectionTable
+
+
+def synthetic_sections(count: int, seed: int = 13):
+    """Slide-deck-like document: mostly tiny "header" sections with some long ones"""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(500)]
+    sections = []
+    for i in range(count):
+        words = rng.randint(1, 12) if rng.random() < 0.7 else rng.randint(40, 400)
+        sections.append(DocumentSection(
+            title=f"Heading {i}",
+            content=" ".join(rng.choice(vocabulary) for _ in range(words)),
+            depth=rng.randint(1, 3)
+        ))
+    return sections
+
+
+def legacy_pipeline(sections):
+    """The list-based merge, scoring and selection this command benchmarks against"""
+    sections = [DocumentSection(s.title, s.content, s.importance, s.depth) for s in sections]
+    i = 0
+    while i < len(sections) - 1:
+        if len(sections[i].content.split()) < 30:
+            sections[i+1].content = f"{sections[i].title}:\n{sections[i].content}\n\n{sections[i+1].content}"
+            sections.pop(i)
+        else:
+            i += 1
+
+    for i, section in enumerate(sections):
+        position_weight = max(1.0, 1.5 - (i / len(sections)))
+        length_weight = min(1.5, max(0.5, len(section.content.split()) / 500))
+        title_weight = 1.5 if any(k in section.title.lower() for k in ['introduction', 'conclusion', 'summary']) else 1.0
+        depth_weight = 1.5 / max(1, section.depth)
+        section.importance = position_weight * length_weight * title_weight * depth_weight
+
+    sections.sort(key=lambda x: x.importance, reverse=True)
+    selected = sections[:max(3, int(len(sections) * 0.8))]
+    selected.sort(key=lambda x: sections.index(x))
+    return selected
+
+
+def table_pipeline(sections):
+    table = SectionTable.from_sections(sections).merge_small(30).score()
+    return table.to_sections(table.top_indices(0.8, minimum=3))
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark section merge, scoring and top-k selection on a synthetic document"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sections', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        sections = synthetic_sections(options['sections'])
+        self.stdout.write(f"Synthetic document: {len(sections)} sections")
+
+        for name, pipeline in (("list (legacy)", legacy_pipeline), ("SectionTable", table_pipeline)):
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                selected = pipeline(sections)
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(
+                f"{name:>14}: best {min(timings) * 1000:8.1f} ms, "
+                f"mean {sum(timings) / len(timings) * 1000:8.1f} ms, {len(selected)} sections selected"
+            )
@@ -0,0 +1,55 @@
+import io
+import docx
+from docx.oxml import parse_xml
+from django.test import SimpleTestCase
+from app.utils.ooxml import iter_docx_paragraphs
+
+W = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+TEXT_BOX_RUN = f"""
+<w:r xmlns:w="{W}"
+     xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"
+     xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape"
+     xmlns:v="urn:schemas-microsoft-com:vml">
+  <mc:AlternateContent>
+    <mc:Choice Requires="wps">
+      <w:drawing><wps:txbx><w:txbxContent><w:p><w:r><w:t>BOX</w:t></w:r></w:p></w:txbxContent></wps:txbx></w:drawing>
+    </mc:Choice>
+    <mc:Fallback>
+      <w:pict><v:textbox><w:txbxContent><w:p><w:r><w:t>BOX</w:t></w:r></w:p></w:txbxContent></v:textbox></w:pict>
+    </mc:Fallback>
+  </mc:AlternateContent>
+</w:r>
+"""
+HYPERLINK = f'<w:hyperlink xmlns:w="{W}"><w:r><w:t xml:space="preserve"> and a link</w:t></w:r></w:hyperlink>'
+
+
+def docx_bytes(document) -> bytes:
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+class DocxParagraphTextTests(SimpleTestCase):
+    def test_text_box_is_not_read_into_its_paragraph(self):
+        document = docx.Document()
+        paragraph = document.add_paragraph("Body text")
+        paragraph._p.append(parse_xml(TEXT_BOX_RUN))
+        data = docx_bytes(document)
+
+        texts = [record.text for record in iter_docx_paragraphs(data)]
+        self.assertEqual(texts, ["Body text"])
+        self.assertEqual(texts, [p.text for p in docx.Document(io.BytesIO(data)).paragraphs])
+
+    def test_run_content_matches_python_docx(self):
+        document = docx.Document()
+        document.add_heading("Heading", level=1)
+        paragraph = document.add_paragraph("Tab\there")
+        run = paragraph.add_run("line")
+        run.add_break()
+        run.add_text("next")
+        run.add_break(docx.enum.text.WD_BREAK.PAGE)
+        paragraph._p.append(parse_xml(HYPERLINK))
+        data = docx_bytes(document)
+
+        expected = [p.text for p in docx.Document(io.BytesIO(data)).paragraphs if p.text.strip()]
+        self.assertEqual([record.text for record in iter_docx_paragraphs(data)], expected)
@@ -0,0 +1,56 @@
+import random
+from unittest import mock
+from django.test import SimpleTestCase
+from app.utils.batching import SUMMARY_BATCH_TOKENS
+from app.utils.sections import DocumentSection
+from app.utils.summarize import QuotaFriendlyAnalyzer
+
+
+def textbook_sections(count: int, sentences: int, seed: int = 0):
+    """A long document: count chapters of varied sentences over a shared vocabulary"""
+    rng = random.Random(seed)
+    vocabulary = [f"concept{i}" for i in range(2000)] + ["energy", "system", "process", "model", "theory"]
+    return [
+        DocumentSection(
+            title=f"Chapter {chapter + 1}",
+            content=" ".join(
+                " ".join(rng.choice(vocabulary) for _ in range(rng.randint(10, 25))).capitalize() + "."
+                for _ in range(sentences)
+            )
+        )
+        for chapter in range(count)
+    ]
+
+
+class HierarchicalSummaryTests(SimpleTestCase):
+    def test_large_document_is_summarized_in_leaf_batches_and_merged(self):
+        analyzer = QuotaFriendlyAnalyzer(api_key="test")
+        prompts = []
+
+        def generate(prompt, timing=None):
+            prompts.append(prompt)
+            return f"Summary {len(prompts)}: " + "key point " * 30
+
+        with mock.patch.object(analyzer, '_generate', side_effect=generate):
+            events = list(analyzer.iter_summary_events(
+                "textbook.pdf", textbook_sections(60, 250), fan_out=4, max_depth=3
+            ))
+
+        outline = next(data for event, data in events if event == "outline")
+        levels = [data["level"] for event, data in events if event == "batch"]
+        summary = next(data for event, data in events if event == "summary")["summary"]
+
+        # Far more text reaches Gemini than one batch holds, split over several leaf batches
+        self.assertGreater(outline["compression"]["tokens_after"], 3 * SUMMARY_BATCH_TOKENS)
+        self.assertGreater(outline["batches"], 4)
+        self.assertEqual(levels.count(0), outline["batches"])
+        # ...which are merged by at least one reduce level into a single summary
+        self.assertGreaterEqual(max(levels), 1)
+        self.assertTrue(any("PARTIAL SUMMARIES" in prompt for prompt in prompts))
+        self.assertNotIn("Table of Contents", summary)
+
+    def test_short_document_is_summarized_in_one_call(self):
+        analyzer = QuotaFriendlyAnalyzer(api_key="test")
+        with mock.patch.object(analyzer, '_generate', return_value="Summary " + "key point " * 30) as generate:
+            analyzer.create_comprehensive_summary("notes.pdf", textbook_sections(3, 20))
+        self.assertEqual(generate.call_count, 1)
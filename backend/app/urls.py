@@ -5,6 +5,7 @@ from . import views
 from .views import (
     FileUploadAPIView,
     SummarizeAPIView,
+    SummarizeStreamAPIView,
     GenerateMCQsAPIView,
     GenerateFlashcardsAPIView,
     process_audio,
@@ -15,6 +16,9 @@ from .views import (
     download_file,
     ImageAnalysisView,
     health_check,
+    llm_metrics,
+    summary_job,
+    model_status,
     search_paper,
     generate_sentence_view,
     evaluate_pronunciation_view
@@ -30,6 +34,8 @@ urlpatterns = [
     # Your existing URLs
     path('upload/', FileUploadAPIView.as_view(), name='file-upload'),
     path('summarize/', SummarizeAPIView.as_view(), name='summarize'),
+    path('summarize/stream/', SummarizeStreamAPIView.as_view(), name='summarize-stream'),
+    path('summarize/jobs/<str:job_id>/', summary_job, name='summary_job'),
     path('generate-mcqs/', GenerateMCQsAPIView.as_view(), name='generate-mcqs'),
     path('generate-flashcards/', GenerateFlashcardsAPIView.as_view(), name='generate-flashcards'),
     path('process_audio/', process_audio),
@@ -45,6 +51,11 @@ urlpatterns = [
     # Image Analysis URLs
     path('analyze-image/', ImageAnalysisView.as_view(), name='analyze_image'),
     
+    # Gemini admission metrics
+    path('llm-metrics/', llm_metrics, name='llm_metrics'),
+    # Model load times and memory
+    path('models/status/', model_status, name='model_status'),
+    
     # Paper Search URL
     path('search-paper/', search_paper, name='search_paper'),
     
@@ -0,0 +1,152 @@
+"""
+Packing of document sections into summarization prompts.
+
+Sections are measured in estimated Gemini tokens rather than characters and
+packed, in document order, so each prompt is filled close to the token budget:
+a section that does not fit the space left in a batch is split on sentence
+boundaries to fill it, and the rest carries on in the next batch.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Tuple
+from django.conf import settings
+from .sections import DocumentSection
+
+# Input tokens one prompt may hold for the summarization model (gemini-2.0-flash)
+SUMMARY_MODEL_INPUT_TOKENS = getattr(settings, 'SUMMARY_MODEL_INPUT_TOKENS', 1_048_576)
+# Kept free in every prompt for its instructions and the summary written back
+SUMMARY_PROMPT_RESERVE_TOKENS = 6000
+# Content tokens per summarization prompt: about 32,000 characters, so each batch is
+# answered well within the request deadline and takes a small bite of the per-minute
+# quota. A configured size is capped at the model's input limit less the reserve.
+SUMMARY_BATCH_TOKENS = min(getattr(settings, 'SUMMARY_BATCH_TOKENS', 8000),
+                           SUMMARY_MODEL_INPUT_TOKENS - SUMMARY_PROMPT_RESERVE_TOKENS)
+# Only split a section into the space left in a batch if at least this fraction of the budget is free
+SPLIT_MIN_FILL = 0.25
+
+# Words, digit runs and single symbols: roughly how a SentencePiece vocabulary splits English text
+_TOKEN_PIECES = re.compile(r"[^\W\d_]+|\d+|\S")
+# Sentence ends, blank lines, and line breaks before a bullet or list number
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n\s*\n|\n(?=\s*(?:[\u2022\u25aa\u25e6*-]|\d+[.)])\s)")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Local approximation of Gemini's token count: common words are one token,
+    long words one more per four extra letters, numbers one per three digits
+    and every symbol one
+    """
+    total = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        if piece[0].isdigit():
+            total += (len(piece) + 2) // 3
+        elif len(piece) > 6:
+            total += 1 + (len(piece) - 3) // 4
+        else:
+            total += 1
+    return total
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def sentence_units(text: str, max_tokens: int) -> List[Tuple[str, int]]:
+    """Sentences with their token counts; a sentence over max_tokens falls back to runs of words"""
+    units = []
+    for sentence in split_sentences(text):
+        tokens = count_tokens(sentence)
+        if tokens <= max_tokens:
+            units.append((sentence, tokens))
+            continue
+        run, run_tokens = [], 0
+        for word in sentence.split():
+            word_tokens = count_tokens(word)
+            if run and run_tokens + word_tokens > max_tokens:
+                units.append((" ".join(run), run_tokens))
+                run, run_tokens = [], 0
+            run.append(word)
+            run_tokens += word_tokens
+        if run:
+            units.append((" ".join(run), run_tokens))
+    return units
+
+
+@dataclass
+class BatchPlan:
+    batches: List[str] = field(default_factory=list)
+    tokens: List[int] = field(default_factory=list)  # Estimated tokens per batch
+    sources: List[List[int]] = field(default_factory=list)  # Indices of the sections each batch draws on
+    budget: int = SUMMARY_BATCH_TOKENS
+
+    @property
+    def fill_ratio(self) -> float:
+        """Mean fraction of the token budget used per batch"""
+        return sum(self.tokens) / (len(self.tokens) * self.budget) if self.tokens else 0.0
+
+
+class BatchPacker:
+    def __init__(self, budget: int = SUMMARY_BATCH_TOKENS, split_min_fill: float = SPLIT_MIN_FILL):
+        self.budget = max(64, budget)
+        self.split_min_tokens = int(self.budget * split_min_fill)
+
+    def pack(self, sections: List[DocumentSection]) -> BatchPlan:
+        """Pack sections, in order, into as few batches of at most budget tokens as possible"""
+        batches: List[List[Tuple[str, int]]] = []
+        current: List[Tuple[str, int]] = []  # (text, section index)
+        used = 0
+
+        def flush():
+            nonlocal current, used
+            if current:
+                batches.append(current)
+            current, used = [], 0
+
+        for index, section in enumerate(sections):
+            header = f"## {section.title}\n"
+            text = header + section.content
+            tokens = count_tokens(text) + 1  # + the blank line between sections
+            if used + tokens <= self.budget:
+                current.append((text, index))
+                used += tokens
+                continue
+
+            room = self.budget - used
+            if tokens <= self.budget and room < self.split_min_tokens:
+                # Not worth splitting into a small gap; start a fresh batch
+                flush()
+                current.append((text, index))
+                used = tokens
+                continue
+
+            # Split on sentence boundaries: fill what is left of this batch, then whole batches
+            header_tokens = count_tokens(f"## {section.title} (Part 99/99)\n") + 1
+            if room - header_tokens < self.split_min_tokens:
+                flush()
+            parts: List[List[str]] = [[]]
+            part_tokens = used + header_tokens
+            for unit, unit_tokens in sentence_units(section.content, self.budget // 2):
+                if part_tokens + unit_tokens > self.budget and (parts[-1] or len(parts) == 1):
+                    parts.append([])
+                    part_tokens = header_tokens
+                parts[-1].append(unit)
+                part_tokens += unit_tokens + 1
+
+            # Only the first part shares a batch with earlier sections
+            shares_batch = bool(parts[0])
+            parts = [part for part in parts if part]
+            for number, part in enumerate(parts, start=1):
+                label = f"## {section.title} (Part {number}/{len(parts)})\n" if len(parts) > 1 else header
+                if number > 1 or not shares_batch:
+                    flush()
+                current.append((label + " ".join(part), index))
+            used = part_tokens
+        flush()
+
+        plan = BatchPlan(budget=self.budget)
+        for pieces in batches:
+            batch = "\n\n".join(text for text, _ in pieces)
+            plan.batches.append(batch)
+            plan.tokens.append(count_tokens(batch))
+            plan.sources.append(sorted({index for _, index in pieces}))
+        return plan
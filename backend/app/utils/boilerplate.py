@@ -0,0 +1,96 @@
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterable, List, Set, Tuple
+
+# Only documents with a few pages have a meaningful notion of "every page"
+BOILERPLATE_MIN_PAGES = 4
+# A line repeated on more than this fraction of pages is a running header/footer
+BOILERPLATE_PAGE_FRACTION = 0.5
+# Headers are detected from at most this many pages, spread evenly over the document
+BOILERPLATE_SAMPLE_PAGES = 30
+# Long repeated lines are more likely real content (tables, code) than headers
+BOILERPLATE_MAX_LINE_CHARS = 200
+# Rough size of a Gemini token, used only for reporting
+CHARS_PER_TOKEN = 4
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def line_key(line: str) -> int:
+    """Hash of a line with case, spacing and numbers normalised, so "Page 3 of 40" matches "Page 4 of 40" """
+    return hash(_SPACES.sub(" ", _DIGITS.sub("#", line.lower())).strip())
+
+
+@dataclass
+class BoilerplateReport:
+    repeated_lines: int = 0  # Distinct lines detected as boilerplate
+    chars_removed: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.chars_removed // CHARS_PER_TOKEN
+
+
+class BoilerplateFilter:
+    """
+    Drops running headers, footers, page numbers and copyright lines: any short
+    line that shows up, modulo numbers, on more than a fraction of the pages.
+    """
+
+    def __init__(self, keys: Set[int]):
+        self.keys = keys
+        self.report = BoilerplateReport(repeated_lines=len(keys))
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[str], page_fraction: float = BOILERPLATE_PAGE_FRACTION,
+                   min_pages: int = BOILERPLATE_MIN_PAGES) -> 'BoilerplateFilter':
+        """Count each distinct line once per page and keep those above the page fraction"""
+        counts = Counter()
+        page_count = 0
+        for text in pages:
+            page_count += 1
+            counts.update({
+                line_key(line) for line in text.splitlines()
+                if line.strip() and len(line.strip()) <= BOILERPLATE_MAX_LINE_CHARS
+            })
+
+        if page_count < min_pages:
+            return cls(set())
+        threshold = page_count * page_fraction
+        return cls({key for key, pages_seen in counts.items() if pages_seen > threshold})
+
+    def __bool__(self) -> bool:
+        return bool(self.keys)
+
+    def is_boilerplate(self, line: str) -> bool:
+        stripped = line.strip()
+        return bool(stripped) and len(stripped) <= BOILERPLATE_MAX_LINE_CHARS and line_key(stripped) in self.keys
+
+    def clean_page(self, text: str) -> str:
+        """Page text without its boilerplate lines"""
+        if not self.keys:
+            return text
+        kept = []
+        for line in text.splitlines(keepends=True):
+            if self.is_boilerplate(line):
+                self.report.chars_removed += len(line.strip())
+            else:
+                kept.append(line)
+        return "".join(kept)
+
+    def clean_block(self, block: List[Tuple[str, float, int]]) -> List[Tuple[str, float, int]]:
+        """Span tuples of a text block without boilerplate; a block that is one repeated line goes entirely"""
+        if not self.keys:
+            return block
+        if self.is_boilerplate(" ".join(text.strip() for text, _, _ in block)):
+            self.report.chars_removed += sum(len(text.strip()) for text, _, _ in block)
+            return []
+        kept = []
+        for span in block:
+            if self.is_boilerplate(span[0]):
+                self.report.chars_removed += len(span[0].strip())
+            else:
+                kept.append(span)
+        return kept
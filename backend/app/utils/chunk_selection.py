@@ -0,0 +1,69 @@
+"""
+Choice of the document chunks a Gemini prompt is built from.
+
+Chunks are embedded once and picked by maximal marginal relevance: each step
+takes the chunk most similar to the document as a whole (the mean of all chunk
+embeddings) after a penalty for its similarity to the chunks already taken, so
+the selection stays representative while spreading over the whole document.
+"""
+from typing import List, Sequence
+import numpy as np
+from django.conf import settings
+
+# Estimated tokens of document text put in an MCQ prompt (about the 8,000 characters sent before)
+MCQ_CONTEXT_TOKENS = getattr(settings, 'MCQ_CONTEXT_TOKENS', 2000)
+# Weight of relevance against novelty in each MMR step (1.0 ignores novelty)
+MMR_LAMBDA = getattr(settings, 'MMR_LAMBDA', 0.7)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def mmr_select(embeddings: np.ndarray, tokens: Sequence[int], budget: int,
+               relevance_weight: float = MMR_LAMBDA) -> List[int]:
+    """
+    Indices, in document order, of the chunks picked by MMR until no further
+    chunk fits in budget tokens. Similarities to the latest pick are computed
+    for all chunks in one product, so no n x n matrix is built.
+    """
+    vectors = normalize_rows(embeddings)
+    count = len(vectors)
+    if count == 0:
+        return []
+    tokens = np.asarray(tokens, dtype=np.int64)
+    centroid = vectors.mean(axis=0)
+    centroid /= np.linalg.norm(centroid) or 1.0
+    relevance = vectors @ centroid
+
+    closest = np.full(count, -1.0, dtype=np.float32)  # Highest similarity to any chunk taken so far
+    taken = np.zeros(count, dtype=bool)
+    remaining = budget
+    while True:
+        candidates = ~taken & (tokens <= remaining)
+        if not candidates.any():
+            break
+        scores = relevance_weight * relevance - (1 - relevance_weight) * np.maximum(closest, 0.0)
+        choice = int(np.argmax(np.where(candidates, scores, -np.inf)))
+        taken[choice] = True
+        remaining -= tokens[choice]
+        np.maximum(closest, vectors @ vectors[choice], out=closest)
+    return np.flatnonzero(taken).tolist()
+
+
+def unique_indices(embeddings: np.ndarray, threshold: float) -> List[int]:
+    """
+    Indices of the texts to keep, in order, when each text is dropped if its
+    cosine similarity to an earlier kept text is at least threshold
+    """
+    vectors = normalize_rows(embeddings)
+    if len(vectors) == 0:
+        return []
+    duplicate_of_earlier = np.triu(vectors @ vectors.T >= threshold, k=1)
+    dropped = np.zeros(len(vectors), dtype=bool)
+    for i in range(len(vectors)):
+        if not dropped[i]:
+            dropped |= duplicate_of_earlier[i]
+    return np.flatnonzero(~dropped).tolist()
@@ -7,6 +7,7 @@ import base64
 from io import BytesIO
 from PIL import Image
 from django.conf import settings
+from .model_registry import MODEL_REGISTRY
 
 # Try to import mediapipe and sklearn, handle if not installed
 try:
@@ -273,21 +274,19 @@ class HandSignDetector:
         if hasattr(self, 'hands'):
             self.hands.close()
 
-# Global detector instance - Initialize only if libraries are available
-detector = None
-if MEDIAPIPE_AVAILABLE and SKLEARN_AVAILABLE:
+def get_detector():
+    """The shared detector, created through MODEL_REGISTRY on first use (None if unavailable)"""
+    if not (MEDIAPIPE_AVAILABLE and SKLEARN_AVAILABLE):
+        return None
     try:
-        detector = HandSignDetector()
+        return MODEL_REGISTRY.get('hand-gesture-detector')
     except Exception as e:
         print(f"Error initializing HandSignDetector: {e}")
-        detector = None
-
-def get_detector():
-    """Get the global detector instance"""
-    return detector
+        return None
 
 def process_image_for_gestures(base64_image):
     """Process image and return detected gestures"""
+    detector = get_detector()
     if detector is None:
         return {
             'error': 'Hand detection service not available',
@@ -298,6 +297,8 @@ def process_image_for_gestures(base64_image):
 
 def get_supported_gestures():
     """Get list of supported gestures"""
+    # Listing the gestures is no reason to load (or train) the model
+    detector = get_detector() if MODEL_REGISTRY.is_loaded('hand-gesture-detector') else None
     if detector is None:
         # Return basic gesture list as fallback
         return [
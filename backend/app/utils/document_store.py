@@ -0,0 +1,228 @@
+import os
+import json
+import zlib
+import threading
+import tempfile
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+from django.conf import settings
+from .boilerplate import BoilerplateReport
+from .ingestion import DocumentSource
+from .ooxml import iter_pptx_slides, iter_docx_paragraphs
+from .pdf_processor import extract_pdf_text_with_fallback
+from .sections import DocumentSection, ExtractedSections
+
+# Bump when extractor output changes so stale entries are ignored
+STORE_VERSION = 6
+
+
+@dataclass
+class ExtractedText:
+    text: str
+    fallback_pages: List[int] = field(default_factory=list)  # PDF pages recovered by the slow path
+    degraded_pages: List[int] = field(default_factory=list)  # PDF pages whose text may be missing
+
+
+def extract_text_from_pdf(source: DocumentSource) -> str:
+    """Extract plain text from a PDF, using the slow path only for scanned-looking pages"""
+    return extract_pdf_text_with_fallback(source).text.strip()
+
+
+def extract_text_from_docx(source: DocumentSource) -> str:
+    """Extract plain text from a Word document"""
+    return "\n".join(paragraph.text for paragraph in iter_docx_paragraphs(source))
+
+
+def extract_text_from_pptx(source: DocumentSource) -> str:
+    """Extract plain text from a PowerPoint presentation"""
+    text = []
+
+    for slide in iter_pptx_slides(source):
+        slide_text = []
+
+        # Extract title if present
+        if slide.title:
+            slide_text.append(f"Slide {slide.number} Title: {slide.title}")
+
+        # Extract text from all shapes, avoiding duplicating the title
+        slide_text.extend(body for body in slide.body if body.strip() and body != slide.title)
+
+        # Add slide content to overall text
+        if slide_text:
+            text.append("\n".join(slide_text))
+
+    return "\n\n".join(text)
+
+
+def extract_text_from_txt(source: DocumentSource) -> str:
+    """Read a plain text file"""
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            source = f.read()
+    try:
+        return bytes(source).decode('utf-8')
+    except UnicodeDecodeError:
+        # Try another encoding if utf-8 fails
+        return bytes(source).decode('latin-1')
+
+
+TEXT_EXTRACTORS = {
+    '.pdf': extract_text_from_pdf,
+    '.docx': extract_text_from_docx,
+    '.pptx': extract_text_from_pptx,
+    '.ppt': extract_text_from_pptx,
+    '.txt': extract_text_from_txt,
+    '.md': extract_text_from_txt,
+    '.csv': extract_text_from_txt,
+}
+
+
+def extract_text_from_file(source: DocumentSource, ext: Optional[str] = None) -> str:
+    """Extract plain text with the single extractor registered for the file's format"""
+    ext = (ext or os.path.splitext(source)[1]).lower()
+    extractor = TEXT_EXTRACTORS.get(ext)
+    if extractor is None:
+        raise ValueError(f"Unsupported file type: {ext}")
+    return extractor(source)
+
+
+def extract_document_text(source: DocumentSource, ext: Optional[str] = None) -> ExtractedText:
+    """Extract plain text plus per-page fallback details for PDFs"""
+    ext = (ext or os.path.splitext(source)[1]).lower()
+    if ext == '.pdf':
+        pdf_text = extract_pdf_text_with_fallback(source)
+        return ExtractedText(
+            text=pdf_text.text.strip(),
+            fallback_pages=pdf_text.fallback_pages,
+            degraded_pages=pdf_text.degraded_pages
+        )
+    return ExtractedText(text=extract_text_from_file(source, ext))
+
+
+class DocumentStore:
+    """
+    Disk cache of extracted document content keyed by the SHA-256 of the upload.
+    Entries are zlib-compressed JSON; the least recently used entries are evicted
+    once the store grows past max_bytes.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 512 * 1024 * 1024):
+        self.root = str(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None  # Lazily computed total size of the store
+
+    def _entry_path(self, digest: str, kind: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.{kind}.v{STORE_VERSION}.json.z")
+
+    def get(self, digest: str, kind: str) -> Optional[dict]:
+        path = self._entry_path(digest, kind)
+        try:
+            with open(path, 'rb') as f:
+                payload = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+            os.utime(path)  # Mark as recently used
+            return payload
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Document store read error for {digest[:12]}: {e}")
+            return None
+
+    def put(self, digest: str, kind: str, payload: dict):
+        path = self._entry_path(digest, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), 6)
+
+        # Write atomically so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            try:
+                replaced = os.path.getsize(path)  # An overwritten entry no longer counts
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        if not os.path.isdir(self.root):
+            return []
+        entries = []
+        for bucket in os.scandir(self.root):
+            if bucket.is_dir():
+                for entry in os.scandir(bucket.path):
+                    if entry.name.endswith('.json.z'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Remove least recently used entries until the store is back under 90% of its budget"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._size = total
+
+    def get_sections(self, digest: str, extractor: Callable[[], ExtractedSections]) -> ExtractedSections:
+        """Return cached sections for a document, running the extractor on a miss"""
+        payload = self.get(digest, 'sections')
+        if payload is not None:
+            return ExtractedSections(
+                sections=[DocumentSection(title=title, content=content, depth=depth)
+                          for title, content, depth in payload['sections']],
+                strategy=payload['strategy'],
+                boilerplate=BoilerplateReport(*payload['boilerplate'])
+            )
+
+        extracted = extractor()
+        if extracted.sections:  # Never cache a failed extraction
+            self.put(digest, 'sections', {
+                'sections': [[s.title, s.content, s.depth] for s in extracted.sections],
+                'strategy': extracted.strategy,
+                'boilerplate': [extracted.boilerplate.repeated_lines, extracted.boilerplate.chars_removed]
+            })
+        return extracted
+
+    def get_text(self, digest: str, extractor: Callable[[], ExtractedText]) -> ExtractedText:
+        """Return cached plain text for a document, running the extractor on a miss"""
+        payload = self.get(digest, 'text')
+        if payload is not None:
+            return ExtractedText(**payload)
+
+        extracted = extractor()
+        if extracted.text.strip():  # Never cache a failed extraction
+            self.put(digest, 'text', {
+                'text': extracted.text,
+                'fallback_pages': extracted.fallback_pages,
+                'degraded_pages': extracted.degraded_pages
+            })
+        return extracted
+
+
+DOCUMENT_STORE = DocumentStore(
+    getattr(settings, 'DOCUMENT_STORE_DIR', os.path.join(settings.BASE_DIR, 'document_store')),
+    getattr(settings, 'DOCUMENT_STORE_MAX_BYTES', 512 * 1024 * 1024)
+)
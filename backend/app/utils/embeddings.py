@@ -0,0 +1,275 @@
+"""
+Sentence embeddings shared by every feature that compares texts.
+
+EMBEDDING_SERVICE.encode() answers from a persistent vector cache first: float16
+vectors in a memory-mapped file, one slot per text (keyed by a hash of the
+text), with the least recently used slot reused once the file is full. The
+texts it does not hold are handed to one encoder thread, which waits a few
+milliseconds for calls from other requests and encodes them together, so
+concurrent requests share model batches instead of contending for the CPU.
+"""
+import os
+import time
+import atexit
+import queue
+import hashlib
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import numpy as np
+from django.conf import settings
+from .chunk_selection import normalize_rows, unique_indices
+from .model_registry import MODEL_REGISTRY
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+EMBEDDING_CACHE_DIR = getattr(settings, 'EMBEDDING_CACHE_DIR', os.path.join(settings.BASE_DIR, 'embedding_cache'))
+# Vectors kept on disk; at 384 float16 dimensions each takes 768 bytes
+EMBEDDING_CACHE_MAX_VECTORS = getattr(settings, 'EMBEDDING_CACHE_MAX_VECTORS', 200_000)
+EMBEDDING_BATCH_SIZE = getattr(settings, 'EMBEDDING_BATCH_SIZE', 64)  # Texts per model call
+# How long the encoder waits for more texts before encoding a batch that is not full
+EMBEDDING_BATCH_WAIT = getattr(settings, 'EMBEDDING_BATCH_WAIT', 0.005)  # seconds
+# Cosine similarity at which two texts (flashcard questions, paper titles) count as duplicates
+EMBEDDING_DUPLICATE_SIMILARITY = getattr(settings, 'EMBEDDING_DUPLICATE_SIMILARITY', 0.9)
+
+KEY_BYTES = 16
+# Bump when the cache file layout changes so old files are left alone
+CACHE_VERSION = 2
+
+
+def load_sentence_embedder():
+    from sentence_transformers import SentenceTransformer
+    import torch
+    return SentenceTransformer(EMBEDDING_MODEL, device="cuda" if torch.cuda.is_available() else "cpu")
+
+
+def warm_up_sentence_embedder(model):
+    model.encode(["Warm-up sentence for the embedding model."], show_progress_bar=False)
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha256(text.encode('utf-8')).digest()[:KEY_BYTES]
+
+
+class VectorCache:
+    """
+    Fixed-capacity store of unit vectors shared by every server process, in
+    three memory-mapped files: the vectors (float16), the key of the text each
+    slot holds and when the slot was last used. A key can only live in the few
+    slots its hash points at, so every process finds it without an index of
+    its own; a new key takes a free one of them or the least recently used.
+    Reads hold a shared lock on the keys file and writes an exclusive one, so a
+    slot is never read while another process rewrites it.
+    """
+
+    WAYS = 8  # Slots a key may occupy
+
+    def __init__(self, root: str, name: str, dimensions: int, capacity: int = EMBEDDING_CACHE_MAX_VECTORS):
+        os.makedirs(root, exist_ok=True)
+        self.capacity = max(self.WAYS, capacity)
+        self.dimensions = dimensions
+        prefix = os.path.join(root, f"{name}-{dimensions}d-{self.capacity}.v{CACHE_VERSION}")
+        self.vectors = self._open(f"{prefix}.vectors.f16", np.float16, (self.capacity, dimensions))
+        self.keys = self._open(f"{prefix}.keys", np.uint8, (self.capacity, KEY_BYTES))
+        self.used = self._open(f"{prefix}.used", np.float64, (self.capacity,))
+        self._lock = threading.Lock()
+        self._lock_file = open(f"{prefix}.keys", 'rb')
+
+    @staticmethod
+    def _open(path: str, dtype, shape) -> np.memmap:
+        mode = 'r+' if os.path.exists(path) else 'w+'
+        return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        # flock is per open file, so threads of this process also need the thread lock
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _ways(self, key: bytes) -> np.ndarray:
+        first = int.from_bytes(key[:8], 'little') % self.capacity
+        return (first + np.arange(self.WAYS)) % self.capacity
+
+    def _find(self, key: bytes, ways: np.ndarray) -> Optional[int]:
+        matches = np.flatnonzero((self.keys[ways] == np.frombuffer(key, dtype=np.uint8)).all(axis=1))
+        return int(ways[matches[0]]) if len(matches) else None
+
+    def __len__(self) -> int:
+        with self._locked(exclusive=False):
+            return int(np.count_nonzero(self.keys.any(axis=1)))
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._locked(exclusive=False):
+            slot = self._find(key, self._ways(key))
+            if slot is None:
+                return None
+            self.used[slot] = time.time()  # Racing stamps from other readers are all recent
+            return np.array(self.vectors[slot], dtype=np.float32)
+
+    def put(self, key: bytes, vector: np.ndarray):
+        ways = self._ways(key)
+        with self._locked(exclusive=True):
+            slot = self._find(key, ways)
+            if slot is None:
+                free = np.flatnonzero(~self.keys[ways].any(axis=1))
+                slot = int(ways[free[0]] if len(free) else ways[np.argmin(self.used[ways])])
+            self.vectors[slot] = vector
+            self.keys[slot] = np.frombuffer(key, dtype=np.uint8)
+            self.used[slot] = time.time()
+
+    def flush(self):
+        with self._locked(exclusive=True):
+            self.vectors.flush()
+            self.keys.flush()
+            self.used.flush()
+
+
+class _Request:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+
+
+class EmbeddingService:
+    def __init__(self, cache_dir: str = EMBEDDING_CACHE_DIR, capacity: int = EMBEDDING_CACHE_MAX_VECTORS,
+                 batch_size: int = EMBEDDING_BATCH_SIZE, batch_wait: float = EMBEDDING_BATCH_WAIT,
+                 model_name: str = 'sentence-embedder'):
+        self.cache_dir = cache_dir
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.model_name = model_name
+        self._cache: Optional[VectorCache] = None
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'texts': 0, 'cache_hits': 0, 'encoded': 0, 'batches': 0, 'encode_seconds': 0.0}
+
+    @property
+    def model(self):
+        return MODEL_REGISTRY.get(self.model_name)
+
+    def _get_cache(self) -> Optional[VectorCache]:
+        with self._lock:
+            if self._cache is None and self.capacity > 0:
+                try:
+                    self._cache = VectorCache(self.cache_dir, EMBEDDING_MODEL,
+                                              self.model.get_sentence_embedding_dimension(), self.capacity)
+                except OSError as e:
+                    print(f"Embedding cache unavailable, encoding without it: {e}")
+                    self.capacity = 0
+            return self._cache
+
+    def _ensure_encoder(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._encode_loop, name="embedding-encoder", daemon=True)
+                self._thread.start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Unit-length float32 embeddings of texts, one row each"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        cache = self._get_cache()
+        keys = [text_key(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        if cache is not None:
+            for key in set(keys):
+                vector = cache.get(key)
+                if vector is not None:
+                    found[key] = vector
+
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            request = _Request(list(missing.values()))
+            self._ensure_encoder()
+            self._queue.put(request)
+            found.update(zip(missing, request.future.result()))
+
+        with self._lock:
+            self._stats['texts'] += len(texts)
+            self._stats['cache_hits'] += len(texts) - sum(1 for key in keys if key in missing)
+        return np.stack([found[key] for key in keys]).astype(np.float32)
+
+    def _encode_loop(self):
+        while True:
+            requests = [self._queue.get()]
+            count = len(requests[0].texts)
+            # Gather what other requests send in the next few milliseconds, up to a full batch
+            deadline = time.monotonic() + self.batch_wait
+            while count < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                count += len(request.texts)
+            self._encode_batch(requests)
+
+    def _encode_batch(self, requests: List[_Request]):
+        texts = [text for request in requests for text in request.texts]
+        try:
+            started = time.perf_counter()
+            vectors = normalize_rows(self.model.encode(
+                texts, batch_size=self.batch_size, convert_to_numpy=True, show_progress_bar=False
+            ))
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            for request in requests:
+                request.future.set_exception(e)
+            return
+
+        start = 0
+        for request in requests:
+            request.future.set_result(vectors[start:start + len(request.texts)])
+            start += len(request.texts)
+        with self._lock:
+            self._stats['encoded'] += len(texts)
+            self._stats['batches'] += 1
+            self._stats['encode_seconds'] += elapsed
+
+        cache = self._cache
+        if cache is not None:
+            try:
+                for text, vector in zip(texts, vectors):
+                    cache.put(text_key(text), vector)
+            except (OSError, ValueError) as e:
+                print(f"Could not cache embeddings: {e}")
+
+    def unique(self, texts: List[str], threshold: float = EMBEDDING_DUPLICATE_SIMILARITY) -> List[int]:
+        """Indices of texts that are not near-duplicates of an earlier text"""
+        return unique_indices(self.encode(texts), threshold) if texts else []
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        seconds = stats.pop('encode_seconds')
+        stats['sentences_per_second'] = round(stats['encoded'] / seconds, 1) if seconds else None
+        stats['mean_batch_size'] = round(stats['encoded'] / stats['batches'], 1) if stats['batches'] else None
+        stats['cached_vectors'] = len(self._cache) if self._cache is not None else 0
+        return stats
+
+    def close(self):
+        if self._cache is not None:
+            self._cache.flush()
+
+
+EMBEDDING_SERVICE = EmbeddingService()
+atexit.register(EMBEDDING_SERVICE.close)
@@ -0,0 +1,183 @@
+"""
+Extractive compression of a document before it is sent to Gemini.
+
+Every sentence of the document is scored with TextRank over TF-IDF vectors and
+only the best sentences of each section are kept, up to a token budget shared
+between sections by size and importance. Term vectors are hashed into a fixed
+number of dimensions and the similarity graph is never materialised: each
+PageRank step is two matrix products with the (sentences x dimensions) matrix,
+so memory and time grow linearly with the document.
+"""
+import re
+import math
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+from django.conf import settings
+from .batching import SUMMARY_BATCH_TOKENS, count_tokens, sentence_units
+from .sections import DocumentSection
+
+# Batch prompts a compressed document is sent in: one or two for an ordinary document,
+# growing with the share of the input kept for longer ones, up to a maximum
+SUMMARY_EXTRACT_BATCHES = getattr(settings, 'SUMMARY_EXTRACT_BATCHES', 2)
+SUMMARY_EXTRACT_RATIO = getattr(settings, 'SUMMARY_EXTRACT_RATIO', 0.25)
+SUMMARY_EXTRACT_MAX_BATCHES = getattr(settings, 'SUMMARY_EXTRACT_MAX_BATCHES', 16)
+# Budgets are 90% of whole batch prompts, as packing leaves some slack
+PACKING_SLACK = 0.9
+
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_ITERATIONS = 30
+# Entries allowed in the hashed sentence-term matrix (float32), which bounds its dimensions
+MATRIX_MAX_ENTRIES = 8 * 1024 * 1024
+MIN_DIMENSIONS = 256
+MAX_DIMENSIONS = 4096
+# Unpunctuated text (slide bullets, tables) is ranked in runs of at most this many tokens
+MAX_SENTENCE_TOKENS = 80
+
+_WORD = re.compile(r"[a-z][a-z0-9]{2,}")
+STOP_WORDS = frozenset("""
+    the and for are but not you all any can had her was one our out has him his how its may new now
+    see two way who did get let say she too use that with have this will your from they been were
+    said each which their there what about would these other into more some than then them when
+    also only such very just over most where after because those while both between being does
+""".split())
+
+
+@dataclass
+class CompressionReport:
+    tokens_before: int = 0
+    tokens_after: int = 0
+    sentences_before: int = 0
+    sentences_after: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """Fraction of the tokens kept"""
+        return self.tokens_after / self.tokens_before if self.tokens_before else 1.0
+
+
+def sentence_term_matrix(sentences: List[str]) -> np.ndarray:
+    """L2-normalised TF-IDF rows, with terms hashed (by first appearance, so deterministically) into columns"""
+    count = len(sentences)
+    dimensions = int(min(MAX_DIMENSIONS, max(MIN_DIMENSIONS, MATRIX_MAX_ENTRIES // max(1, count))))
+    vocabulary = {}
+    rows, columns = [], []
+    for row, sentence in enumerate(sentences):
+        for word in _WORD.findall(sentence.lower()):
+            if word not in STOP_WORDS:
+                rows.append(row)
+                columns.append(vocabulary.setdefault(word, len(vocabulary)) % dimensions)
+
+    matrix = np.zeros((count, dimensions), dtype=np.float32)
+    if rows:
+        np.add.at(matrix, (np.asarray(rows), np.asarray(columns)), 1.0)
+    np.log1p(matrix, out=matrix)
+    document_frequency = np.count_nonzero(matrix, axis=0)
+    matrix *= (np.log((1 + count) / (1 + document_frequency)) + 1).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def textrank(matrix: np.ndarray, damping: float = TEXTRANK_DAMPING,
+             iterations: int = TEXTRANK_ITERATIONS) -> np.ndarray:
+    """
+    PageRank over the cosine-similarity graph of the rows (self-loops excluded),
+    computed as matrix @ (matrix.T @ w) without building the n x n graph
+    """
+    count = matrix.shape[0]
+    self_similarity = np.einsum('ij,ij->i', matrix, matrix)
+    degree = matrix @ matrix.sum(axis=0) - self_similarity
+    connected = degree > 1e-9
+    scores = np.full(count, 1.0 / count, dtype=np.float32)
+    for _ in range(iterations):
+        weights = np.where(connected, scores / np.where(connected, degree, 1.0), 0.0).astype(np.float32)
+        spread = matrix @ (matrix.T @ weights) - self_similarity * weights
+        # Rank held by sentences with no neighbours is shared out evenly, as for dangling pages
+        dangling = scores[~connected].sum()
+        scores = (1 - damping) / count + damping * (spread + dangling / count)
+    return scores
+
+
+def extract_token_budget(input_tokens: int, batch_tokens: int = SUMMARY_BATCH_TOKENS) -> int:
+    """Content tokens kept from a document of input_tokens for the summary"""
+    batches = math.ceil(input_tokens * SUMMARY_EXTRACT_RATIO / batch_tokens)
+    batches = min(SUMMARY_EXTRACT_MAX_BATCHES, max(SUMMARY_EXTRACT_BATCHES, batches))
+    return int(PACKING_SLACK * batch_tokens * batches)
+
+
+class ExtractiveCompressor:
+    def __init__(self, target_tokens: Optional[int] = None):
+        self.target_tokens = target_tokens  # None sizes the budget to each document with extract_token_budget
+
+    def compress(self, sections: List[DocumentSection]) -> Tuple[List[DocumentSection], CompressionReport]:
+        """
+        Sections holding only their highest-ranked sentences, in document order, so the
+        whole document fits in about target_tokens. Documents already under the
+        target are returned unchanged.
+        """
+        indexed, report = self.compress_indexed(sections)
+        return [section for _, section in indexed], report
+
+    def compress_indexed(self, sections: List[DocumentSection]
+                         ) -> Tuple[List[Tuple[int, DocumentSection]], CompressionReport]:
+        """Like compress, but each kept section comes with its index in sections"""
+        sentences, owners, counts = [], [], []
+        for index, section in enumerate(sections):
+            for sentence, tokens in sentence_units(section.content, MAX_SENTENCE_TOKENS):
+                sentences.append(sentence)
+                owners.append(index)
+                counts.append(tokens)
+        tokens = np.array(counts, dtype=np.int64)
+        total = int(tokens.sum())
+        report = CompressionReport(total, total, len(sentences), len(sentences))
+        # Section headings are sent too, so they come out of the budget
+        target = self.target_tokens if self.target_tokens is not None else extract_token_budget(total)
+        target -= sum(count_tokens(f"## {section.title}\n") + 1 for section in sections)
+        if total <= target or not sentences:
+            return list(enumerate(sections)), report
+
+        scores = textrank(sentence_term_matrix(sentences))
+        owners = np.asarray(owners)
+
+        # Share the budget between sections by their size and importance
+        section_tokens = np.bincount(owners, weights=tokens, minlength=len(sections))
+        importance = np.array([section.importance for section in sections], dtype=np.float64)
+        weight = section_tokens * importance
+        budgets = max(0, target) * weight / weight.sum() if weight.sum() > 0 else section_tokens
+
+        # Within each section take sentences best first while they fit its budget (always at least one)
+        order = np.lexsort((-scores, owners))
+        sorted_owners = owners[order]
+        sorted_tokens = tokens[order]
+        cumulative = np.cumsum(sorted_tokens)
+        first = np.r_[True, sorted_owners[1:] != sorted_owners[:-1]]
+        group_start = np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))
+        used = cumulative - cumulative[group_start] + sorted_tokens[group_start]
+        keep = np.zeros(len(sentences), dtype=bool)
+        keep[order[(used <= budgets[sorted_owners]) | first]] = True
+
+        if tokens[keep].sum() > target:
+            # Too many sections for one sentence each: take the best sentences document-wide instead
+            order = np.argsort(-scores, kind='stable')
+            keep[:] = False
+            keep[order[np.cumsum(tokens[order]) <= target]] = True
+            keep[order[0]] = True
+
+        kept = {index: [] for index in range(len(sections))}
+        for sentence, owner in zip(np.asarray(sentences, dtype=object)[keep], owners[keep]):
+            kept[int(owner)].append(sentence)
+        # Sections left without a sentence are dropped; ones that had no text at all are kept as they are
+        compressed = [
+            (index, DocumentSection(
+                title=section.title,
+                content=" ".join(kept[index]),
+                importance=section.importance,
+                depth=section.depth
+            ) if kept[index] else section)
+            for index, section in enumerate(sections)
+            if kept[index] or not section_tokens[index]
+        ]
+        report.tokens_after = int(tokens[keep].sum())
+        report.sentences_after = int(keep.sum())
+        return compressed, report
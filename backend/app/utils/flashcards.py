@@ -1,11 +1,13 @@
-import fitz  # PyMuPDF
 import google.generativeai as genai
 import os
 import json
 import re
-from pptx import Presentation
-import pdfplumber
 from typing import List, Dict
+from .document_store import extract_text_from_pdf, extract_text_from_pptx, extract_text_from_file
+from .embeddings import EMBEDDING_SERVICE
+from .llm_cache import LLM_CACHE
+from .rate_limit import LANE_BULK
+from .retry import LLMCallError, call_with_retry
 
 class FlashcardGenerator:
     def __init__(self, api_key: str, model: str = "gemini-2.0-flash"):
@@ -25,80 +27,26 @@ class FlashcardGenerator:
         
     def extract_text_from_pdf(self, file_path: str) -> str:
         """Extract text from PDF using multiple methods for better reliability"""
-        text = ""
-        # First try with PyMuPDF
         try:
-            pdf_document = fitz.open(file_path)
-            for page_num in range(pdf_document.page_count):
-                page = pdf_document.load_page(page_num)
-                text += page.get_text("text") + "\n\n"
-            pdf_document.close()
+            return extract_text_from_pdf(file_path)
         except Exception as e:
-            print(f"PyMuPDF extraction failed: {e}")
-            
-        # If PyMuPDF didn't get much text, try pdfplumber
-        if len(text.strip()) < 100:
-            try:
-                text = ""
-                with pdfplumber.open(file_path) as pdf:
-                    for page in pdf.pages:
-                        extracted = page.extract_text()
-                        if extracted:
-                            text += extracted + "\n\n"
-            except Exception as e:
-                print(f"pdfplumber extraction failed: {e}")
-                
-        return text.strip()
+            print(f"PDF extraction failed: {e}")
+            return ""
 
     def extract_text_from_pptx(self, file_path: str) -> str:
         """Extract text from PowerPoint presentations"""
         try:
-            presentation = Presentation(file_path)
-            text = []
-            
-            for i, slide in enumerate(presentation.slides):
-                slide_text = []
-                
-                # Extract title if present
-                if slide.shapes.title and slide.shapes.title.text:
-                    slide_text.append(f"Slide {i+1} Title: {slide.shapes.title.text}")
-                
-                # Extract text from all shapes
-                for shape in slide.shapes:
-                    if hasattr(shape, 'text') and shape.text.strip():
-                        # Avoid duplicating the title
-                        if not (slide.shapes.title and shape.text == slide.shapes.title.text):
-                            slide_text.append(shape.text)
-                
-                # Add slide content to overall text
-                if slide_text:
-                    text.append("\n".join(slide_text))
-            
-            return "\n\n".join(text)
+            return extract_text_from_pptx(file_path)
         except Exception as e:
             print(f"Error extracting text from PPTX: {e}")
             return ""
 
     def extract_text_from_file(self, file_path: str) -> str:
         """Extract text from supported file types"""
-        _, ext = os.path.splitext(file_path)
-        ext = ext.lower()
-        
-        if ext == '.pdf':
-            return self.extract_text_from_pdf(file_path)
-        elif ext in ['.pptx', '.ppt']:
-            return self.extract_text_from_pptx(file_path)
-        elif ext in ['.txt', '.md', '.csv']:
-            # Simple text files
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return f.read()
-            except UnicodeDecodeError:
-                # Try another encoding if utf-8 fails
-                with open(file_path, 'r', encoding='latin-1') as f:
-                    return f.read()
-        else:
-            print(f"Unsupported file type: {ext}")
+        try:
+            return extract_text_from_file(file_path)
+        except Exception as e:
+            print(f"Text extraction failed: {e}")
             return ""
 
     def estimate_tokens(self, text: str) -> int:
@@ -194,37 +142,57 @@ class FlashcardGenerator:
         """
         
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config
-            )
+            # Identical chunks and settings are answered from the response cache
+            cache_key = LLM_CACHE.key(self.model.model_name, prompt, self.generation_config)
+            response_text = LLM_CACHE.get(cache_key)
+            from_cache = response_text is not None
             
-            # Extract JSON from response
-            response_text = response.text
+            if not from_cache:
+                # Answers without a parsable card list are retried like transient errors
+                response_text = call_with_retry(
+                    lambda: self.model.generate_content(prompt, generation_config=self.generation_config).text,
+                    LANE_BULK, self.estimate_tokens(prompt),
+                    accept=lambda text: bool(self.parse_flashcards(text)),
+                    description="Flashcard generation"
+                )
             
-            # Look for JSON array in the response
-            json_match = re.search(r'\[\s*{.*}\s*\]', response_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                try:
-                    return json.loads(json_str)
-                except json.JSONDecodeError:
-                    # Clean up common JSON issues
-                    json_str = re.sub(r',\s*}', '}', json_str)  # Remove trailing commas
-                    json_str = re.sub(r',\s*]', ']', json_str)  # Remove trailing commas
-                    return json.loads(json_str)
+            flashcards = self.parse_flashcards(response_text)
             
-            # If we didn't find a JSON array pattern, try loading the whole response
-            try:
-                return json.loads(response_text)
-            except json.JSONDecodeError:
-                print(f"Failed to parse JSON from response: {response_text[:200]}...")
-                return []
-                
+            # Only answers that parsed are worth serving again
+            if flashcards and not from_cache:
+                LLM_CACHE.put(cache_key, response_text)
+            return flashcards
+        
+        except LLMCallError:
+            raise
         except Exception as e:
             print(f"Error generating flashcards: {str(e)}")
             return []
 
+    def parse_flashcards(self, response_text: str) -> List[Dict[str, str]]:
+        """Extract the JSON array of flashcards from a Gemini response"""
+        # Look for JSON array in the response
+        json_match = re.search(r'\[\s*{.*}\s*\]', response_text, re.DOTALL)
+        if json_match:
+            json_str = json_match.group(0)
+            try:
+                return json.loads(json_str)
+            except json.JSONDecodeError:
+                # Clean up common JSON issues
+                json_str = re.sub(r',\s*}', '}', json_str)  # Remove trailing commas
+                json_str = re.sub(r',\s*]', ']', json_str)  # Remove trailing commas
+                try:
+                    return json.loads(json_str)
+                except json.JSONDecodeError:
+                    pass
+        
+        # If we didn't find a JSON array pattern, try loading the whole response
+        try:
+            return json.loads(response_text)
+        except json.JSONDecodeError:
+            print(f"Failed to parse JSON from response: {response_text[:200]}...")
+            return []
+
     def generate_flashcards(self, text: str, num_flashcards: int = 10) -> List[Dict[str, str]]:
         """Generate flashcards from a document's text content"""
         if not text or len(text.strip()) < 50:
@@ -270,6 +238,13 @@ class FlashcardGenerator:
             if norm_question not in seen_questions:
                 seen_questions.add(norm_question)
                 unique_flashcards.append(card)
+
+        # Then questions that ask the same thing in other words
+        try:
+            keep = EMBEDDING_SERVICE.unique([card['question'] for card in unique_flashcards])
+            unique_flashcards = [unique_flashcards[i] for i in keep]
+        except Exception as e:
+            print(f"Skipping near-duplicate check: {e}")
                 
         # Trim to requested number
         return unique_flashcards[:num_flashcards]
\ No newline at end of file
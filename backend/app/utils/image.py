@@ -4,6 +4,7 @@ from PIL import Image
 import requests
 import json
 from django.conf import settings
+from .rate_limit import GEMINI_GOVERNOR, LANE_IMAGE, IMAGE_TOKENS, estimate_tokens
 
 
 class ImageProcessor:
@@ -76,6 +77,9 @@ class ImageProcessor:
                 }
             }
             
+            # Wait for Gemini quota in the image lane
+            GEMINI_GOVERNOR.admit(LANE_IMAGE, estimate_tokens(payload["contents"][0]["parts"][0]["text"]) + IMAGE_TOKENS)
+            
             # Make request to Gemini API
             response = requests.post(
                 self.api_url,
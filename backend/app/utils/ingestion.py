@@ -0,0 +1,107 @@
+import io
+import os
+import mmap
+import hashlib
+import tempfile
+from typing import Optional, Union
+from django.conf import settings
+
+# Uploads at or below this size are parsed straight from memory
+SPOOL_THRESHOLD = getattr(settings, 'DOCUMENT_SPOOL_THRESHOLD', 16 * 1024 * 1024)
+
+# What extractors accept: a filesystem path or the document's bytes
+DocumentSource = Union[str, bytes, memoryview]
+
+
+def as_file(source: DocumentSource):
+    """Path or file object for libraries (python-docx, python-pptx, pdfplumber) that take either"""
+    if isinstance(source, str):
+        return source
+    return io.BytesIO(source)
+
+
+class IngestedDocument:
+    """
+    An uploaded document ready for parsing without a save/reopen round-trip.
+    Small uploads stay in memory; larger ones are memory-mapped from Django's own
+    temporary upload file, or from a spool file written only above SPOOL_THRESHOLD.
+    """
+
+    def __init__(self, name: str, data, size: int, digest: str,
+                 path: Optional[str] = None, owns_path: bool = False):
+        self.name = name
+        self.extension = os.path.splitext(name)[1].lower()
+        self.data = data  # bytes, or an mmap over the file at self.path
+        self.size = size
+        self.digest = digest  # SHA-256 of the bytes, used as the document store key
+        self.path = path
+        self._owns_path = owns_path
+
+    @property
+    def source(self) -> DocumentSource:
+        """Path when the bytes are on disk (so worker processes can open it), else the bytes"""
+        return self.path if self.path else self.data
+
+    @classmethod
+    def from_upload(cls, uploaded_file, spool_threshold: int = SPOOL_THRESHOLD) -> 'IngestedDocument':
+        # Django already spooled large uploads to disk; map that file instead of copying it
+        if hasattr(uploaded_file, 'temporary_file_path'):
+            return cls._from_path(uploaded_file.name, uploaded_file.temporary_file_path(), owns_path=False)
+
+        if uploaded_file.size <= spool_threshold:
+            digest = hashlib.sha256()
+            chunks = []
+            for chunk in uploaded_file.chunks():
+                digest.update(chunk)
+                chunks.append(chunk)
+            data = b"".join(chunks)
+            return cls(uploaded_file.name, data, len(data), digest.hexdigest())
+
+        # Large in-memory upload: spool it once and parse from the mapping
+        suffix = os.path.splitext(uploaded_file.name)[1]
+        fd, spool_path = tempfile.mkstemp(suffix=suffix)
+        try:
+            with os.fdopen(fd, 'wb') as spool:
+                for chunk in uploaded_file.chunks():
+                    spool.write(chunk)
+            return cls._from_path(uploaded_file.name, spool_path, owns_path=True)
+        except Exception:
+            os.remove(spool_path)
+            raise
+
+    @classmethod
+    def _from_path(cls, name: str, path: str, owns_path: bool) -> 'IngestedDocument':
+        size = os.path.getsize(path)
+        if size == 0:
+            return cls(name, b"", 0, hashlib.sha256().hexdigest(), path=path, owns_path=owns_path)
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(name, data, size, hashlib.sha256(data).hexdigest(), path=path, owns_path=owns_path)
+
+    def save_copy(self) -> str:
+        """Path of a private copy of the bytes, for work that outlives the request; the caller removes it"""
+        fd, path = tempfile.mkstemp(suffix=self.extension)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.data)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        if self._owns_path and self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def ingest_upload(uploaded_file) -> IngestedDocument:
+    """Wrap a Django upload for parsing; use as a context manager to release it"""
+    return IngestedDocument.from_upload(uploaded_file)
@@ -6,6 +6,7 @@ import base64
 import subprocess
 from gtts import gTTS
 import whisper
+import numpy as np
 import time
 import torch
 import requests
@@ -23,6 +24,8 @@ from functools import lru_cache
 
 from django.conf import settings
 import google.generativeai as genai
+from .model_registry import MODEL_REGISTRY
+from .rate_limit import GEMINI_GOVERNOR, LANE_INTERACTIVE, estimate_tokens
 
 # Load models once
 genai.configure(api_key=settings.GEMINI_API_KEY)
@@ -35,8 +38,13 @@ if DEVICE == "cuda":
 else:
     print("GPU not available, using CPU")
 
-# Load Whisper model with device specification - Use tiny for speed
-WHISPER_MODEL = whisper.load_model("small", device=DEVICE)  # Changed from "small" to "tiny"
+def load_whisper():
+    """Whisper "small" on DEVICE; loaded through MODEL_REGISTRY on first use"""
+    return whisper.load_model("small", device=DEVICE)
+
+
+def warm_up_whisper(model):
+    model.transcribe(np.zeros(whisper.audio.SAMPLE_RATE, dtype=np.float32), fp16=torch.cuda.is_available())
 
 # Thread pool for parallel processing
 THREAD_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=4)
@@ -81,7 +89,7 @@ class JarvisAI:
                 return None
             
             # Transcribe with GPU support and optimized settings
-            result = WHISPER_MODEL.transcribe(
+            result = MODEL_REGISTRY.get('whisper').transcribe(
                 converted_path,
                 fp16=torch.cuda.is_available(),  # Use FP16 on GPU for speed
                 no_speech_threshold=0.6,
@@ -201,6 +209,9 @@ class JarvisAI:
             stream_chunks = []
             current_chunk = ""
             
+            # Voice queries jump the queue ahead of image and document work
+            GEMINI_GOVERNOR.admit(LANE_INTERACTIVE, estimate_tokens(prompt))
+            
             # Stream the response
             response_stream = GEMINI_MODEL.generate_content(
                 prompt, 
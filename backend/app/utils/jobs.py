@@ -0,0 +1,87 @@
+"""
+Background summary jobs.
+
+A job runs on a small thread pool in the process that accepted it, while its
+status and result are kept in the document store, so any worker process can
+answer a poll for it.
+"""
+import time
+import uuid
+import atexit
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from django.conf import settings
+from .document_store import DOCUMENT_STORE
+from .retry import llm_deadline
+
+SUMMARY_JOB_WORKERS = getattr(settings, 'SUMMARY_JOB_WORKERS', 2)
+# Background jobs are not tied to an HTTP request, so they get their own, longer Gemini deadline
+SUMMARY_JOB_DEADLINE = getattr(settings, 'SUMMARY_JOB_DEADLINE', 600.0)  # seconds
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class SummaryJobs:
+    def __init__(self, store=DOCUMENT_STORE, max_workers: int = SUMMARY_JOB_WORKERS,
+                 deadline: float = SUMMARY_JOB_DEADLINE):
+        self.store = store
+        self.max_workers = max_workers
+        self.deadline = deadline
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="summary-job")
+            return self._executor
+
+    def _update(self, job_id: str, status: str, **fields):
+        job = self.store.get(job_id, 'job') or {'created': time.time()}
+        job.update(fields, status=status, updated=time.time())
+        self.store.put(job_id, 'job', job)
+
+    def submit(self, fn: Callable[..., dict], *args) -> str:
+        """
+        Queue fn(*args), whose JSON-serialisable return value becomes the job's result;
+        it runs in a copy of the caller's context, so Gemini calls keep their client
+        """
+        job_id = uuid.uuid4().hex
+        self._update(job_id, JOB_QUEUED)
+        context = contextvars.copy_context()
+        self._get_executor().submit(context.run, self._run, job_id, fn, args)
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable[..., dict], args: tuple):
+        self._update(job_id, JOB_RUNNING)
+        try:
+            with llm_deadline(self.deadline, inherit=False):
+                result = fn(*args)
+        except Exception as e:
+            print(f"Summary job {job_id} failed: {e}")
+            self._update(job_id, JOB_FAILED, error=f"{type(e).__name__}: {e}")
+            return
+        self._update(job_id, JOB_DONE, result=result)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Status (and result or error) of a job, or None for an unknown id"""
+        try:
+            uuid.UUID(hex=job_id)
+        except ValueError:
+            return None
+        return self.store.get(job_id, 'job')
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+SUMMARY_JOBS = SummaryJobs()
+atexit.register(SUMMARY_JOBS.close)
@@ -0,0 +1,186 @@
+"""
+Persistent cache of Gemini responses.
+
+Entries are keyed by the SHA-256 of (model, prompt, generation config), so a
+byte-identical request is answered from disk. The cache lives in one SQLite
+file shared by every worker process; rows expire after a TTL and the least
+recently used rows are evicted once the stored responses pass max_bytes.
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+from django.conf import settings
+
+LLM_CACHE_PATH = getattr(settings, 'LLM_CACHE_PATH', os.path.join(settings.BASE_DIR, 'llm_cache', 'responses.sqlite3'))
+LLM_CACHE_MAX_BYTES = getattr(settings, 'LLM_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+LLM_CACHE_TTL = getattr(settings, 'LLM_CACHE_TTL', 7 * 24 * 3600)  # seconds
+
+# Set while serving a request that asked for a fresh ("regenerated") answer
+_bypass = contextvars.ContextVar('llm_cache_bypass', default=False)
+
+_TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+@contextmanager
+def llm_cache_bypass(enabled: bool = True):
+    """Skip cache lookups in this context; fresh responses still replace the cached ones"""
+    token = _bypass.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def cache_bypassed() -> bool:
+    """True inside llm_cache_bypass(), i.e. while serving a regenerate request"""
+    return _bypass.get()
+
+
+def regenerate_requested(request) -> bool:
+    """True when a request asks for a regenerated variant (regenerate=true in the body or query)"""
+    data = getattr(request, 'data', None) or {}
+    value = data.get('regenerate') if hasattr(data, 'get') else None
+    if value is None:
+        value = request.GET.get('regenerate')
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in _TRUE_VALUES
+
+
+def llm_cache_bypass_from_request(view):
+    """Decorate a view (function or method) so regenerate=true bypasses the response cache"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if hasattr(arg, 'META'))
+        with llm_cache_bypass(regenerate_requested(request)):
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class LLMResponseCache:
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, ttl: float = 7 * 24 * 3600):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()  # One connection per thread
+        self._lock = threading.Lock()
+        self._size = None  # Lazily read total size of stored responses
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")  # Readers never block the writer
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(model: str, prompt: str, generation_config=None) -> str:
+        """Content address of a request; generation config key order does not matter"""
+        payload = json.dumps([model, prompt, generation_config], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if _bypass.get():
+            with self._lock:
+                self.bypassed += 1
+            return None
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                with self._lock:
+                    self.expired += 1
+                row = None
+            if row is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            with self._lock:
+                self.hits += 1
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"LLM cache read error: {e}")
+            return None
+
+    def put(self, key: str, response: str):
+        size = len(response.encode('utf-8'))
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now)
+            )
+            with self._lock:
+                if self._size is None:
+                    self._size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                else:
+                    self._size += size
+                if self._size > self.max_bytes:
+                    self._evict(conn)
+        except sqlite3.Error as e:
+            print(f"LLM cache write error: {e}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop expired rows, then least recently used ones until under 90% of the budget"""
+        cursor = conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        self.evictions += max(0, cursor.rowcount)
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        target = self.max_bytes * 0.9
+        if total > target:
+            stale = []
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                if total <= target:
+                    break
+                stale.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+            self.evictions += len(stale)
+        self._size = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+        try:
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            stats.update(entries=entries, bytes=size)
+        except sqlite3.Error:
+            pass
+        return stats
+
+
+LLM_CACHE = LLMResponseCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL)
@@ -1,18 +1,41 @@
-from typing import List, Dict
-import fitz
-import pdfplumber
-import docx
-from sentence_transformers import SentenceTransformer
+from typing import List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import torch
 import google.generativeai as genai
+import numpy as np
+import contextvars
+import math
 import re
 import json
 from django.conf import settings
+from .batching import count_tokens
+from .chunk_selection import MCQ_CONTEXT_TOKENS, mmr_select, unique_indices
+from .document_store import extract_text_from_pdf, extract_text_from_docx
+from .embeddings import EMBEDDING_SERVICE
+from .llm_cache import LLM_CACHE
+from .rate_limit import LANE_BULK, estimate_tokens
+from .retry import LLMCallError, call_with_retry
+
+# Questions asked for in one prompt; larger requests are split across groups of chunks
+MCQ_QUESTIONS_PER_CALL = getattr(settings, 'MCQ_QUESTIONS_PER_CALL', 10)
+# Prompts run at once for one request; the shared governor paces the calls
+MCQ_MAX_CONCURRENCY = getattr(settings, 'MCQ_MAX_CONCURRENCY', 4)
+# Questions (with their answers) whose embeddings are at least this similar count as duplicates
+MCQ_DUPLICATE_SIMILARITY = getattr(settings, 'MCQ_DUPLICATE_SIMILARITY', 0.9)
+# Spare questions asked for in split requests, as a fraction, to make up for duplicates
+MCQ_OVERSAMPLE = 0.2
+# Most recent existing questions listed in a prompt that must not repeat them
+MCQ_AVOID_LISTED = 40
+
+
+def mcq_embedding_text(mcq: Dict) -> str:
+    """What two questions are compared on: the question and its answer"""
+    return f"{mcq['question']} {mcq['correct_answer']}"
+
 
 class OptimizedMCQGenerator:
     def __init__(self):
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.similarity_model = SentenceTransformer('all-MiniLM-L6-v2', device=self.device)
         
         # Initialize Gemini
         genai.configure(api_key=settings.GEMINI_API_KEY)
@@ -20,24 +43,21 @@ class OptimizedMCQGenerator:
 
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         try:
-            text_chunks = []
-            with fitz.open(pdf_path) as pdf:
-                for page in pdf:
-                    text_chunks.append(page.get_text("text"))
-            text = "\n".join(text_chunks)
-            
-            if not text.strip() or len(text) < 100:
-                with pdfplumber.open(pdf_path) as pdf:
-                    text = '\n'.join([page.extract_text() for page in pdf.pages])
-            
-            return text
+            return extract_text_from_pdf(pdf_path)
         except Exception as e:
             raise Exception(f"PDF extraction failed: {str(e)}")
 
+    def extract_text_from_docx(self, docx_path: str) -> str:
+        try:
+            return extract_text_from_docx(docx_path)
+        except Exception as e:
+            raise Exception(f"DOCX extraction failed: {str(e)}")
+
     def preprocess_text(self, text: str) -> List[str]:
         text = re.sub(r'\s+', ' ', text)
         text = text.replace('\n', ' ')
-        sentences = [s.strip() for s in re.split(r'[.!?]+', text) if len(s.strip()) > 20]
+        # Sentence punctuation is kept, as the chunks are sent to Gemini as they are
+        sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if len(s.strip()) > 20]
         chunks = []
         current_chunk = []
         
@@ -52,14 +72,55 @@ class OptimizedMCQGenerator:
             
         return chunks
 
-    def generate_mcqs_from_text(self, text: str, num_questions: int = 10) -> List[Dict]:
+    def select_context(self, text: str, chunks: List[str], max_tokens: int = MCQ_CONTEXT_TOKENS,
+                       embeddings: Optional[np.ndarray] = None) -> str:
+        """
+        Document text for the prompt: all of it when it fits in max_tokens, otherwise
+        a representative, diverse set of chunks from across the document
+        """
+        if count_tokens(text) <= max_tokens:
+            return text
+        if embeddings is None:
+            embeddings = self.encode(chunks)
+        selected = mmr_select(embeddings, [count_tokens(chunk) for chunk in chunks], max_tokens)
+        if not selected:
+            # Every chunk is over the budget (text without sentence breaks): send its start, as before
+            return text[:max_tokens * 4]
+        return "\n\n".join(chunks[i] for i in selected)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """all-MiniLM-L6-v2 embeddings through the shared, cached embedding service"""
+        return EMBEDDING_SERVICE.encode(texts)
+
+    def generate_mcqs_from_text(self, text: str, num_questions: int = 10,
+                                avoid: Optional[List[str]] = None) -> List[Dict]:
+        """Questions over the document; avoid lists existing questions Gemini is asked not to repeat"""
         try:
             chunks = self.preprocess_text(text)
             
             if not chunks:
                 raise ValueError("No suitable content found in the text")
-            
-            prompt = f"""
+
+            if num_questions > MCQ_QUESTIONS_PER_CALL and len(chunks) > 1:
+                return self.generate_mcqs_fanned_out(chunks, num_questions, avoid)
+
+            context = self.select_context(text, chunks)
+            return self.generate_questions(context, num_questions, avoid)[:num_questions]
+        
+        except LLMCallError:
+            raise
+        except Exception as e:
+            raise Exception(f"MCQ generation failed: {str(e)}")
+
+    def generate_mcqs_with_embeddings(self, text: str, num_questions: int,
+                                      avoid: Optional[List[str]] = None) -> Tuple[List[Dict], np.ndarray]:
+        """generate_mcqs_from_text, with the embeddings the question bank stores"""
+        mcqs = self.generate_mcqs_from_text(text, num_questions, avoid)
+        return mcqs, self.encode([mcq_embedding_text(mcq) for mcq in mcqs])
+
+    def generate_questions(self, context: str, num_questions: int, avoid: Optional[List[str]] = None) -> List[Dict]:
+        """Questions from one Gemini prompt over context"""
+        prompt = f"""
             Create {num_questions} multiple choice questions based on this text. Format your response as a valid JSON array of objects.
             Each object must have exactly these fields:
             - "question": the question text
@@ -67,7 +128,7 @@ class OptimizedMCQGenerator:
             - "correct_answer": the correct option (must match one of the options exactly)
             - "explanation": brief explanation of the correct answer
 
-            Text: {text[:8000]}
+            Text: {context}
 
             Response must be a valid JSON array like this example:
             [
@@ -80,48 +141,129 @@ class OptimizedMCQGenerator:
                 ...
             ]
             """
-            
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Try to extract JSON if response is wrapped in code blocks
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].strip()
-            
+        if avoid:
+            listed = "\n".join(f"- {question}" for question in avoid[-MCQ_AVOID_LISTED:])
+            prompt += f"""
+            Do not repeat or rephrase any of these existing questions:
+{listed}
+            """
+        
+        # The same text and question count are answered from the response cache
+        cache_key = LLM_CACHE.key(self.model.model_name, prompt)
+        raw_response = LLM_CACHE.get(cache_key)
+        from_cache = raw_response is not None
+        if not from_cache:
+            # Answers that do not parse into valid questions are retried like transient errors
+            raw_response = call_with_retry(
+                lambda: self.model.generate_content(prompt).text,
+                LANE_BULK, estimate_tokens(prompt),
+                accept=lambda raw: bool(self.parse_mcqs(raw)),
+                description="MCQ generation"
+            )
+        
+        formatted_mcqs = self.parse_mcqs(raw_response)
+        if not formatted_mcqs:
+            raise ValueError("Failed to generate valid questions")
+        
+        # Only answers that produced valid questions are worth serving again
+        if not from_cache:
+            LLM_CACHE.put(cache_key, raw_response)
+        
+        return formatted_mcqs
+
+    def generate_mcqs_fanned_out(self, chunks: List[str], num_questions: int,
+                                 avoid: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Split the document into consecutive groups of chunks, ask for a share of the
+        questions (plus some spare) from each group at once, then drop near-duplicate
+        questions and interleave the groups' questions up to num_questions
+        """
+        wanted = math.ceil(num_questions * (1 + MCQ_OVERSAMPLE))
+        group_count = min(len(chunks), math.ceil(wanted / MCQ_QUESTIONS_PER_CALL))
+        per_group = math.ceil(wanted / group_count)
+
+        # Consecutive groups of about the same number of tokens
+        tokens = np.cumsum([count_tokens(chunk) for chunk in chunks])
+        bounds = np.searchsorted(tokens, tokens[-1] * np.arange(1, group_count) / group_count, side='right')
+        groups = [(start, end) for start, end in zip([0, *bounds], [*bounds, len(chunks)]) if start < end]
+        texts = [" ".join(chunks[start:end]) for start, end in groups]
+
+        embeddings = None
+        if any(count_tokens(group_text) > MCQ_CONTEXT_TOKENS for group_text in texts):
+            embeddings = self.encode(chunks)
+        contexts = [
+            self.select_context(group_text, chunks[start:end],
+                                embeddings=None if embeddings is None else embeddings[start:end])
+            for group_text, (start, end) in zip(texts, groups)
+        ]
+
+        # Each prompt runs in a copy of this context so its calls are charged to the same client and deadline
+        context = contextvars.copy_context()
+        results: List[List[Dict]] = [[] for _ in contexts]
+        errors = []
+        with ThreadPoolExecutor(max_workers=min(MCQ_MAX_CONCURRENCY, len(contexts))) as executor:
+            futures = {
+                executor.submit(context.copy().run, self.generate_questions, prompt_context, per_group, avoid): i
+                for i, prompt_context in enumerate(contexts)
+            }
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except (LLMCallError, ValueError) as e:
+                    print(f"MCQ generation for chunk group {futures[future] + 1}/{len(contexts)} failed: {e}")
+                    errors.append(e)
+        if len(errors) == len(contexts):
+            raise errors[0]
+
+        # Round-robin over the groups, so a short result still covers the whole document
+        merged = [
+            group[i] for i in range(max(len(group) for group in results))
+            for group in results if i < len(group)
+        ]
+        keep = unique_indices(
+            self.encode([mcq_embedding_text(mcq) for mcq in merged]),
+            MCQ_DUPLICATE_SIMILARITY
+        )
+        return [merged[i] for i in keep][:num_questions]
+
+    def parse_mcqs(self, raw_response: str) -> List[Dict]:
+        """Valid questions from a Gemini response, or [] when it holds none"""
+        response_text = raw_response.strip()
+        
+        # Try to extract JSON if response is wrapped in code blocks
+        if "```json" in response_text:
+            response_text = response_text.split("```json")[1].split("```")[0].strip()
+        elif "```" in response_text:
+            response_text = response_text.split("```")[1].strip()
+        
+        try:
+            mcqs = json.loads(response_text)
+        except json.JSONDecodeError:
+            # Fallback - try to fix common JSON issues
+            response_text = response_text.replace("'", '"')
+            response_text = re.sub(r',\s*}', '}', response_text)
+            response_text = re.sub(r',\s*]', ']', response_text)
             try:
                 mcqs = json.loads(response_text)
             except json.JSONDecodeError:
-                # Fallback - try to fix common JSON issues
-                response_text = response_text.replace("'", '"')
-                response_text = re.sub(r',\s*}', '}', response_text)
-                response_text = re.sub(r',\s*]', ']', response_text)
-                mcqs = json.loads(response_text)
-            
-            # Validate and format MCQs
-            formatted_mcqs = []
-            for mcq in mcqs:
-                if all(key in mcq for key in ['question', 'options', 'correct_answer', 'explanation']):
-                    # Ensure we have exactly 4 options
-                    while len(mcq['options']) < 4:
-                        mcq['options'].append("None of the above")
-                    mcq['options'] = mcq['options'][:4]
-                    
-                    formatted_mcqs.append({
-                        'question': mcq['question'].strip(),
-                        'options': [opt.strip() for opt in mcq['options']],
-                        'correct_answer': mcq['correct_answer'].strip(),
-                        'explanation': mcq['explanation'].strip()
-                    })
-            
-            if not formatted_mcqs:
-                raise ValueError("Failed to generate valid questions")
-            
-            return formatted_mcqs[:num_questions]
-            
-        except Exception as e:
-            raise Exception(f"MCQ generation failed: {str(e)}")
+                return []
+        
+        # Validate and format MCQs
+        formatted_mcqs = []
+        for mcq in mcqs if isinstance(mcqs, list) else []:
+            if isinstance(mcq, dict) and all(key in mcq for key in ['question', 'options', 'correct_answer', 'explanation']):
+                # Ensure we have exactly 4 options
+                while len(mcq['options']) < 4:
+                    mcq['options'].append("None of the above")
+                mcq['options'] = mcq['options'][:4]
+                
+                formatted_mcqs.append({
+                    'question': mcq['question'].strip(),
+                    'options': [opt.strip() for opt in mcq['options']],
+                    'correct_answer': mcq['correct_answer'].strip(),
+                    'explanation': mcq['explanation'].strip()
+                })
+        return formatted_mcqs
 
     @staticmethod
     def format_mcq_for_display(mcq: Dict) -> str:
@@ -0,0 +1,143 @@
+"""
+One place that owns the ML models used by the views.
+
+Models are loaded on first use, once per process even when concurrent requests
+ask for them together, and can be warmed up explicitly. Names listed in
+MODEL_PRELOAD are loaded when backend/wsgi.py is imported: under a server that
+imports the application before forking its workers (gunicorn with
+preload_app, see gunicorn.conf.py) the workers then share the weights
+copy-on-write instead of each loading its own copy. Load and warmup times and
+the resident memory each load added are kept for /api/models/status/.
+"""
+import gc
+import os
+import time
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Models loaded (and warmed up) when the WSGI application is imported
+MODEL_PRELOAD = getattr(settings, 'MODEL_PRELOAD', [])
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def process_rss() -> int:
+    """Resident memory of this process in bytes (0 where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+@dataclass
+class ModelStats:
+    loaded: bool = False
+    load_seconds: Optional[float] = None
+    warmup_seconds: Optional[float] = None
+    rss_bytes: Optional[int] = None  # Growth of the process's resident memory while loading
+    error: Optional[str] = None  # Last failed load, cleared by a successful one
+
+
+class _Entry:
+    def __init__(self, loader: Union[str, Callable[[], Any]], warmup: Optional[Union[str, Callable[[Any], Any]]]):
+        self.loader = loader
+        self.warmup = warmup
+        self.model = None
+        self.warmed = False
+        self.lock = threading.Lock()
+        self.stats = ModelStats()
+
+
+class ModelRegistry:
+    """
+    Loaders and warmups are callables or dotted paths to them, so registering a
+    model imports nothing: its module and libraries load with the model
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+
+    def register(self, name: str, loader: Union[str, Callable[[], Any]],
+                 warmup: Optional[Union[str, Callable[[Any], Any]]] = None):
+        self._entries[name] = _Entry(loader, warmup)
+
+    def _entry(self, name: str) -> _Entry:
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"Unknown model: {name}") from None
+
+    def get(self, name: str):
+        """The model, loading it on first use; a failed load raises and is tried again next time"""
+        entry = self._entry(name)
+        if entry.model is not None:
+            return entry.model
+        with entry.lock:
+            if entry.model is None:
+                loader = import_string(entry.loader) if isinstance(entry.loader, str) else entry.loader
+                rss_before = process_rss()
+                started = time.perf_counter()
+                try:
+                    model = loader()
+                except Exception as e:
+                    entry.stats.error = f"{type(e).__name__}: {e}"
+                    print(f"Could not load model {name}: {entry.stats.error}")
+                    raise
+                entry.stats = ModelStats(
+                    loaded=True,
+                    load_seconds=time.perf_counter() - started,
+                    rss_bytes=max(0, process_rss() - rss_before) if rss_before else None
+                )
+                entry.model = model
+                print(f"Loaded model {name} in {entry.stats.load_seconds:.1f}s")
+        return entry.model
+
+    def warmup(self, names: Optional[Iterable[str]] = None):
+        """Load the models (all registered ones by default) and run each warmup once"""
+        for name in (list(self._entries) if names is None else names):
+            model = self.get(name)
+            entry = self._entries[name]
+            with entry.lock:
+                if entry.warmup is None or entry.warmed:
+                    continue
+                warmup = import_string(entry.warmup) if isinstance(entry.warmup, str) else entry.warmup
+                started = time.perf_counter()
+                warmup(model)
+                entry.stats.warmup_seconds = time.perf_counter() - started
+                entry.warmed = True
+
+    def preload(self, names: Iterable[str] = MODEL_PRELOAD):
+        """
+        Warm up models before worker processes are forked. Objects that exist at
+        this point are moved out of the garbage collector's reach, so collections
+        in the workers do not write to (and so copy) the pages holding them.
+        """
+        names = list(names)
+        if not names:
+            return
+        for name in names:
+            try:
+                self.warmup([name])
+            except Exception as e:
+                print(f"Model {name} was not preloaded: {e}")
+        gc.collect()
+        gc.freeze()
+
+    def is_loaded(self, name: str) -> bool:
+        return self._entry(name).model is not None
+
+    def stats(self) -> Dict[str, dict]:
+        return {name: asdict(entry.stats) for name, entry in self._entries.items()}
+
+
+MODEL_REGISTRY = ModelRegistry()
+MODEL_REGISTRY.register('sentence-embedder', 'app.utils.embeddings.load_sentence_embedder',
+                        'app.utils.embeddings.warm_up_sentence_embedder')
+MODEL_REGISTRY.register('whisper', 'app.utils.jarvis.load_whisper', 'app.utils.jarvis.warm_up_whisper')
+MODEL_REGISTRY.register('sign-classifier', 'app.utils.sign_lang.load_sign_classifier',
+                        'app.utils.sign_lang.warm_up_sign_classifier')
+MODEL_REGISTRY.register('hand-gesture-detector', 'app.utils.cv2.HandSignDetector')
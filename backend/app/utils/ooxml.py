@@ -0,0 +1,262 @@
+"""
+Streaming readers for PPTX and DOCX that parse the package XML directly.
+
+python-pptx and python-docx build a full object model, and the accessors the
+extractors relied on are not cheap: slide.shapes.title rescans the shape tree
+on every call and paragraph.style resolves the style part for every paragraph.
+These readers iterparse each part once, resolve styles once per document and
+emit flat records.
+"""
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+from .ingestion import DocumentSource, as_file
+
+NS = {
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+    'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+}
+
+
+def _tag(prefix: str, name: str) -> str:
+    return f"{{{NS[prefix]}}}{name}"
+
+
+# Top-level shape elements counted by python-pptx's len(slide.shapes)
+SHAPE_TAGS = {_tag('p', name) for name in ('sp', 'grpSp', 'graphicFrame', 'cxnSp', 'pic', 'contentPart')}
+TITLE_PLACEHOLDERS = {'title', 'ctrTitle'}
+
+# Tags compared in the per-node loops
+A_T, A_BR = _tag('a', 't'), _tag('a', 'br')
+P_SP, P_SPTREE = _tag('p', 'sp'), _tag('p', 'spTree')
+W_BODY, W_P, W_T, W_TAB = _tag('w', 'body'), _tag('w', 'p'), _tag('w', 't'), _tag('w', 'tab')
+W_R, W_HYPERLINK = _tag('w', 'r'), _tag('w', 'hyperlink')
+W_BR, W_CR, W_PTAB, W_NO_BREAK_HYPHEN = _tag('w', 'br'), _tag('w', 'cr'), _tag('w', 'ptab'), _tag('w', 'noBreakHyphen')
+
+UI_STYLE_NAMES = {
+    'caption': 'Caption',
+    'footer': 'Footer',
+    'header': 'Header',
+    **{f'heading {level}': f'Heading {level}' for level in range(1, 10)},
+}
+
+# Map Word heading styles to depth levels
+HEADING_STYLES = {
+    'Title': 0,
+    'Heading 1': 1,
+    'Heading 2': 2,
+    'Heading 3': 3,
+    'Heading 4': 4
+}
+
+
+@dataclass
+class SlideRecord:
+    number: int  # 1-based slide number
+    title: Optional[str]  # None when the slide has no title placeholder
+    body: List[str] = field(default_factory=list)  # Non-empty text of every other shape
+    shape_count: int = 0
+
+
+@dataclass
+class ParagraphRecord:
+    text: str
+    style_name: str
+    heading_level: Optional[int] = None  # None for body text
+
+
+def _read_rels(package: zipfile.ZipFile, part_name: str) -> Dict[str, str]:
+    """Map relationship ids of a part to the absolute names of their targets"""
+    directory, filename = posixpath.split(part_name)
+    rels_name = posixpath.join(directory, '_rels', f"{filename}.rels")
+    if rels_name not in package.namelist():
+        return {}
+    root = ET.fromstring(package.read(rels_name))
+    return {
+        rel.get('Id'): posixpath.normpath(posixpath.join(directory, rel.get('Target')))
+        for rel in root.iter(_tag('rel', 'Relationship'))
+    }
+
+
+def _shape_text(shape) -> str:
+    """Text of a p:sp shape: runs joined per paragraph, paragraphs joined by newlines"""
+    body = shape.find('p:txBody', NS)
+    if body is None:
+        return ""
+    paragraphs = []
+    for paragraph in body.iterfind('a:p', NS):
+        pieces = []
+        for node in paragraph.iter():
+            if node.tag == A_T:
+                pieces.append(node.text or "")
+            elif node.tag == A_BR:
+                pieces.append("\n")
+        paragraphs.append("".join(pieces))
+    return "\n".join(paragraphs)
+
+
+def _placeholder_type(shape) -> Optional[str]:
+    placeholder = shape.find('p:nvSpPr/p:nvPr/p:ph', NS)
+    if placeholder is None:
+        return None
+    return placeholder.get('type', 'obj')
+
+
+def _read_slide(package: zipfile.ZipFile, part_name: str, number: int) -> SlideRecord:
+    record = SlideRecord(number=number, title=None)
+    tree_depth = None
+    depth = 0
+    for event, element in ET.iterparse(package.open(part_name), events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if element.tag == P_SPTREE:
+                tree_depth = depth
+            continue
+
+        if tree_depth is not None and depth == tree_depth + 1 and element.tag in SHAPE_TAGS:
+            record.shape_count += 1
+            if element.tag == P_SP:
+                text = _shape_text(element)
+                if record.title is None and _placeholder_type(element) in TITLE_PLACEHOLDERS:
+                    record.title = text
+                elif text:
+                    record.body.append(text)
+            element.clear()  # Shapes are not needed once read
+        depth -= 1
+    return record
+
+
+def iter_pptx_slides(source: DocumentSource) -> Iterator[SlideRecord]:
+    """Yield one record per slide, in presentation order"""
+    with zipfile.ZipFile(as_file(source)) as package:
+        rels = _read_rels(package, 'ppt/presentation.xml')
+        presentation = ET.fromstring(package.read('ppt/presentation.xml'))
+        slide_ids = presentation.find('p:sldIdLst', NS)
+        if slide_ids is None:
+            return
+        for number, slide_id in enumerate(slide_ids.iterfind('p:sldId', NS), start=1):
+            part_name = rels.get(slide_id.get(_tag('r', 'id')))
+            if part_name:
+                yield _read_slide(package, part_name, number)
+
+
+def _is_on(element) -> bool:
+    """Interpret a WordprocessingML on/off property such as <w:b/>"""
+    return element.get(_tag('w', 'val'), 'true').lower() not in ('0', 'false', 'off')
+
+
+@dataclass
+class _Style:
+    name: str
+    bold: Optional[bool] = None
+    size: Optional[float] = None  # Points
+
+
+def _read_styles(package: zipfile.ZipFile):
+    """Resolve every paragraph style once; returns (styles by id, default style id)"""
+    styles: Dict[str, _Style] = {}
+    default_id = None
+    if 'word/styles.xml' not in package.namelist():
+        return styles, default_id
+
+    root = ET.fromstring(package.read('word/styles.xml'))
+    for style in root.iterfind('w:style', NS):
+        if style.get(_tag('w', 'type')) != 'paragraph':
+            continue
+        style_id = style.get(_tag('w', 'styleId'))
+        name_element = style.find('w:name', NS)
+        name = name_element.get(_tag('w', 'val')) if name_element is not None else style_id
+        # python-docx reports some built-in names in their UI form ("heading 1" -> "Heading 1")
+        name = UI_STYLE_NAMES.get(name, name)
+
+        # Like style.font in python-docx, only the style's own run properties count
+        resolved = _Style(name=name)
+        bold = style.find('w:rPr/w:b', NS)
+        if bold is not None:
+            resolved.bold = _is_on(bold)
+        size = style.find('w:rPr/w:sz', NS)
+        if size is not None and size.get(_tag('w', 'val'), '').isdigit():
+            resolved.size = int(size.get(_tag('w', 'val'))) / 2  # Half-points to points
+        styles[style_id] = resolved
+
+        if style.get(_tag('w', 'default')) in ('1', 'true', 'on'):
+            default_id = style_id
+    return styles, default_id
+
+
+def _heading_level(text: str, style: _Style) -> Optional[int]:
+    if style.name in HEADING_STYLES:
+        return HEADING_STYLES[style.name]
+    # Fallback detection based on formatting
+    if len(text) < 100 and (style.bold or (style.size and style.size >= 14)):
+        return 1 if style.size and style.size >= 16 else 2
+    return None
+
+
+def _run_text(run) -> str:
+    """Text of a run's own content, as python-docx's run.text reads it"""
+    pieces = []
+    for node in run:
+        if node.tag == W_T:
+            pieces.append(node.text or "")
+        elif node.tag in (W_TAB, W_PTAB):
+            pieces.append("\t")
+        elif node.tag == W_CR:
+            pieces.append("\n")
+        elif node.tag == W_BR:
+            # Page and column breaks have no text equivalent
+            if node.get(_tag('w', 'type'), 'textWrapping') == 'textWrapping':
+                pieces.append("\n")
+        elif node.tag == W_NO_BREAK_HYPHEN:
+            pieces.append("-")
+    return "".join(pieces)
+
+
+def _paragraph_text(paragraph) -> str:
+    """
+    Text of the paragraph's runs, including those inside hyperlinks. Drawings
+    and alternate content are not descended into: Word stores a text box there
+    twice (mc:Choice and mc:Fallback), and python-docx leaves it out too.
+    """
+    pieces = []
+    for child in paragraph:
+        if child.tag == W_R:
+            pieces.append(_run_text(child))
+        elif child.tag == W_HYPERLINK:
+            pieces.extend(_run_text(run) for run in child if run.tag == W_R)
+    return "".join(pieces)
+
+
+def iter_docx_paragraphs(source: DocumentSource) -> Iterator[ParagraphRecord]:
+    """Yield the body's top-level non-empty paragraphs with their heading level"""
+    with zipfile.ZipFile(as_file(source)) as package:
+        styles, default_id = _read_styles(package)
+        default_style = styles.get(default_id, _Style(name='Normal'))
+
+        body = None
+        depth = 0
+        for event, element in ET.iterparse(package.open('word/document.xml'), events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if element.tag == W_BODY:
+                    body = element
+                continue
+
+            depth -= 1
+            if body is None or depth != 2:  # Only direct children of w:body (document > body > p)
+                continue
+            if element.tag == W_P:
+                text = _paragraph_text(element)
+                if text.strip():
+                    style_ref = element.find('w:pPr/w:pStyle', NS)
+                    style = styles.get(style_ref.get(_tag('w', 'val')), default_style) \
+                        if style_ref is not None else default_style
+                    yield ParagraphRecord(text=text, style_name=style.name,
+                                          heading_level=_heading_level(text, style))
+            # Drop finished body children so memory stays flat on long documents
+            body.remove(element)
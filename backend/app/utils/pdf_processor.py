@@ -1,10 +1,273 @@
 import fitz  # PyMuPDF
+import os
+import time
+import threading
+import multiprocessing
+import pdfplumber
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterator, List, Tuple
+from .ingestion import DocumentSource, as_file
+
+# Small files are cheaper to parse in-process than to fan out
+PARALLEL_MIN_FILE_SIZE = 4 * 1024 * 1024  # 4 MB
+PARALLEL_MIN_PAGES = 40
+PAGES_PER_RANGE = 25
+MAX_WORKERS = os.cpu_count() or 1
+
+# A page is sent to the slow path when PyMuPDF finds almost no text on it, or
+# when it is mostly image and its text is too sparse to be the real content
+MIN_PAGE_CHARS = 20
+MIN_CHARS_PER_SQ_INCH = 2.0
+IMAGE_COVERAGE_THRESHOLD = 0.5
+FALLBACK_TIME_BUDGET = 20.0  # seconds per request for all slow-path pages
+
+# An outline needs a few entries to be worth more than the font heuristic;
+# deeper levels stay inside their parent section
+OUTLINE_MIN_ENTRIES = 2
+OUTLINE_MAX_LEVEL = 3
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_fallback_source = None  # The document a slow-path worker was started for
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Shared process pool, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # fitz is not fork-safe once documents are open, so workers are spawned
+            _executor = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def limit_page_workers(max_workers: int):
+    """Cap the page-range and slow-path pools of this process; takes effect before the first parse"""
+    global MAX_WORKERS
+    MAX_WORKERS = max(1, min(MAX_WORKERS, max_workers))
+
+
+def open_pdf(source: DocumentSource):
+    """Open a PDF from a path or from its bytes"""
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def page_ranges(page_count: int, pages_per_range: int = PAGES_PER_RANGE) -> List[Tuple[int, int]]:
+    """Split [0, page_count) into consecutive (start, end) ranges"""
+    return [(start, min(start + pages_per_range, page_count))
+            for start in range(0, page_count, pages_per_range)]
+
+
+def read_page(page, mode: str = "text"):
+    """
+    Read one page in the requested mode.
+    "text" returns the plain page text; "text_probe" also returns the page area
+    and image coverage; "spans" returns the page's text blocks as lists of
+    (text, size, flags) tuples, which pickle far smaller than the full
+    get_text("dict") structure.
+    """
+    if mode == "text":
+        return page.get_text("text")
+    if mode == "text_probe":
+        # Plain text plus the page area and the fraction of it covered by images
+        page_area = abs(page.rect) or 1.0
+        image_area = sum(abs(fitz.Rect(info["bbox"]) & page.rect) for info in page.get_image_info())
+        return page.get_text("text"), page_area, min(1.0, image_area / page_area)
+    if mode == "spans":
+        return [
+            [(span["text"], span["size"], span["flags"]) for line in block["lines"] for span in line["spans"]]
+            for block in page.get_text("dict")["blocks"] if "lines" in block
+        ]
+    raise ValueError(f"Unknown page mode: {mode}")
+
+
+def _extract_range(pdf_path: str, start: int, end: int, mode: str) -> list:
+    """Worker entry point: each process opens its own copy of the document"""
+    with fitz.open(pdf_path) as pdf:
+        return [read_page(pdf.load_page(page_num), mode) for page_num in range(start, end)]
+
+
+def should_parallelize(source: DocumentSource, page_count: int) -> bool:
+    # Workers open the file themselves, so only on-disk documents fan out
+    return (
+        isinstance(source, str)
+        and MAX_WORKERS > 1
+        and page_count >= PARALLEL_MIN_PAGES
+        and os.path.getsize(source) >= PARALLEL_MIN_FILE_SIZE
+    )
+
+
+def iter_pdf_pages(source: DocumentSource, mode: str = "text") -> Iterator:
+    """Yield every page of a PDF in page order, fanning large files out over a process pool"""
+    with open_pdf(source) as pdf:
+        page_count = pdf.page_count
+        if not should_parallelize(source, page_count):
+            for page_num in range(page_count):
+                yield read_page(pdf.load_page(page_num), mode)
+            return
+
+    ranges = iter(page_ranges(page_count, max(1, min(PAGES_PER_RANGE, -(-page_count // MAX_WORKERS)))))
+    executor = _get_executor()
+    in_flight = deque()
+
+    def submit_next():
+        next_range = next(ranges, None)
+        if next_range is not None:
+            in_flight.append(executor.submit(_extract_range, source, *next_range, mode))
+
+    # About one range per worker is in flight, so a slow early range holds back
+    # only a few finished ranges in memory rather than the rest of the document
+    for _ in range(MAX_WORKERS):
+        submit_next()
+    try:
+        while in_flight:
+            pages = in_flight.popleft().result()
+            submit_next()
+            yield from pages
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def sample_pdf_pages(source: DocumentSource, limit: int, mode: str = "text") -> list:
+    """Up to limit pages spread evenly from the first page to the last, in page order"""
+    with open_pdf(source) as pdf:
+        page_count = pdf.page_count
+        if page_count <= limit:
+            page_nums = range(page_count)
+        else:
+            page_nums = sorted({i * (page_count - 1) // max(1, limit - 1) for i in range(limit)})
+        return [read_page(pdf.load_page(page_num), mode) for page_num in page_nums]
+
+
+def read_pdf_outline(source: DocumentSource, max_level: int = OUTLINE_MAX_LEVEL) -> List[Tuple[int, str, int]]:
+    """
+    Usable bookmarks as (level, title, 0-based page) in page order. Entries deeper
+    than max_level, without a title or pointing outside the document are dropped;
+    an empty list means the font heuristic has to be used instead.
+    """
+    with open_pdf(source) as pdf:
+        page_count = pdf.page_count
+        toc = pdf.get_toc(simple=True)
+
+    outline = [
+        (level, title.strip(), page - 1)
+        for level, title, page in toc
+        if level <= max_level and title.strip() and 1 <= page <= page_count
+    ]
+    if len(outline) < OUTLINE_MIN_ENTRIES:
+        return []
+    # Stable sort: entries on the same page keep their outline order
+    outline.sort(key=lambda entry: entry[2])
+    return outline
+
+
+def page_needs_fallback(text: str, page_area: float, image_coverage: float) -> bool:
+    """Decide from text density and image coverage whether a page needs the slow path"""
+    chars = len(text.strip())
+    if chars < MIN_PAGE_CHARS:
+        # Blank pages have nothing to recover; near-empty pages with images are likely scans
+        return image_coverage > 0
+    chars_per_sq_inch = chars / (page_area / (72 * 72))
+    return image_coverage >= IMAGE_COVERAGE_THRESHOLD and chars_per_sq_inch < MIN_CHARS_PER_SQ_INCH
+
+
+def _fallback_page(source: DocumentSource, page_num: int) -> str:
+    """Slow path for one page: pdfplumber first, then OCR when Tesseract is available"""
+    with pdfplumber.open(as_file(source), pages=[page_num + 1]) as pdf:
+        text = pdf.pages[0].extract_text() or ""
+    if len(text.strip()) >= MIN_PAGE_CHARS:
+        return text
+
+    try:
+        with open_pdf(source) as pdf:
+            page = pdf.load_page(page_num)
+            ocr_text = page.get_text("text", textpage=page.get_textpage_ocr(full=True))
+        if len(ocr_text.strip()) > len(text.strip()):
+            text = ocr_text
+    except Exception as e:
+        # Tesseract is optional; without it the pdfplumber result is all we have
+        print(f"OCR unavailable for page {page_num + 1}: {e}")
+    return text
+
+
+def _init_fallback_worker(source: DocumentSource):
+    global _fallback_source
+    _fallback_source = source
+
+
+def _fallback_worker_page(page_num: int) -> str:
+    return _fallback_page(_fallback_source, page_num)
+
+
+@dataclass
+class PdfText:
+    pages: List[str]
+    fallback_pages: List[int] = field(default_factory=list)  # 1-based, recovered by the slow path
+    degraded_pages: List[int] = field(default_factory=list)  # 1-based, slow path timed out or failed
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(self.pages)
+
+
+def extract_pdf_text_with_fallback(source: DocumentSource, time_budget: float = FALLBACK_TIME_BUDGET) -> PdfText:
+    """
+    Extract page texts with PyMuPDF and re-run only the pages that look scanned
+    through the slow path, concurrently and within time_budget seconds.
+    """
+    pages = []
+    suspect = []
+    for page_num, (text, page_area, image_coverage) in enumerate(iter_pdf_pages(source, "text_probe")):
+        pages.append(text)
+        if page_needs_fallback(text, page_area, image_coverage):
+            suspect.append(page_num)
+
+    result = PdfText(pages=pages)
+    if not suspect:
+        return result
+
+    # PyMuPDF is not thread-safe, so slow-path pages always run in worker processes;
+    # in-memory documents are small and sent along as bytes. The pool is this
+    # call's own and is terminated once the budget is spent, so OCR still running
+    # then cannot keep workers busy for later requests.
+    if not isinstance(source, (str, bytes)):
+        source = bytes(source)
+    pool = multiprocessing.get_context("spawn").Pool(
+        min(len(suspect), MAX_WORKERS), initializer=_init_fallback_worker, initargs=(source,)
+    )
+    try:
+        pending = {page_num: pool.apply_async(_fallback_worker_page, (page_num,)) for page_num in suspect}
+        deadline = time.monotonic() + time_budget
+        for page_num, async_result in pending.items():
+            async_result.wait(max(0.0, deadline - time.monotonic()))
+            if not async_result.ready():
+                result.degraded_pages.append(page_num + 1)  # Out of time
+                continue
+            try:
+                recovered = async_result.get()
+            except Exception as e:
+                print(f"Slow path failed for page {page_num + 1}: {e}")
+                result.degraded_pages.append(page_num + 1)
+                continue
+            # Finding nothing better is not degraded: the fast-path text stands
+            if len(recovered.strip()) > len(pages[page_num].strip()):
+                pages[page_num] = recovered
+                result.fallback_pages.append(page_num + 1)
+    finally:
+        pool.terminate()
+        pool.join()
+    return result
+
 
 def extract_text_from_pdf(file):
     """Extract text from a PDF file"""
-    pdf = fitz.open(file)
-    text = ""
-    for page_num in range(pdf.page_count):
-        page = pdf.load_page(page_num)
-        text += page.get_text()
-    return text
+    return "".join(iter_pdf_pages(file, "text"))
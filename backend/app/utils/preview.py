@@ -0,0 +1,79 @@
+"""
+Cheap look at a document for preview summaries: its section titles and the
+text of its first pages, without parsing the rest of the file.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional
+from django.conf import settings
+from .ingestion import DocumentSource
+from .ooxml import iter_docx_paragraphs, iter_pptx_slides
+from .pdf_processor import open_pdf, read_pdf_outline
+
+PREVIEW_PAGES = getattr(settings, 'PREVIEW_PAGES', 3)  # PDF pages or slides read in full
+PREVIEW_MAX_CHARS = 6000  # Opening text sent to Gemini
+PREVIEW_MAX_TITLES = 80
+
+
+@dataclass
+class DocumentPreview:
+    titles: List[str] = field(default_factory=list)  # Outline, slide or heading titles in document order
+    opening: str = ""  # Text of the first pages
+    page_count: Optional[int] = None  # Pages or slides, where known without a full parse
+
+
+def _preview_pdf(source: DocumentSource, pages: int) -> DocumentPreview:
+    titles = [title for _, title, _ in read_pdf_outline(source)]
+    with open_pdf(source) as pdf:
+        page_count = pdf.page_count
+        opening = "\n".join(pdf.load_page(i).get_text("text") for i in range(min(pages, page_count)))
+    return DocumentPreview(titles, opening, page_count)
+
+
+def _preview_pptx(source: DocumentSource, pages: int) -> DocumentPreview:
+    preview = DocumentPreview()
+    opening = []
+    count = 0
+    for slide in iter_pptx_slides(source):
+        count += 1
+        if slide.title:
+            preview.titles.append(slide.title)
+        if slide.number <= pages:
+            opening.extend([slide.title or "", *slide.body])
+    preview.opening = "\n".join(line for line in opening if line.strip())
+    preview.page_count = count
+    return preview
+
+
+def _preview_docx(source: DocumentSource, pages: int) -> DocumentPreview:
+    preview = DocumentPreview()
+    opening = []
+    opening_chars = 0
+    for paragraph in iter_docx_paragraphs(source):
+        if paragraph.heading_level is not None and paragraph.text.strip():
+            preview.titles.append(paragraph.text.strip())
+        if opening_chars < PREVIEW_MAX_CHARS:
+            opening.append(paragraph.text)
+            opening_chars += len(paragraph.text)
+    preview.opening = "\n".join(opening)
+    return preview
+
+
+PREVIEW_EXTRACTORS = {
+    '.pdf': _preview_pdf,
+    '.pptx': _preview_pptx,
+    '.docx': _preview_docx,
+}
+
+
+def extract_document_preview(source: DocumentSource, ext: Optional[str] = None,
+                             pages: int = PREVIEW_PAGES) -> DocumentPreview:
+    """Titles and opening text of a document, trimmed to what one small prompt needs"""
+    ext = (ext or os.path.splitext(source)[1]).lower()
+    extractor = PREVIEW_EXTRACTORS.get(ext)
+    if extractor is None:
+        raise ValueError(f"Unsupported file type: {ext}")
+    preview = extractor(source, pages)
+    preview.titles = preview.titles[:PREVIEW_MAX_TITLES]
+    preview.opening = preview.opening.strip()[:PREVIEW_MAX_CHARS]
+    return preview
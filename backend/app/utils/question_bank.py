@@ -0,0 +1,194 @@
+"""
+Per-document bank of generated multiple choice questions.
+
+Every question generated for a document is kept, keyed by the SHA-256 of the
+upload, with the embedding of its question and answer in a float16 array on
+disk. A request is served first from questions its client has not been given
+yet, so a repeat quiz on the same file needs neither text extraction nor
+Gemini. Only when a client has too few unseen questions left is the bank
+topped up, in the background, with new questions that are not near-duplicates
+of the ones it holds.
+"""
+import os
+import json
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from django.conf import settings
+from .chunk_selection import normalize_rows, unique_indices
+from .jobs import SUMMARY_JOBS
+from .llm_cache import llm_cache_bypass
+from .rate_limit import current_client
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+QUESTION_BANK_DIR = getattr(settings, 'QUESTION_BANK_DIR', os.path.join(settings.BASE_DIR, 'question_bank'))
+# A client with fewer unseen questions than this left for a document triggers a top-up
+QUESTION_BANK_LOW_WATER = getattr(settings, 'QUESTION_BANK_LOW_WATER', 10)
+QUESTION_BANK_TOP_UP = getattr(settings, 'QUESTION_BANK_TOP_UP', 20)  # Questions generated per top-up
+# Past this many questions a document's bank stops growing and serves questions again
+QUESTION_BANK_MAX_QUESTIONS = getattr(settings, 'QUESTION_BANK_MAX_QUESTIONS', 500)
+# Bump when the bank layout changes so stale banks are ignored
+BANK_VERSION = 1
+
+# (number of questions, questions already in the bank) -> (new questions, their embeddings)
+Generator = Callable[[int, List[str]], Tuple[List[Dict], np.ndarray]]
+
+
+class QuestionBank:
+    def __init__(self, root: str, max_questions: int = QUESTION_BANK_MAX_QUESTIONS):
+        self.root = str(root)
+        self.max_questions = max_questions
+        self._lock = threading.Lock()
+        self._refilling = set()  # Digests with a top-up queued or running in this process
+
+    def _dir(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.v{BANK_VERSION}")
+
+    @contextmanager
+    def _locked(self, digest: str):
+        """
+        Hold the bank from load to save. Other server processes and their jobs
+        write the same files, so besides the thread lock this takes an exclusive
+        lock on a file in the bank's directory.
+        """
+        directory = self._dir(digest)
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, 'lock'), 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file is closed
+                yield
+
+    def _load(self, digest: str) -> dict:
+        """The bank's index: {'questions': [...], 'seen': {client: [question indices, longest ago first]}}"""
+        try:
+            with open(os.path.join(self._dir(digest), 'index.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Question bank read error for {digest[:12]}: {e}")
+        return {'questions': [], 'seen': {}}
+
+    def _load_embeddings(self, digest: str, rows: int) -> np.ndarray:
+        """Embeddings of the first rows questions (rows added after a failed write are dropped)"""
+        try:
+            embeddings = np.load(os.path.join(self._dir(digest), 'embeddings.npy'))
+        except FileNotFoundError:
+            return np.zeros((0, 0), dtype=np.float32)
+        return embeddings[:rows].astype(np.float32)
+
+    def _write(self, directory: str, name: str, write: Callable[[str], None]):
+        # Write atomically so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, os.path.join(directory, name))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _save(self, digest: str, index: dict, embeddings: Optional[np.ndarray] = None):
+        directory = self._dir(digest)
+        os.makedirs(directory, exist_ok=True)
+        if embeddings is not None:
+            # Written before the index that refers to its rows
+            def write_embeddings(path):
+                with open(path, 'wb') as f:
+                    np.save(f, embeddings.astype(np.float16))
+            self._write(directory, 'embeddings.npy', write_embeddings)
+
+        def write_index(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, separators=(',', ':'))
+        self._write(directory, 'index.json', write_index)
+
+    def size(self, digest: str) -> int:
+        return len(self._load(digest)['questions'])
+
+    def question_texts(self, digest: str) -> List[str]:
+        return [mcq['question'] for mcq in self._load(digest)['questions']]
+
+    def add(self, digest: str, mcqs: List[Dict], embeddings: np.ndarray, threshold: float) -> List[int]:
+        """
+        Store the questions that are not near-duplicates of each other or of the
+        bank's, up to max_questions; returns the bank indices of the ones stored
+        """
+        if not mcqs:
+            return []
+        vectors = normalize_rows(embeddings)
+        keep = unique_indices(vectors, threshold)
+        with self._locked(digest):
+            index = self._load(digest)
+            first = len(index['questions'])
+            stored = self._load_embeddings(digest, first)
+            if first:
+                closest = (vectors[keep] @ stored.T).max(axis=1)
+                keep = [i for i, similarity in zip(keep, closest) if similarity < threshold]
+            keep = keep[:max(0, self.max_questions - first)]
+            if not keep:
+                return []
+            index['questions'].extend(mcqs[i] for i in keep)
+            self._save(digest, index, np.concatenate([stored, vectors[keep]]) if first else vectors[keep])
+            return list(range(first, first + len(keep)))
+
+    def take(self, digest: str, count: int, client: Optional[str] = None,
+             allow_seen: bool = False) -> Tuple[List[Dict], int]:
+        """
+        Up to count questions the client has not been given, marked as given; with
+        allow_seen the rest is made up from ones it has. Returns them with the
+        number of unseen questions the client has left.
+        """
+        client = client or current_client()
+        with self._locked(digest):
+            index = self._load(digest)
+            seen = index['seen'].get(client, [])
+            seen_set = set(seen)
+            unseen = [i for i in range(len(index['questions'])) if i not in seen_set]
+            chosen = unseen[:count]
+            if allow_seen and len(chosen) < count:
+                chosen += seen[:count - len(chosen)]  # Longest ago first
+            if chosen:
+                chosen_set = set(chosen)
+                index['seen'][client] = [i for i in seen if i not in chosen_set] + chosen
+                self._save(digest, index)
+            return [index['questions'][i] for i in chosen], len(unseen) - min(count, len(unseen))
+
+    def request_top_up(self, digest: str, generate: Generator, threshold: float,
+                       count: int = QUESTION_BANK_TOP_UP) -> Optional[str]:
+        """
+        Queue a background job adding about count new questions to the bank, unless
+        one is already pending here or the bank is full; returns the job id
+        """
+        with self._lock:
+            if digest in self._refilling or self.size(digest) >= self.max_questions:
+                return None
+            self._refilling.add(digest)
+        try:
+            return SUMMARY_JOBS.submit(self._top_up, digest, generate, threshold, count)
+        except Exception:
+            with self._lock:
+                self._refilling.discard(digest)
+            raise
+
+    def _top_up(self, digest: str, generate: Generator, threshold: float, count: int) -> dict:
+        try:
+            # A cached answer would only repeat questions the bank already holds
+            with llm_cache_bypass():
+                mcqs, embeddings = generate(count, self.question_texts(digest))
+            added = self.add(digest, mcqs, embeddings, threshold)
+            return {'generated': len(mcqs), 'added': len(added), 'bank_size': self.size(digest)}
+        finally:
+            with self._lock:
+                self._refilling.discard(digest)
+
+
+QUESTION_BANK = QuestionBank(QUESTION_BANK_DIR)
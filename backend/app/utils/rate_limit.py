@@ -0,0 +1,216 @@
+"""
+Process-wide admission control for Gemini.
+
+Every Gemini call in the backend (summaries, flashcards, MCQs, Jarvis and image
+analysis) goes through GEMINI_GOVERNOR.admit() first, so they share the
+account's requests-per-minute and tokens-per-minute quota instead of each
+discovering it through 429s. With several server processes each one admits
+calls at an equal share of the quota (GEMINI_PROCESSES). Waiting calls are served by lane (interactive
+voice, then images, then bulk documents) and, within a lane, fairly between
+clients using start-time fair queuing on the tokens each client asked for.
+"""
+import time
+import heapq
+import functools
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Optional
+from django.conf import settings
+from .boilerplate import CHARS_PER_TOKEN
+
+# Gemini quotas for the configured key (free tier of gemini-2.0-flash by default)
+GEMINI_REQUESTS_PER_MINUTE = getattr(settings, 'GEMINI_REQUESTS_PER_MINUTE', 15)
+GEMINI_TOKENS_PER_MINUTE = getattr(settings, 'GEMINI_TOKENS_PER_MINUTE', 1_000_000)
+# Server processes sharing the key; each governor admits calls at an equal share
+GEMINI_PROCESSES = max(1, getattr(settings, 'GEMINI_PROCESSES', 1))
+# Proxies that append the address they received a request from to X-Forwarded-For
+TRUSTED_PROXY_COUNT = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
+
+# Priority lanes, highest first
+LANE_INTERACTIVE = 0  # Jarvis voice queries
+LANE_IMAGE = 1  # Image analysis
+LANE_BULK = 2  # Document summaries, flashcards and MCQs
+LANE_NAMES = {LANE_INTERACTIVE: 'interactive', LANE_IMAGE: 'image', LANE_BULK: 'bulk'}
+# How long a call may queue for quota before giving up; bulk work waits its turn
+LANE_TIMEOUTS = {LANE_INTERACTIVE: 10.0, LANE_IMAGE: 30.0, LANE_BULK: None}
+
+# Fair-queuing state is pruned once this many clients have been seen
+MAX_TRACKED_CLIENTS = 1024
+
+# Gemini bills an inline image as a fixed number of input tokens
+IMAGE_TOKENS = 258
+
+# Client that LLM calls are charged to when no request is in scope
+_current_client = contextvars.ContextVar('llm_client', default='anonymous')
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def request_client_id(request) -> str:
+    """Fair-queuing identity for a Django request: the user when logged in, else the client address"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    address = request.META.get('REMOTE_ADDR', '')
+    if TRUSTED_PROXY_COUNT:
+        # Only the entries our own proxies appended can be trusted; anything to
+        # their left came from the client and could name any address
+        forwarded = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+        if len(forwarded) >= TRUSTED_PROXY_COUNT:
+            address = forwarded[-TRUSTED_PROXY_COUNT]
+    return f"ip:{address or 'unknown'}"
+
+
+@contextmanager
+def llm_client(client_id: str):
+    """Charge Gemini calls made in this context (and contexts copied from it) to client_id"""
+    token = _current_client.set(client_id)
+    try:
+        yield
+    finally:
+        _current_client.reset(token)
+
+
+def current_client() -> str:
+    return _current_client.get()
+
+
+def llm_client_from_request(view):
+    """Decorate a view (function or method) so its Gemini calls are charged to the requesting client"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if hasattr(arg, 'META'))
+        with llm_client(request_client_id(request)):
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class LLMQuotaTimeout(Exception):
+    """A call waited longer than its lane allows for Gemini quota"""
+
+
+class TokenBucket:
+    """Refills at rate_per_minute up to capacity; callers hold the governor's lock"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0  # Tokens per second
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.tokens -= amount
+
+
+@dataclass
+class LaneMetrics:
+    queued: int = 0  # Calls waiting right now
+    admitted: int = 0
+    timeouts: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+class LLMGovernor:
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._queue = []  # Heap of [lane, start tag, sequence, cancelled]
+        self._sequence = itertools.count()
+        self._virtual_time = {lane: 0.0 for lane in LANE_NAMES}  # Start tag of the lane's last admitted call
+        self._finish_tags: Dict[tuple, float] = {}  # (lane, client) -> finish tag of the client's last call
+        self._metrics = {lane: LaneMetrics() for lane in LANE_NAMES}
+
+    def admit(self, lane: int, tokens: int, client: Optional[str] = None, timeout: Optional[float] = None) -> float:
+        """
+        Block until a call of about `tokens` input tokens may be sent in `lane`.
+        Returns the seconds waited; raises LLMQuotaTimeout after `timeout` seconds
+        (the lane's default when not given).
+        """
+        client = client or current_client()
+        timeout = LANE_TIMEOUTS[lane] if timeout is None else timeout
+        tokens = min(max(1, tokens), self.tokens.capacity)
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        metrics = self._metrics[lane]
+
+        with self._cond:
+            flow = (lane, client)
+            start_tag = max(self._virtual_time[lane], self._finish_tags.get(flow, 0.0))
+            self._finish_tags[flow] = start_tag + tokens
+            ticket = [lane, start_tag, next(self._sequence), False]
+            heapq.heappush(self._queue, ticket)
+            metrics.queued += 1
+            try:
+                while True:
+                    while self._queue[0][3]:  # Drop calls that gave up
+                        heapq.heappop(self._queue)
+                    now = time.monotonic()
+                    wait = None  # Not at the head: wait for a notification
+                    if self._queue[0] is ticket:
+                        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                        if wait <= 0:
+                            self.requests.take(1, now)
+                            self.tokens.take(tokens, now)
+                            heapq.heappop(self._queue)
+                            self._virtual_time[lane] = start_tag
+                            break
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            ticket[3] = True
+                            metrics.timeouts += 1
+                            raise LLMQuotaTimeout(
+                                f"Gemini quota not available within {timeout:g}s ({LANE_NAMES[lane]} lane)"
+                            )
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                metrics.queued -= 1
+                self._cond.notify_all()
+
+            waited = time.monotonic() - started
+            metrics.admitted += 1
+            metrics.total_wait += waited
+            metrics.max_wait = max(metrics.max_wait, waited)
+            if len(self._finish_tags) > MAX_TRACKED_CLIENTS:
+                # Clients whose last call is behind their lane's virtual time need no state
+                self._finish_tags = {
+                    flow: tag for flow, tag in self._finish_tags.items() if tag > self._virtual_time[flow[0]]
+                }
+        return waited
+
+    def metrics(self) -> dict:
+        """Queue depth and wait times per lane"""
+        with self._cond:
+            return {
+                LANE_NAMES[lane]: {
+                    'queue_depth': m.queued,
+                    'admitted': m.admitted,
+                    'timeouts': m.timeouts,
+                    'mean_wait': m.total_wait / m.admitted if m.admitted else 0.0,
+                    'max_wait': m.max_wait,
+                }
+                for lane, m in self._metrics.items()
+            }
+
+
+# Shared by every Gemini caller in the process, since the quota belongs to the key;
+# the other server processes hold the rest of it
+GEMINI_GOVERNOR = LLMGovernor(GEMINI_REQUESTS_PER_MINUTE / GEMINI_PROCESSES,
+                              GEMINI_TOKENS_PER_MINUTE / GEMINI_PROCESSES)
@@ -0,0 +1,166 @@
+"""
+Retries and deadlines for Gemini calls.
+
+call_with_retry() admits a call through GEMINI_GOVERNOR, retries transient
+failures and unusable answers with exponential backoff and full jitter, and
+waits at least as long as the server asks in a retry-after hint. A deadline set
+for the whole request (llm_deadline / llm_deadline_for_request) is checked
+before every attempt and every sleep, so a request that cannot finish in time
+fails straight away with LLMDeadlineExceeded instead of sleeping on.
+"""
+import re
+import time
+import random
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Optional, TypeVar
+from django.conf import settings
+from .rate_limit import GEMINI_GOVERNOR, LANE_TIMEOUTS, LLMQuotaTimeout
+
+GEMINI_MAX_ATTEMPTS = getattr(settings, 'GEMINI_MAX_ATTEMPTS', 4)
+GEMINI_RETRY_BASE_DELAY = getattr(settings, 'GEMINI_RETRY_BASE_DELAY', 1.0)  # seconds
+GEMINI_RETRY_MAX_DELAY = getattr(settings, 'GEMINI_RETRY_MAX_DELAY', 30.0)  # seconds
+# Time a request may spend on Gemini calls, retries and quota waits included
+LLM_REQUEST_DEADLINE = getattr(settings, 'LLM_REQUEST_DEADLINE', 90.0)  # seconds
+
+# HTTP statuses worth another attempt: timeouts, rate limits and server errors
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+_RETRY_HINTS = (
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)"),  # google.rpc.RetryInfo in the error details
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),  # "Please retry in 27.5s."
+)
+
+# time.monotonic() by which the current request's Gemini calls must be done
+_deadline = contextvars.ContextVar('llm_deadline', default=None)
+
+T = TypeVar('T')
+
+
+class LLMCallError(Exception):
+    """Gemini could not produce a usable answer for this request"""
+
+
+class LLMDeadlineExceeded(LLMCallError):
+    """The request's deadline ran out before Gemini answered"""
+
+
+class LLMUnavailableError(LLMCallError):
+    """Every attempt failed or gave an unusable answer"""
+
+
+@contextmanager
+def llm_deadline(seconds: float, inherit: bool = True):
+    """
+    Give Gemini calls in this context (and contexts copied from it) at most `seconds`
+    in total; an enclosing deadline still applies unless inherit is False
+    """
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get() if inherit else None
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def llm_deadline_for_request(view):
+    """Decorate a view (function or method) so its Gemini calls share LLM_REQUEST_DEADLINE"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with llm_deadline(LLM_REQUEST_DEADLINE):
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Delay the server asked for, from a Retry-After header or the error's retry details"""
+    response = getattr(error, 'response', None)
+    header = getattr(response, 'headers', {}).get('Retry-After') if response is not None else None
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    for pattern in _RETRY_HINTS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transient errors: google.api_core errors carry the HTTP status as .code"""
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def backoff_delay(attempt: int, base: float = GEMINI_RETRY_BASE_DELAY, cap: float = GEMINI_RETRY_MAX_DELAY) -> float:
+    """Full jitter: uniform between 0 and the exponential backoff for this attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_retry(call: Callable[[], T], lane: int, tokens: int, accept: Optional[Callable[[T], bool]] = None,
+                    timing=None, max_attempts: int = GEMINI_MAX_ATTEMPTS, description: str = "Gemini call") -> T:
+    """
+    Run call() once admitted to `lane` for about `tokens` input tokens, retrying
+    transient errors and answers that accept() rejects. timing, when given, has
+    its attempts and rate_limit_wait updated (see summarize.BatchTiming).
+    """
+    last_problem = "no attempt was made"
+    for attempt in range(max_attempts):
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise LLMDeadlineExceeded(f"{description}: request deadline reached after {attempt} attempt(s)")
+
+        # Queue for quota no longer than the lane allows or the deadline leaves
+        lane_timeout = LANE_TIMEOUTS[lane]
+        timeout = remaining if lane_timeout is None else (
+            lane_timeout if remaining is None else min(lane_timeout, remaining)
+        )
+        try:
+            waited = GEMINI_GOVERNOR.admit(lane, tokens, timeout=timeout)
+        except LLMQuotaTimeout as e:
+            if remaining is not None and timeout == remaining:
+                raise LLMDeadlineExceeded(f"{description}: request deadline reached waiting for quota") from e
+            raise
+        if timing is not None:
+            timing.rate_limit_wait += waited
+            timing.attempts += 1
+
+        hint = None
+        try:
+            result = call()
+            if accept is None or accept(result):
+                return result
+            last_problem = "the answer was unusable"
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            last_problem = f"{type(e).__name__}: {e}"
+            hint = retry_after(e)
+            print(f"{description} failed (attempt {attempt + 1}): {last_problem}")
+
+        if attempt == max_attempts - 1:
+            break
+        delay = backoff_delay(attempt)
+        if hint is not None:
+            delay = max(delay, hint + random.uniform(0, GEMINI_RETRY_BASE_DELAY))
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            raise LLMDeadlineExceeded(
+                f"{description}: not retrying, as the next attempt ({delay:.1f}s away) would miss the request deadline"
+                f" (last problem: {last_problem})"
+            )
+        time.sleep(delay)
+
+    raise LLMUnavailableError(f"{description} gave no usable answer after {max_attempts} attempts ({last_problem})")
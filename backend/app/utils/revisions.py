@@ -0,0 +1,116 @@
+"""
+Reuse of batch summaries across revisions of a document.
+
+After a summary, the batch summaries are stored per (client, file name) as
+spans: a run of source sections, identified by content hashes, together with
+the summaries of the batches made from it. When the same client uploads a new
+version, its sections are matched against the stored spans; runs of unchanged
+sections keep their summaries and only the changed regions are batched and sent
+to Gemini again.
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from .batching import SUMMARY_BATCH_TOKENS
+from .document_store import DOCUMENT_STORE
+from .rate_limit import current_client
+from .sections import DocumentSection
+
+
+@dataclass
+class SummarySpan:
+    sections: List[str]  # Content hashes of the source sections covered, in document order
+    summaries: List[str]  # Summaries of the batches made from them
+
+
+def section_hash(section: DocumentSection) -> str:
+    return hashlib.sha256(f"{section.title}\0{section.content}".encode('utf-8')).hexdigest()[:32]
+
+
+def revision_key(file_name: str, model_name: str, client: Optional[str] = None) -> str:
+    """Store key for the revisions of a file uploaded by a client; batching settings are part of it"""
+    identity = f"{client or current_client()}\0{file_name.lower()}\0{model_name}\0{SUMMARY_BATCH_TOKENS}"
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+def align_spans(hashes: List[str], spans: List[SummarySpan]) -> List[Tuple[int, int, Optional[SummarySpan]]]:
+    """
+    Split a document's section hashes into (start, end, span) regions: span is a
+    stored span whose sections reappear unchanged at start:end, or None for a
+    region that has to be summarized again
+    """
+    by_first: Dict[str, List[SummarySpan]] = {}
+    for span in spans:
+        if span.sections:
+            by_first.setdefault(span.sections[0], []).append(span)
+    for candidates in by_first.values():
+        candidates.sort(key=lambda span: len(span.sections), reverse=True)  # Prefer the longest match
+
+    regions = []
+    fresh_start = None
+    i = 0
+    while i < len(hashes):
+        match = next(
+            (span for span in by_first.get(hashes[i], ())
+             if hashes[i:i + len(span.sections)] == span.sections),
+            None
+        )
+        if match is None:
+            if fresh_start is None:
+                fresh_start = i
+            i += 1
+            continue
+        if fresh_start is not None:
+            regions.append((fresh_start, i, None))
+            fresh_start = None
+        regions.append((i, i + len(match.sections), match))
+        i += len(match.sections)
+    if fresh_start is not None:
+        regions.append((fresh_start, len(hashes), None))
+    return regions
+
+
+def spans_from_batches(hashes: List[str], start: int, end: int,
+                       sources: List[List[int]], summaries: List[str]) -> List[SummarySpan]:
+    """
+    Spans for a freshly summarized region: batches that share a section are kept
+    together, and each span runs up to where the next one starts, so sections
+    that were left out still invalidate the span they sit in when they change
+    """
+    groups: List[Tuple[int, List[str]]] = []  # (first source section, summaries)
+    last_source = -1
+    for batch_sources, summary in zip(sources, summaries):
+        if groups and batch_sources and batch_sources[0] <= last_source:
+            groups[-1][1].append(summary)
+        else:
+            groups.append((batch_sources[0] if batch_sources else last_source + 1, [summary]))
+        last_source = max([last_source, *batch_sources])
+
+    spans = []
+    for number, (first, group_summaries) in enumerate(groups):
+        span_start = start if number == 0 else first
+        span_end = groups[number + 1][0] if number + 1 < len(groups) else end
+        spans.append(SummarySpan(sections=hashes[span_start:span_end], summaries=group_summaries))
+    return spans
+
+
+class SummaryRevisions:
+    """Stored spans of the last summary of each (client, file), kept in the document store"""
+
+    def __init__(self, store=DOCUMENT_STORE):
+        self.store = store
+
+    def load(self, key: str) -> List[SummarySpan]:
+        payload = self.store.get(key, 'revision')
+        if payload is None:
+            return []
+        return [SummarySpan(sections, summaries) for sections, summaries in payload['spans']]
+
+    def save(self, key: str, spans: List[SummarySpan]):
+        try:
+            self.store.put(key, 'revision', {'spans': [[span.sections, span.summaries] for span in spans]})
+        except OSError as e:
+            print(f"Could not store summary revision {key[:12]}: {e}")
+
+
+SUMMARY_REVISIONS = SummaryRevisions()
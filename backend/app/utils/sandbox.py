@@ -0,0 +1,237 @@
+"""
+Supervised worker processes for document parsing.
+
+fitz, pdfplumber and python-pptx can spin or balloon on a pathological file.
+Running them here keeps the Django worker responsive: every job has a
+wall-clock and RSS limit, a worker that breaks one is killed (together with any
+page-range pool it started), and workers are recycled after a fixed number of
+jobs so slow leaks in the parsers never accumulate.
+"""
+import os
+import time
+import signal
+import atexit
+import threading
+import multiprocessing
+from typing import Callable, List, Optional
+from django.conf import settings
+from .document_store import ExtractedText, extract_document_text
+from .ingestion import DocumentSource
+from .pdf_processor import limit_page_workers
+from .preview import DocumentPreview, extract_document_preview
+from .sections import ExtractedSections
+from .summarize import DocumentSectioner
+
+EXTRACTION_WORKERS = getattr(settings, 'EXTRACTION_WORKERS', min(4, os.cpu_count() or 1))
+EXTRACTION_TIMEOUT = getattr(settings, 'EXTRACTION_TIMEOUT', 120.0)  # seconds per job
+EXTRACTION_MAX_RSS_BYTES = getattr(settings, 'EXTRACTION_MAX_RSS_BYTES', 1024 * 1024 * 1024)  # 1 GB
+EXTRACTION_JOBS_PER_WORKER = getattr(settings, 'EXTRACTION_JOBS_PER_WORKER', 50)
+# Page-range and slow-path processes each worker may start for one PDF. The
+# sandbox already parses documents side by side, and those processes count
+# towards the worker's memory limit, so this stays far below the core count.
+EXTRACTION_PAGE_WORKERS = getattr(settings, 'EXTRACTION_PAGE_WORKERS', 2)
+# Previews only read titles and the first pages, so they get a much shorter leash
+PREVIEW_EXTRACTION_TIMEOUT = getattr(settings, 'PREVIEW_EXTRACTION_TIMEOUT', 15.0)
+
+# How often a running job's memory and elapsed time are checked
+POLL_INTERVAL = 0.1
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class DocumentTooComplexError(Exception):
+    """A document could not be parsed within the sandbox's time or memory limits"""
+
+
+def _worker_main(conn, page_workers: int):
+    # Own process group, so a kill also takes down pools the parsers start
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    limit_page_workers(page_workers)
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return  # Parent went away
+        if job is None:
+            return
+        fn, args = job
+        try:
+            reply = ('ok', fn(*args))
+        except Exception as e:
+            reply = ('error', e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # The result or exception did not pickle
+            conn.send(('error', RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+def _child_pids(pid: int) -> List[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def tree_rss(pid: int) -> int:
+    """Resident memory of a process and its descendants in bytes (0 where /proc is unavailable)"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * _PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            continue
+        pending.extend(_child_pids(current))
+    return total
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        # Not a daemon: parsers may start their own page-range pools
+        self.process = context.Process(target=_worker_main, args=(child_conn, EXTRACTION_PAGE_WORKERS), daemon=False)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def kill(self):
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.join(timeout=5)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class ExtractionSandbox:
+    """
+    A bounded pool of spawned parser processes. run() blocks the calling thread
+    until its job finishes, fails, or breaks a limit, in which case it raises
+    DocumentTooComplexError.
+    """
+
+    def __init__(self, max_workers: int = EXTRACTION_WORKERS, timeout: float = EXTRACTION_TIMEOUT,
+                 max_rss_bytes: int = EXTRACTION_MAX_RSS_BYTES, jobs_per_worker: int = EXTRACTION_JOBS_PER_WORKER):
+        self.timeout = timeout
+        self.max_rss_bytes = max_rss_bytes
+        self.jobs_per_worker = jobs_per_worker
+        self._context = multiprocessing.get_context("spawn")  # Same reason as the PDF page pool
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self._idle: List[_Worker] = []
+        self._closed = False
+
+    def _checkout(self) -> _Worker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.conn.close()
+        return _Worker(self._context)
+
+    def _checkin(self, worker: _Worker):
+        if worker.jobs >= self.jobs_per_worker or self._closed:
+            worker.stop()  # Recycle before parser leaks add up
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    def run(self, fn: Callable, *args, timeout: Optional[float] = None):
+        """Run fn(*args) in a worker; fn and its arguments must be picklable"""
+        timeout = self.timeout if timeout is None else timeout
+        with self._slots:
+            worker = self._checkout()
+            worker.jobs += 1
+            try:
+                worker.conn.send((fn, args))
+                deadline = time.monotonic() + timeout
+                while not worker.conn.poll(POLL_INTERVAL):
+                    if not worker.process.is_alive():
+                        raise DocumentTooComplexError("The document crashed the parser")
+                    if time.monotonic() > deadline:
+                        raise DocumentTooComplexError(f"Parsing took longer than {timeout:.0f} seconds")
+                    if self.max_rss_bytes and tree_rss(worker.process.pid) > self.max_rss_bytes:
+                        raise DocumentTooComplexError(
+                            f"Parsing needed more than {self.max_rss_bytes // (1024 * 1024)} MB of memory"
+                        )
+                outcome, value = worker.conn.recv()
+            except DocumentTooComplexError:
+                worker.kill()
+                raise
+            except (EOFError, OSError):
+                worker.kill()
+                raise DocumentTooComplexError("The document crashed the parser")
+            except BaseException:
+                worker.kill()
+                raise
+
+            self._checkin(worker)
+            if outcome == 'error':
+                raise value
+            return value
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+
+def _extract_sections_job(source: DocumentSource, ext: Optional[str]) -> ExtractedSections:
+    return DocumentSectioner().extract_document_sections(source, ext)
+
+
+def _extract_text_job(source: DocumentSource, ext: Optional[str]) -> ExtractedText:
+    return extract_document_text(source, ext)
+
+
+def _extract_preview_job(source: DocumentSource, ext: Optional[str]) -> DocumentPreview:
+    return extract_document_preview(source, ext)
+
+
+def _picklable(source: DocumentSource) -> DocumentSource:
+    # Memory-mapped uploads always have a path; anything else is sent as bytes
+    return source if isinstance(source, (str, bytes)) else bytes(source)
+
+
+def extract_sections_sandboxed(source: DocumentSource, ext: Optional[str] = None) -> ExtractedSections:
+    """DocumentSectioner.extract_document_sections in an extraction worker"""
+    return EXTRACTION_SANDBOX.run(_extract_sections_job, _picklable(source), ext)
+
+
+def extract_text_sandboxed(source: DocumentSource, ext: Optional[str] = None) -> ExtractedText:
+    """extract_document_text in an extraction worker"""
+    return EXTRACTION_SANDBOX.run(_extract_text_job, _picklable(source), ext)
+
+
+def extract_preview_sandboxed(source: DocumentSource, ext: Optional[str] = None) -> DocumentPreview:
+    """extract_document_preview in an extraction worker"""
+    return EXTRACTION_SANDBOX.run(_extract_preview_job, _picklable(source), ext, timeout=PREVIEW_EXTRACTION_TIMEOUT)
+
+
+EXTRACTION_SANDBOX = ExtractionSandbox()
+atexit.register(EXTRACTION_SANDBOX.close)
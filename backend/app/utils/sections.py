@@ -0,0 +1,148 @@
+import heapq
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Sequence
+from .boilerplate import BoilerplateReport
+
+@dataclass
+class DocumentSection:
+    title: str
+    content: str
+    importance: float = 1.0
+    depth: int = 1  # Hierarchy depth (1 = main section, 2 = subsection, etc.)
+
+# How a document was split into sections, reported back to clients
+SECTIONING_OUTLINE = "outline"  # PDF bookmarks (table of contents)
+SECTIONING_FONT_HEURISTIC = "font_heuristic"  # PDF font sizes and bold/italic flags
+SECTIONING_SLIDES = "slides"  # PowerPoint titles and section divider slides
+SECTIONING_STYLES = "styles"  # Word paragraph styles
+
+@dataclass
+class ExtractedSections:
+    sections: List[DocumentSection]
+    strategy: str
+    boilerplate: BoilerplateReport = field(default_factory=BoilerplateReport)  # Headers/footers removed
+
+IMPORTANT_TITLE_KEYWORDS = ('introduction', 'conclusion', 'summary', 'result', 'finding', 'discussion', 'analysis')
+
+class SectionTable:
+    """
+    Column-oriented section storage: every section's content lives in one text
+    buffer and is addressed by (start, end) offsets, with depth, importance and
+    word count kept in parallel arrays. Merge, scoring and top-k selection are
+    single passes (top-k is n log k) instead of list pops and index() lookups.
+    """
+
+    __slots__ = ('buffer', 'titles', 'starts', 'ends', 'depths', 'importance', 'word_counts')
+
+    def __init__(self):
+        self.buffer = ""
+        self.titles: List[str] = []
+        self.starts = array('q')
+        self.ends = array('q')
+        self.depths = array('i')
+        self.importance = array('d')
+        self.word_counts = array('q')
+
+    @classmethod
+    def from_sections(cls, sections: Iterable[DocumentSection]) -> 'SectionTable':
+        table = cls()
+        parts = []
+        offset = 0
+        for section in sections:
+            parts.append(section.content)
+            table._append_row(section.title, offset, offset + len(section.content), section.depth,
+                              section.importance, len(section.content.split()))
+            offset += len(section.content)
+        table.buffer = "".join(parts)
+        return table
+
+    def _append_row(self, title: str, start: int, end: int, depth: int, importance: float, words: int):
+        self.titles.append(title)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.depths.append(depth)
+        self.importance.append(importance)
+        self.word_counts.append(words)
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def content(self, index: int) -> str:
+        return self.buffer[self.starts[index]:self.ends[index]]
+
+    def merge_small(self, min_words: int = 30) -> 'SectionTable':
+        """
+        Fold sections shorter than min_words into the section that follows them,
+        producing "title:\\ncontent\\n\\nnext content" exactly like the old pop() loop.
+        """
+        merged = SectionTable()
+        parts = []
+        offset = 0
+        pending_prefix = []  # Text of small sections waiting for the next section
+        pending_words = 0
+
+        for i in range(len(self)):
+            words = self.word_counts[i] + pending_words
+            is_last = i == len(self) - 1
+            if words < min_words and not is_last:
+                title = self.titles[i]
+                # Runs of small sections are capped at min_words, so this prefix stays short
+                pending_prefix = [f"{title}:\n", *pending_prefix, self.content(i), "\n\n"]
+                pending_words = words + len(f"{title}:".split())
+                continue
+
+            start = offset
+            for piece in pending_prefix:
+                parts.append(piece)
+                offset += len(piece)
+            content = self.content(i)
+            parts.append(content)
+            offset += len(content)
+            merged._append_row(self.titles[i], start, offset, self.depths[i], self.importance[i], words)
+            pending_prefix = []
+            pending_words = 0
+
+        merged.buffer = "".join(parts)
+        return merged
+
+    def score(self) -> 'SectionTable':
+        """Importance from position, length, title keywords and depth, in one pass"""
+        count = len(self)
+        for i in range(count):
+            # Base importance on position (higher for earlier sections)
+            position_weight = max(1.0, 1.5 - (i / count))
+
+            # Content length factor (longer sections might be more important)
+            length_weight = min(1.5, max(0.5, self.word_counts[i] / 500))
+
+            # Title importance (introductions, conclusions, etc.)
+            title = self.titles[i].lower()
+            title_weight = 1.5 if any(keyword in title for keyword in IMPORTANT_TITLE_KEYWORDS) else 1.0
+
+            # Depth weight (main sections are more important than subsections)
+            depth_weight = 1.5 / max(1, self.depths[i])
+
+            self.importance[i] = position_weight * length_weight * title_weight * depth_weight
+        return self
+
+    def top_indices(self, fraction: float = 0.8, minimum: int = 3) -> List[int]:
+        """Indices of the most important sections, returned in document order"""
+        k = min(len(self), max(minimum, int(len(self) * fraction)))
+        # nlargest is stable, so ties keep their document order like sort(reverse=True)
+        chosen = heapq.nlargest(k, range(len(self)), key=self.importance.__getitem__)
+        chosen.sort()
+        return chosen
+
+    def to_sections(self, indices: Optional[Sequence[int]] = None) -> List[DocumentSection]:
+        if indices is None:
+            indices = range(len(self))
+        return [
+            DocumentSection(
+                title=self.titles[i],
+                content=self.content(i),
+                importance=self.importance[i],
+                depth=self.depths[i]
+            )
+            for i in indices
+        ]
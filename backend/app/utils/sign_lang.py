@@ -14,6 +14,7 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
+from .model_registry import MODEL_REGISTRY
 
 # Disable TensorFlow logging and GPU
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
@@ -37,14 +38,18 @@ dirListing = os.listdir(op_dest)
 editFiles = [item for item in dirListing if ".webp" in item]
 file_map = {i: i.replace(".webp", "").split() for i in editFiles}
 
-# Load the model for gesture recognition
+# The model for gesture recognition is loaded through MODEL_REGISTRY on first use
 image_x, image_y = 64, 64
-try:
+
+
+def load_sign_classifier():
     model_path = os.path.join(BASE_DIR, "model.h5")
-    classifier = load_model(model_path)  # Use the properly constructed path
-    print("Model loaded successfully")
-except Exception as e:
-    print(f"Error loading model: {e}")
+    return load_model(model_path)  # Use the properly constructed path
+
+
+def warm_up_sign_classifier(classifier):
+    with tf.device('/CPU:0'):
+        classifier.predict(np.zeros((1, image_x, image_y, 3), dtype=np.float32), verbose=0)
 
 # Function to process input text and predict corresponding sign language gestures
 def give_char():
@@ -53,7 +58,7 @@ def give_char():
         test_image = image.img_to_array(test_image)
         test_image = np.expand_dims(test_image, axis=0)
         with tf.device('/CPU:0'):
-            result = classifier.predict(test_image)
+            result = MODEL_REGISTRY.get('sign-classifier').predict(test_image)
         chars = "ABCDEFGHIJKMNOPQRSTUVWXYZ"
         indx = np.argmax(result[0])
         return chars[indx]
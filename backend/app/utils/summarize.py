@@ -1,173 +1,265 @@
-import fitz  # PyMuPDF for PDF
-import pptx  # python-pptx for PowerPoint
-import docx  # python-docx for Word documents
 import google.generativeai as genai
 import os
-from typing import List, Dict, Tuple, Optional
-from dataclasses import dataclass
+from typing import List, Dict, Tuple, Optional, Iterator, Iterable, Callable
+from collections import Counter
+from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
 import re
 import time
+import contextvars
+import threading
 import traceback
+from .batching import SUMMARY_BATCH_TOKENS, BatchPacker, count_tokens
+from .boilerplate import BOILERPLATE_SAMPLE_PAGES, BoilerplateFilter
+from .extractive import CompressionReport, ExtractiveCompressor, extract_token_budget
+from .ingestion import DocumentSource
+from .ooxml import iter_pptx_slides, iter_docx_paragraphs
+from .pdf_processor import iter_pdf_pages, read_pdf_outline, sample_pdf_pages
+from .llm_cache import LLM_CACHE, cache_bypassed
+from .preview import DocumentPreview
+from .rate_limit import LANE_BULK, LANE_INTERACTIVE, estimate_tokens
+from .retry import LLMCallError, LLMDeadlineExceeded, call_with_retry
+from .revisions import SUMMARY_REVISIONS, align_spans, section_hash, spans_from_batches
+from .sections import (
+    DocumentSection, ExtractedSections, SectionTable,
+    SECTIONING_OUTLINE, SECTIONING_FONT_HEURISTIC, SECTIONING_SLIDES, SECTIONING_STYLES
+)
+
+class FontSizeHistogram:
+    """Incremental font-size histogram used to derive heading thresholds"""
+
+    # Default thresholds if not enough samples
+    DEFAULT_THRESHOLDS = (16, 14, 12)
+
+    def __init__(self):
+        self.counts = Counter()
+        self.total = 0
+
+    def add(self, size: float):
+        self.counts[size] += 1
+        self.total += 1
+
+    def percentile(self, fraction: float) -> float:
+        """Return the size at the given fraction of the sorted samples"""
+        target = int(self.total * fraction)
+        seen = 0
+        for size in sorted(self.counts):
+            seen += self.counts[size]
+            if seen > target:
+                return size
+        return max(self.counts)
+
+    def heading_thresholds(self) -> Tuple[float, float, float]:
+        """Heading 1/2/3 thresholds from the 90th/80th/70th percentiles"""
+        if self.total <= 10:  # Not enough samples
+            return self.DEFAULT_THRESHOLDS
+        return (self.percentile(0.9), self.percentile(0.8), self.percentile(0.7))
+
+def merge_small_sections(sections: Iterable[DocumentSection], min_words: int = 30) -> Iterator[DocumentSection]:
+    """Fold sections shorter than min_words into the section that follows them"""
+    pending = None
+    for section in sections:
+        if pending is not None:
+            section.content = f"{pending.title}:\n{pending.content}\n\n{section.content}"
+        if len(section.content.split()) < min_words:
+            pending = section
+        else:
+            pending = None
+            yield section
+    # The last section is kept even when it is small
+    if pending is not None:
+        yield pending
+
+# Batches summarized at once for one document; the shared governor paces the calls
+SUMMARY_MAX_CONCURRENCY = 3
+# Partial summaries merged per reduce call, and the most reduce rounds before giving up
+# and returning the remaining parts side by side
+SUMMARY_FAN_OUT = getattr(settings, 'SUMMARY_FAN_OUT', 4)
+SUMMARY_MAX_DEPTH = getattr(settings, 'SUMMARY_MAX_DEPTH', 3)
+# Largest merge prompt input; a group is closed early rather than exceed it
+SUMMARY_MERGE_MAX_CHARS = 60000
+# Preview overviews are kept short so they come back in a couple of seconds
+PREVIEW_MAX_OUTPUT_TOKENS = 400
 
 @dataclass
-class DocumentSection:
-    title: str
-    content: str
-    importance: float = 1.0
-    depth: int = 1  # Hierarchy depth (1 = main section, 2 = subsection, etc.)
+class BatchTiming:
+    batch: int  # 1-based within its level
+    chars: int
+    level: int = 0  # 0 for document batches, n for the nth round of merging
+    rate_limit_wait: float = 0.0  # Seconds spent waiting for the Gemini quota
+    attempts: int = 0
+    seconds: float = 0.0  # Wall-clock time for the whole batch
 
-class QuotaFriendlyAnalyzer:
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        genai.configure(api_key=api_key)
-        # Use the latest Gemini model
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
-        self.api_calls = 0  # Track number of API calls
-        
-    def extract_pdf_text(self, pdf_path: str) -> List[DocumentSection]:
+def outline_title_pattern(title: str) -> re.Pattern:
+    """Match a bookmark title in page text regardless of case and line wrapping"""
+    return re.compile(r"\s+".join(re.escape(word) for word in title.split()), re.IGNORECASE)
+
+class DocumentSectioner:
+    """Splits documents into sections; holds no API client, so it can run in extraction workers"""
+
+    def extract_pdf_text(self, pdf_path: DocumentSource) -> List[DocumentSection]:
         """Extract text from PDF with improved section detection"""
+        return self.extract_pdf_sections(pdf_path).sections
+
+    def extract_pdf_sections(self, pdf_path: DocumentSource) -> ExtractedSections:
+        """Section a PDF by its outline when it has one, otherwise by font heuristics"""
         try:
-            pdf_document = fitz.open(pdf_path)
-            sections = []
-            current_text = []
-            current_title = "Introduction"
-            current_depth = 1
-            
-            # First pass: analyze document structure to identify fonts and styles
-            font_sizes = []
-            for page_num in range(min(5, pdf_document.page_count)):  # Sample first 5 pages
-                page = pdf_document.load_page(page_num)
-                blocks = page.get_text("dict")["blocks"]
-                
-                for block in blocks:
-                    if "lines" in block:
-                        for line in block["lines"]:
-                            for span in line["spans"]:
-                                if span["size"] > 0:  # Valid font size
-                                    font_sizes.append(span["size"])
-            
-            # Calculate font size thresholds for headers
-            font_sizes.sort()
-            if len(font_sizes) > 10:  # Enough samples
-                # Use percentiles to determine heading levels
-                heading1_threshold = font_sizes[int(len(font_sizes) * 0.9)]
-                heading2_threshold = font_sizes[int(len(font_sizes) * 0.8)]
-                heading3_threshold = font_sizes[int(len(font_sizes) * 0.7)]
-            else:
-                # Default thresholds if not enough samples
-                heading1_threshold = 16
-                heading2_threshold = 14
-                heading3_threshold = 12
-            
-            # Second pass: extract text with section detection
-            for page_num in range(pdf_document.page_count):
-                page = pdf_document.load_page(page_num)
-                blocks = page.get_text("dict")["blocks"]
-                
-                for block in blocks:
-                    if "lines" in block:
-                        formatted_text = []
-                        for line in block["lines"]:
-                            for span in line["spans"]:
-                                text = span["text"].strip()
-                                size = span["size"]
-                                flags = span["flags"]
-                                
-                                # Detect section headers with more granularity
-                                is_header = False
-                                new_depth = 0
-                                
-                                if size >= heading1_threshold or (flags & 16 and len(text) < 100 and text.strip()):
-                                    is_header = True
-                                    new_depth = 1  # Main heading
-                                elif size >= heading2_threshold or (flags & 4 and len(text) < 100 and text.strip()):
-                                    is_header = True
-                                    new_depth = 2  # Subheading
-                                elif size >= heading3_threshold and len(text) < 100 and text.strip():
-                                    is_header = True
-                                    new_depth = 3  # Sub-subheading
-                                
-                                if is_header and text and not text.isdigit() and len(text) > 1:
-                                    # Save current section before starting new one
-                                    if current_text:
-                                        sections.append(DocumentSection(
-                                            title=current_title,
-                                            content="\n".join(current_text),
-                                            depth=current_depth
-                                        ))
-                                    current_title = text
-                                    current_text = []
-                                    current_depth = new_depth
-                                elif text:
-                                    formatted_text.append(text)
-                        
-                        if formatted_text:
-                            current_text.append(" ".join(formatted_text))
-            
-            # Add final section
-            if current_text:
-                sections.append(DocumentSection(
-                    title=current_title,
-                    content="\n".join(current_text),
-                    depth=current_depth
-                ))
-            
-            # Post-process to combine very small sections with next section
-            i = 0
-            while i < len(sections) - 1:
-                if len(sections[i].content.split()) < 30:  # Less than 30 words
-                    # Combine with next section
-                    sections[i+1].content = f"{sections[i].title}:\n{sections[i].content}\n\n{sections[i+1].content}"
-                    sections.pop(i)
-                else:
-                    i += 1
-            
-            pdf_document.close()
-            return sections
-        
+            # Running headers and footers repeat on most pages, so a sample of pages finds
+            # them for both strategies without an extra pass over the whole document
+            boilerplate = BoilerplateFilter.from_pages(sample_pdf_pages(pdf_path, BOILERPLATE_SAMPLE_PAGES))
+
+            outline = read_pdf_outline(pdf_path)
+            if outline:
+                # Only the outline strategy needs plain text; its pages are streamed, not kept
+                pages = iter_pdf_pages(pdf_path, "text")
+                sections = list(merge_small_sections(self._iter_outline_sections(pages, outline, boilerplate)))
+                if sections:
+                    return ExtractedSections(sections, SECTIONING_OUTLINE, boilerplate.report)
+                boilerplate = BoilerplateFilter(boilerplate.keys)  # Report only what the fallback removes
+            sections = list(self.iter_pdf_sections(pdf_path, boilerplate))
+            return ExtractedSections(sections, SECTIONING_FONT_HEURISTIC, boilerplate.report)
         except Exception as e:
             print(f"PDF extraction error: {e}")
-            return []
+            return ExtractedSections([], SECTIONING_FONT_HEURISTIC)
+
+    def iter_pdf_sections(self, pdf_path: DocumentSource,
+                          boilerplate: Optional[BoilerplateFilter] = None) -> Iterator[DocumentSection]:
+        """Stream sections from a PDF, parsing each page exactly once"""
+        return merge_small_sections(self._iter_raw_pdf_sections(pdf_path, boilerplate))
+
+    def _iter_outline_sections(self, pages: Iterable[str], outline: List[Tuple[int, str, int]],
+                               boilerplate: BoilerplateFilter) -> Iterator[DocumentSection]:
+        """
+        Yield unmerged sections bounded by outline entries. Each entry starts at its
+        title's position on the target page (or the top of the page when the title
+        is not printed there), so only plain page text is needed.
+        """
+        entries = iter(outline)
+        next_entry = next(entries, None)
+        current_text = []
+        current_title = "Introduction"
+        current_depth = 1
+
+        for page_num, text in enumerate(pages):
+            text = boilerplate.clean_page(text)
+            cut = 0
+            while next_entry is not None and next_entry[2] == page_num:
+                level, title, _ = next_entry
+                match = outline_title_pattern(title).search(text, cut)
+                start, end = (match.start(), match.end()) if match else (cut, cut)
+
+                # Emit current section before starting new one
+                current_text.append(text[cut:start])
+                content = "".join(current_text).strip()
+                if content:
+                    yield DocumentSection(title=current_title, content=content, depth=current_depth)
 
-    def extract_pptx_text(self, pptx_path: str) -> List[DocumentSection]:
+                current_title = title
+                current_text = []
+                current_depth = level
+                cut = end
+                next_entry = next(entries, None)
+            current_text.append(text[cut:])
+
+        # Emit final section
+        content = "".join(current_text).strip()
+        if content:
+            yield DocumentSection(title=current_title, content=content, depth=current_depth)
+
+    def _iter_raw_pdf_sections(self, pdf_path: DocumentSource,
+                               boilerplate: Optional[BoilerplateFilter] = None) -> Iterator[DocumentSection]:
+        """Yield unmerged sections, detecting headers from a running font-size histogram"""
+        font_sizes = FontSizeHistogram()
+        current_text = []
+        current_title = "Introduction"
+        current_depth = 1
+
+        # Pages arrive in order; large files are parsed on the shared process pool
+        for blocks in iter_pdf_pages(pdf_path, "spans"):
+            if boilerplate:
+                # Headers and footers would otherwise skew the histogram and become sections
+                blocks = [block for block in map(boilerplate.clean_block, blocks) if block]
+
+            # Feed this page into the histogram before classifying it, so the
+            # thresholds always reflect every page seen so far
+            for block in blocks:
+                for _, size, _ in block:
+                    if size > 0:  # Valid font size
+                        font_sizes.add(size)
+            heading1_threshold, heading2_threshold, heading3_threshold = font_sizes.heading_thresholds()
+
+            for block in blocks:
+                formatted_text = []
+                for text, size, flags in block:
+                    text = text.strip()
+
+                    # Detect section headers with more granularity
+                    is_header = False
+                    new_depth = 0
+
+                    if size >= heading1_threshold or (flags & 16 and len(text) < 100 and text.strip()):
+                        is_header = True
+                        new_depth = 1  # Main heading
+                    elif size >= heading2_threshold or (flags & 4 and len(text) < 100 and text.strip()):
+                        is_header = True
+                        new_depth = 2  # Subheading
+                    elif size >= heading3_threshold and len(text) < 100 and text.strip():
+                        is_header = True
+                        new_depth = 3  # Sub-subheading
+
+                    if is_header and text and not text.isdigit() and len(text) > 1:
+                        # Emit current section before starting new one
+                        if formatted_text:
+                            current_text.append(" ".join(formatted_text))
+                            formatted_text = []
+                        if current_text:
+                            yield DocumentSection(
+                                title=current_title,
+                                content="\n".join(current_text),
+                                depth=current_depth
+                            )
+                        current_title = text
+                        current_text = []
+                        current_depth = new_depth
+                    elif text:
+                        formatted_text.append(text)
+
+                if formatted_text:
+                    current_text.append(" ".join(formatted_text))
+
+        # Emit final section
+        if current_text:
+            yield DocumentSection(
+                title=current_title,
+                content="\n".join(current_text),
+                depth=current_depth
+            )
+
+    def extract_pptx_text(self, pptx_path: DocumentSource) -> List[DocumentSection]:
         """Extract text from PowerPoint with improved structure detection"""
         try:
-            presentation = pptx.Presentation(pptx_path)
+            # One streaming pass over the slide XML; records are tiny compared to the object model
+            slides = list(iter_pptx_slides(pptx_path))
             sections = []
             
             # First determine possible slide types and structure
-            has_section_slides = False
-            
-            for slide in presentation.slides:
-                # Check if this looks like a section/divider slide
-                if slide.shapes.title and len(slide.shapes) < 3:
-                    title = slide.shapes.title.text
-                    if len(title) < 50 and any(keyword in title.lower() for keyword in ['section', 'part', 'chapter', 'agenda']):
-                        has_section_slides = True
+            # (a title plus at most one other shape, titled like a divider)
+            has_section_slides = any(
+                slide.title is not None and slide.shape_count < 3 and len(slide.title) < 50
+                and any(keyword in slide.title.lower() for keyword in ['section', 'part', 'chapter', 'agenda'])
+                for slide in slides
+            )
             
             # Now extract content with awareness of structure
             current_section = "Introduction"
             current_slides = []
             
-            for i, slide in enumerate(presentation.slides):
-                slide_text = []
-                slide_title = f"Slide {i+1}"
-                
-                # Extract title if exists
-                if slide.shapes.title:
-                    slide_title = slide.shapes.title.text
+            for slide in slides:
+                slide_title = slide.title if slide.title is not None else f"Slide {slide.number}"
                 
                 # Check if this is a section slide
-                is_section_slide = False
-                if has_section_slides and slide.shapes.title and len(slide.shapes) < 3:
-                    is_section_slide = True
-                
-                # Extract text from all shapes
-                for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text:
-                        # Skip title text as we already captured it
-                        if shape != slide.shapes.title:
-                            slide_text.append(shape.text)
+                is_section_slide = has_section_slides and slide.title is not None and slide.shape_count < 3
                 
                 # Process based on slide type
                 if is_section_slide:
@@ -185,7 +277,7 @@ class QuotaFriendlyAnalyzer:
                     current_slides = []
                 else:
                     # Format slide content
-                    formatted_content = f"### {slide_title}\n" + "\n".join(slide_text)
+                    formatted_content = f"### {slide_title}\n" + "\n".join(slide.body)
                     current_slides.append(formatted_content)
             
             # Add final section
@@ -198,22 +290,11 @@ class QuotaFriendlyAnalyzer:
                 ))
             
             # Handle case where no sections were detected
-            if not sections and has_section_slides == False:
-                all_slides = []
-                for i, slide in enumerate(presentation.slides):
-                    slide_text = []
-                    slide_title = f"Slide {i+1}"
-                    
-                    if slide.shapes.title:
-                        slide_title = slide.shapes.title.text
-                    
-                    for shape in slide.shapes:
-                        if hasattr(shape, "text") and shape.text and shape != slide.shapes.title:
-                            slide_text.append(shape.text)
-                    
-                    formatted_content = f"### {slide_title}\n" + "\n".join(slide_text)
-                    all_slides.append(formatted_content)
-                
+            if not sections and not has_section_slides:
+                all_slides = [
+                    f"### {slide.title if slide.title is not None else f'Slide {slide.number}'}\n" + "\n".join(slide.body)
+                    for slide in slides
+                ]
                 sections.append(DocumentSection(
                     title="Presentation Content",
                     content="\n\n".join(all_slides),
@@ -226,44 +307,18 @@ class QuotaFriendlyAnalyzer:
             print(f"PowerPoint extraction error: {e}")
             return []
 
-    def extract_docx_text(self, docx_path: str) -> List[DocumentSection]:
+    def extract_docx_text(self, docx_path: DocumentSource) -> List[DocumentSection]:
         """Extract text from Word document with improved structure recognition"""
         try:
-            doc = docx.Document(docx_path)
             sections = []
             current_section_title = "Introduction"
             current_section_text = []
             current_depth = 1
             
-            # Map Word heading styles to depth levels
-            heading_styles = {
-                'Title': 0,
-                'Heading 1': 1, 
-                'Heading 2': 2, 
-                'Heading 3': 3,
-                'Heading 4': 4
-            }
-            
-            # Process paragraphs
-            for paragraph in doc.paragraphs:
-                # Skip empty paragraphs
-                if not paragraph.text.strip():
-                    continue
-                
-                # Detect headers based on style
-                is_header = False
-                new_depth = 0
-                
-                if paragraph.style.name in heading_styles:
-                    is_header = True
-                    new_depth = heading_styles[paragraph.style.name]
-                # Fallback detection based on formatting
-                elif len(paragraph.text) < 100:  # Potential header by length
-                    if paragraph.style.font.bold or paragraph.style.font.size and paragraph.style.font.size >= 14:
-                        is_header = True
-                        new_depth = 1 if paragraph.style.font.size and paragraph.style.font.size >= 16 else 2
-                
-                if is_header:
+            # Paragraph styles are resolved once per document by the streaming reader,
+            # which also applies the heading-style map and the formatting fallback
+            for paragraph in iter_docx_paragraphs(docx_path):
+                if paragraph.heading_level is not None:
                     # Save previous section if not empty
                     if current_section_text:
                         sections.append(DocumentSection(
@@ -275,7 +330,7 @@ class QuotaFriendlyAnalyzer:
                     # Start new section
                     current_section_title = paragraph.text
                     current_section_text = []
-                    current_depth = new_depth
+                    current_depth = paragraph.heading_level
                 else:
                     # Add paragraph text to current section
                     current_section_text.append(paragraph.text)
@@ -288,102 +343,122 @@ class QuotaFriendlyAnalyzer:
                     depth=current_depth
                 ))
             
-            # Post-process: merge very small sections
-            i = 0
-            while i < len(sections) - 1:
-                if len(sections[i].content.split()) < 30:  # Less than 30 words
-                    sections[i+1].content = f"{sections[i].title}:\n{sections[i].content}\n\n{sections[i+1].content}"
-                    sections.pop(i)
-                else:
-                    i += 1
-            
-            return sections
+            # Post-process: merge very small sections (less than 30 words)
+            return SectionTable.from_sections(sections).merge_small(30).to_sections()
         
         except Exception as e:
             print(f"Word document extraction error: {e}")
             return []
 
+    def extract_sections(self, file_path: DocumentSource, file_extension: Optional[str] = None) -> List[DocumentSection]:
+        """Extract sections based on file type"""
+        return self.extract_document_sections(file_path, file_extension).sections
+
+    def extract_document_sections(self, file_path: DocumentSource,
+                                  file_extension: Optional[str] = None) -> ExtractedSections:
+        """Extract sections based on file type, along with the sectioning strategy used"""
+        file_extension = (file_extension or os.path.splitext(file_path)[1]).lower()
+
+        if file_extension == '.pdf':
+            return self.extract_pdf_sections(file_path)
+        elif file_extension == '.pptx':
+            return ExtractedSections(self.extract_pptx_text(file_path), SECTIONING_SLIDES)
+        elif file_extension == '.docx':
+            return ExtractedSections(self.extract_docx_text(file_path), SECTIONING_STYLES)
+        else:
+            raise ValueError(f"Unsupported file type: {file_extension}")
+
+class QuotaFriendlyAnalyzer(DocumentSectioner):
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        genai.configure(api_key=api_key)
+        # Use the latest Gemini model
+        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        self.api_calls = 0  # Track number of API calls
+        self.batch_timings: List[BatchTiming] = []  # Per-batch timings of the last summary
+        self.compression = CompressionReport()  # Extractive compression of the last summary's input
+        self.reused_batches = 0  # Batch summaries the last summary took from an earlier revision
+        self._calls_lock = threading.Lock()
+        
     def calculate_section_importance(self, sections: List[DocumentSection]) -> List[DocumentSection]:
         """Calculate importance score for each section based on content and position"""
-        for i, section in enumerate(sections):
-            # Base importance on position (higher for earlier sections)
-            position_weight = max(1.0, 1.5 - (i / len(sections)))
-            
-            # Content length factor (longer sections might be more important)
-            length_weight = min(1.5, max(0.5, len(section.content.split()) / 500))
-            
-            # Title importance (introductions, conclusions, etc.)
-            title_weight = 1.0
-            important_keywords = ['introduction', 'conclusion', 'summary', 'result', 'finding', 'discussion', 'analysis']
-            if any(keyword in section.title.lower() for keyword in important_keywords):
-                title_weight = 1.5
-            
-            # Depth weight (main sections are more important than subsections)
-            depth_weight = 1.5 / max(1, section.depth)
-            
-            # Calculate final importance score
-            section.importance = position_weight * length_weight * title_weight * depth_weight
+        table = SectionTable.from_sections(sections).score()
+        for section, importance in zip(sections, table.importance):
+            section.importance = importance
         
         return sections
 
-    def prepare_batch_content(self, sections: List[DocumentSection], max_batch_size: int = 10000) -> List[str]:
-        """Prepare document content in batches for efficient API usage"""
-        batches = []
-        current_batch = []
-        current_size = 0
+    def prepare_batch_content(self, sections: List[DocumentSection], max_tokens: int = SUMMARY_BATCH_TOKENS) -> List[str]:
+        """Prepare document content in batches of about max_tokens tokens for efficient API usage"""
+        return BatchPacker(max_tokens).pack(sections).batches
+
+    def _generate(self, prompt: str, timing: Optional[BatchTiming] = None) -> str:
+        """Call Gemini in the bulk lane, retrying until the answer is usable; raises LLMCallError"""
+        generation_config = {
+            'temperature': 0.2,
+            'top_p': 0.95,
+            'max_output_tokens': 4000
+        }
         
-        for section in sections:
-            section_text = f"## {section.title}\n{section.content}"
-            section_size = len(section_text)
-            
-            # If this section alone exceeds max size, split it
-            if section_size > max_batch_size:
-                # Add current batch if not empty
-                if current_batch:
-                    batches.append("\n\n".join(current_batch))
-                    current_batch = []
-                    current_size = 0
-                
-                # Split large section
-                words = section_text.split()
-                chunk_size = max_batch_size // 2  # characters per chunk (approximate)
-                current_chunk = []
-                current_chunk_size = 0
-                
-                for word in words:
-                    word_size = len(word) + 1  # +1 for space
-                    if current_chunk_size + word_size > chunk_size and current_chunk:
-                        # Complete this chunk
-                        chunk_text = f"## {section.title} (Part {len(batches) + 1})\n" + " ".join(current_chunk)
-                        batches.append(chunk_text)
-                        current_chunk = [word]
-                        current_chunk_size = word_size
-                    else:
-                        current_chunk.append(word)
-                        current_chunk_size += word_size
-                
-                # Add final chunk
-                if current_chunk:
-                    chunk_text = f"## {section.title} (Part {len(batches) + 1})\n" + " ".join(current_chunk)
-                    batches.append(chunk_text)
-            
-            # Normal case: try to add to current batch
-            elif current_size + section_size <= max_batch_size:
-                current_batch.append(section_text)
-                current_size += section_size
-            else:
-                # Finish current batch and start new one
-                batches.append("\n\n".join(current_batch))
-                current_batch = [section_text]
-                current_size = section_size
+        # Identical prompts (same document, same batching) are answered from the response cache
+        cache_key = LLM_CACHE.key(self.model.model_name, prompt, generation_config)
+        cached = LLM_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Add final batch if not empty
-        if current_batch:
-            batches.append("\n\n".join(current_batch))
+        # Track API calls; pacing comes from the process-wide governor
+        with self._calls_lock:
+            self.api_calls += 1
         
-        return batches
+        # Very short answers are truncated or refusals, so they are retried too
+        response = call_with_retry(
+            lambda: self.model.generate_content(prompt, generation_config=generation_config),
+            LANE_BULK, estimate_tokens(prompt),
+            accept=lambda response: bool(response.text) and len(response.text) > 100,
+            timing=timing, description="Summary generation"
+        )
+        LLM_CACHE.put(cache_key, response.text)
+        return response.text
+
+    def preview_summary(self, file_name: str, preview: DocumentPreview) -> str:
+        """Short overview from a document's titles and first pages, in one small interactive-lane call"""
+        generation_config = {
+            'temperature': 0.2,
+            'max_output_tokens': PREVIEW_MAX_OUTPUT_TOKENS
+        }
+        titles = "\n".join(f"- {title}" for title in preview.titles) or "(no outline or headings found)"
+        length = f"{preview.page_count} pages/slides" if preview.page_count else "unknown length"
+        prompt = f"""Give a quick preview of the document {file_name} ({length}) so a teacher can decide whether it is worth a full read.
+
+            YOUR TASK:
+            In at most 150 words of markdown, say what the document covers, who it seems to be for, and list its main topics.
+            Base this only on the section titles and opening text below; do not guess at details they do not show.
+
+            SECTION TITLES:
+            {titles}
 
-    def summarize_batch(self, batch_content: str, file_name: str, batch_index: int, total_batches: int) -> str:
+            OPENING TEXT:
+            {preview.opening}
+            """
+        
+        cache_key = LLM_CACHE.key(self.model.model_name, prompt, generation_config)
+        cached = LLM_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        with self._calls_lock:
+            self.api_calls += 1
+        response = call_with_retry(
+            lambda: self.model.generate_content(prompt, generation_config=generation_config),
+            LANE_INTERACTIVE, estimate_tokens(prompt),
+            accept=lambda response: bool(response.text and response.text.strip()),
+            max_attempts=2, description="Preview generation"
+        )
+        LLM_CACHE.put(cache_key, response.text)
+        return response.text
+
+    def summarize_batch(self, batch_content: str, file_name: str, batch_index: int, total_batches: int,
+                        timing: Optional[BatchTiming] = None) -> str:
         """Generate a comprehensive summary for a batch of sections with rate limit awareness"""
         try:
             # Create an educational and informative prompt
@@ -407,101 +482,205 @@ class QuotaFriendlyAnalyzer:
             {batch_content}
             """
             
-            # Track API calls and add simple rate limiting
-            self.api_calls += 1
-            if self.api_calls > 1:
-                # Add delay between calls to avoid rate limiting
-                time.sleep(2)
-            
-            # Generate summary with simple retry mechanism
-            max_retries = 2
-            for attempt in range(max_retries):
-                try:
-                    response = self.model.generate_content(
-                        prompt,
-                        generation_config={
-                            'temperature': 0.2,
-                            'top_p': 0.95,
-                            'max_output_tokens': 4000
-                        }
-                    )
-                    
-                    # Check if we got a valid response
-                    if response.text and len(response.text) > 100:
-                        return response.text
-                    
-                    # If response is too short, retry with higher temperature
-                    time.sleep(3)  # Longer pause before retry
-                    
-                except Exception as inner_e:
-                    print(f"Generation error (attempt {attempt+1}): {inner_e}")
-                    # Only sleep if we're going to retry
-                    if attempt < max_retries - 1:
-                        time.sleep(5)  # Much longer pause after error
-            
-            # Fallback if all retries failed
-            return f"""# Summary of {file_name} ({batch_description})
+            return self._generate(prompt, timing)
+        
+        except LLMCallError:
+            raise
+        except Exception as e:
+            print(f"Batch summarization error: {e}")
+            raise LLMCallError(f"Could not summarize {file_name} ({batch_description}): {e}") from e
 
-            Unfortunately, I wasn't able to generate a detailed summary for this content due to API limitations. Here's a basic overview:
+    def merge_summaries(self, summaries: List[str], file_name: str, final: bool,
+                        timing: Optional[BatchTiming] = None) -> str:
+        """Merge summaries of consecutive parts of a document into one"""
+        try:
+            if final:
+                task = """Synthesize them into a single advanced yet accessible educational summary of the whole document. Begin with a concise overview of what the document covers, then explain its key concepts, arguments and terminology in a logical order."""
+            else:
+                task = """Merge them into one summary of this stretch of the document, in document order. Keep every key concept, definition, example and figure, but remove repetition so the result is shorter than the parts combined."""
+            
+            parts = "\n\n".join(f"--- PART {i+1} ---\n{summary}" for i, summary in enumerate(summaries))
+            prompt = f"""The following are summaries of consecutive parts of {file_name}.
 
-            This section appears to cover various concepts related to the document's subject matter. The content includes several key sections and technical information that would be valuable for understanding the topic.
+            YOUR TASK:
+            {task}
+            Use markdown formatting for readability (headings, bullet points, etc.) and keep the language clear but sophisticated.
 
-            **Note:** A more detailed summary could not be generated at this time. Please try again later or contact support if this issue persists.
+            PARTIAL SUMMARIES:
+            {parts}
             """
             
+            return self._generate(prompt, timing)
+        except LLMDeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"Batch summarization error: {e}")
-            return f"Error summarizing batch: {str(e)}"
+            print(f"Summary merge error: {e}")
+        # Keep the parts rather than lose them when the merge fails
+        return "\n\n".join(summaries)
 
-    def create_comprehensive_summary(self, file_path: str) -> str:
-        """Create an advanced, educational summary of the document with quota awareness"""
+    def _merge_groups(self, summaries: List[str], fan_out: int) -> List[List[str]]:
+        """Consecutive groups of at most fan_out summaries and SUMMARY_MERGE_MAX_CHARS characters"""
+        groups = []
+        current = []
+        current_chars = 0
+        for summary in summaries:
+            if current and (len(current) >= fan_out or current_chars + len(summary) > SUMMARY_MERGE_MAX_CHARS):
+                groups.append(current)
+                current = []
+                current_chars = 0
+            current.append(summary)
+            current_chars += len(summary)
+        if current:
+            groups.append(current)
+        return groups
+
+    def _iter_timed(self, executor: ThreadPoolExecutor, level: int, inputs: List[str],
+                    call: Callable[[int, BatchTiming], str]) -> Iterator[Tuple[int, str]]:
+        """Run call(i, timing) for every input on the executor, yielding (i, result) as each finishes"""
+        timings = [BatchTiming(batch=i + 1, chars=len(text), level=level) for i, text in enumerate(inputs)]
+        self.batch_timings.extend(timings)
+        
+        def timed(i: int) -> str:
+            start = time.perf_counter()
+            result = call(i, timings[i])
+            timings[i].seconds = time.perf_counter() - start
+            return result
+        
+        # Each task runs in a copy of this context so its calls are charged to the same client
+        context = contextvars.copy_context()
+        futures = {executor.submit(context.copy().run, timed, i): i for i in range(len(inputs))}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # A consumer that stops early (e.g. a closed stream) should not spend quota on the rest
+            for future in futures:
+                future.cancel()
+
+    def iter_summary_events(self, file_path: str, sections: Optional[List[DocumentSection]] = None,
+                            fan_out: int = SUMMARY_FAN_OUT, max_depth: int = SUMMARY_MAX_DEPTH,
+                            revision_key: Optional[str] = None) -> Iterator[Tuple[str, dict]]:
+        """
+        Create an advanced, educational summary of the document with quota awareness,
+        yielding (event, data) pairs as it goes:
+        "outline" once the batches are planned, "batch" whenever a batch or merge
+        finishes, and finally "summary" with the complete markdown.
+        Batches are summarized in parallel and the partial summaries merged fan_out
+        at a time, for at most max_depth rounds, so latency grows with the log of
+        the document's length.
+        With a revision_key (see revisions.revision_key), batches whose sections are
+        unchanged since the last summary under that key reuse their stored summaries.
+        """
         try:
             # Reset API call counter
             self.api_calls = 0
+            self.batch_timings = []
+            self.compression = CompressionReport()
+            self.reused_batches = 0
+            fan_out = max(2, fan_out)
             
-            # Get file name and extension
+            # Get file name
             file_name = os.path.basename(file_path)
-            file_extension = os.path.splitext(file_path)[1].lower()
             
-            # Extract sections based on file type
-            if file_extension == '.pdf':
-                sections = self.extract_pdf_text(file_path)
-            elif file_extension == '.pptx':
-                sections = self.extract_pptx_text(file_path)
-            elif file_extension == '.docx':
-                sections = self.extract_docx_text(file_path)
-            else:
-                raise ValueError(f"Unsupported file type: {file_extension}")
+            # Extract sections unless the caller already has them (e.g. from the document store)
+            if sections is None:
+                sections = self.extract_sections(file_path)
             
             if not sections:
-                return "No content could be extracted from the document."
+                yield "summary", {"summary": "No content could be extracted from the document."}
+                return
             
             # Calculate section importance
-            sections = self.calculate_section_importance(sections)
-            
-            # Sort sections by importance for better analysis
-            sections.sort(key=lambda x: x.importance, reverse=True)
-            
-            # Take top 80% of sections by importance to focus on key content
-            cutoff_index = int(len(sections) * 0.8)
-            selected_sections = sections[:max(3, cutoff_index)]  # At least 3 sections
-            
-            # Sort selected sections back to original order
-            selected_sections.sort(key=lambda x: sections.index(x))
-            
-            # Prepare content in batches to avoid token limits
-            content_batches = self.prepare_batch_content(selected_sections, max_batch_size=12000)
+            table = SectionTable.from_sections(sections).score()
+            
+            # Take top 80% of sections by importance (at least 3), kept in document order
+            selected = table.top_indices(0.8, minimum=3)
+            
+            # Runs of sections unchanged since the last revision keep their batch summaries
+            hashes = [section_hash(section) for section in sections]
+            # (a regenerate request starts over, like it does for the response cache)
+            previous = SUMMARY_REVISIONS.load(revision_key) if revision_key and not cache_bypassed() else []
+            regions = align_spans(hashes, previous)
+            region_of = [0] * len(sections)
+            for r, (start, end, _) in enumerate(regions):
+                region_of[start:end] = [r] * (end - start)
+            fresh = [i for i in selected if regions[region_of[i]][2] is None]
+            
+            # Keep only the highest-ranked sentences of the rest, so an ordinary document fits in a batch
+            # or two and a long one in a number of batches that grows with its length
+            selected_chars = sum(len(sections[i].content) for i in selected) or 1
+            fresh_chars = sum(len(sections[i].content) for i in fresh)
+            budget = extract_token_budget(sum(count_tokens(sections[i].content) for i in selected))
+            compressor = ExtractiveCompressor(int(budget * fresh_chars / selected_chars))
+            compressed, self.compression = compressor.compress_indexed(table.to_sections(fresh))
+            region_sections: Dict[int, List[Tuple[int, DocumentSection]]] = {}
+            for position, section in compressed:
+                region_sections.setdefault(region_of[fresh[position]], []).append((fresh[position], section))
+            
+            # Prepare content in batches to avoid token limits. Each changed region is batched on its
+            # own, and revisions keep sections whole so unchanged ones can be matched next time
+            packer = BatchPacker(split_min_fill=1.0) if revision_key else BatchPacker()
+            batches: List[Tuple[Optional[str], Optional[str]]] = []  # (content to send, or reused summary)
+            fresh_plans = {}  # Region -> (position of its first batch, batch source section indices)
+            for r, (start, end, span) in enumerate(regions):
+                if span is not None:
+                    batches.extend((None, summary) for summary in span.summaries)
+                    continue
+                members = region_sections.get(r, [])
+                plan = packer.pack([section for _, section in members])
+                fresh_plans[r] = (len(batches), [[members[k][0] for k in sources] for sources in plan.sources])
+                batches.extend((text, None) for text in plan.batches)
+            pending = [i for i, (text, _) in enumerate(batches) if text is not None]
+            self.reused_batches = len(batches) - len(pending)
+            
+            yield "outline", {
+                "sections": [sections[i].title for i in selected],
+                "batches": len(batches),
+                "reused_batches": self.reused_batches,
+                "compression": asdict(self.compression)
+            }
             
-            # Generate summary for each batch (this limits API calls)
-            batch_summaries = []
-            for i, batch in enumerate(content_batches):
-                # Only process up to 3 batches maximum to avoid excessive API calls
-                if i >= 3:
-                    batch_summaries.append(f"# Additional Content\n\nThis document contains more content that wasn't summarized due to length constraints.")
-                    break
-                    
-                summary = self.summarize_batch(batch, file_name, i, len(content_batches))
-                batch_summaries.append(summary)
+            with ThreadPoolExecutor(max_workers=SUMMARY_MAX_CONCURRENCY) as executor:
+                # Map: summarize every changed batch concurrently, reporting each as it finishes
+                batch_summaries = [summary for _, summary in batches]
+                for i in range(len(batches)):
+                    if batch_summaries[i] is not None:
+                        yield "batch", {"level": 0, "batch": i + 1, "total": len(batches),
+                                        "summary": batch_summaries[i], "reused": True}
+                for k, summary in self._iter_timed(
+                    executor, 0, [batches[i][0] for i in pending],
+                    lambda k, timing: self.summarize_batch(batches[pending[k]][0], file_name, pending[k], len(batches), timing)
+                ):
+                    batch_summaries[pending[k]] = summary
+                    yield "batch", {"level": 0, "batch": pending[k] + 1, "total": len(batches),
+                                    "summary": summary, "reused": False}
+                
+                if revision_key:
+                    spans = []
+                    for r, (start, end, span) in enumerate(regions):
+                        if span is not None:
+                            spans.append(span)
+                            continue
+                        first, sources = fresh_plans[r]
+                        spans.extend(spans_from_batches(
+                            hashes, start, end, sources, batch_summaries[first:first + len(sources)]
+                        ))
+                    SUMMARY_REVISIONS.save(revision_key, spans)
+                
+                # Reduce: merge neighbouring summaries until one remains or the depth limit is hit
+                level = 0
+                while len(batch_summaries) > 1 and level < max_depth:
+                    level += 1
+                    groups = self._merge_groups(batch_summaries, fan_out)
+                    final = len(groups) == 1
+                    batch_summaries = [None] * len(groups)
+                    for i, summary in self._iter_timed(
+                        executor, level, ["".join(group) for group in groups],
+                        lambda i, timing: groups[i][0] if len(groups[i]) == 1
+                        else self.merge_summaries(groups[i], file_name, final, timing)
+                    ):
+                        batch_summaries[i] = summary
+                        yield "batch", {"level": level, "batch": i + 1, "total": len(groups), "summary": summary}
             
             # Combine all summaries
             if len(batch_summaries) == 1:
@@ -532,9 +711,22 @@ class QuotaFriendlyAnalyzer:
 *This summary was generated automatically and presents key concepts in an educational format.*
 """
             
-            return final_output
+            yield "summary", {"summary": final_output}
             
+        except LLMCallError:
+            # No placeholder text: the caller reports Gemini's failure as an error
+            raise
         except Exception as e:
             print(f"An error occurred during analysis: {str(e)}")
             print(traceback.format_exc())
-            return f"An error occurred during analysis: {str(e)}"
\ No newline at end of file
+            yield "summary", {"summary": f"An error occurred during analysis: {str(e)}"}
+
+    def create_comprehensive_summary(self, file_path: str, sections: Optional[List[DocumentSection]] = None,
+                                     fan_out: int = SUMMARY_FAN_OUT, max_depth: int = SUMMARY_MAX_DEPTH,
+                                     revision_key: Optional[str] = None) -> str:
+        """The markdown summary of iter_summary_events, once every batch has finished"""
+        summary = ""
+        for event, data in self.iter_summary_events(file_path, sections, fan_out, max_depth, revision_key):
+            if event == "summary":
+                summary = data["summary"]
+        return summary
\ No newline at end of file
@@ -13,6 +13,9 @@ import mediapipe as mp
 from bs4 import BeautifulSoup
 import uuid 
 import concurrent.futures
+import contextvars
+import functools
+from dataclasses import asdict
 import numpy as np
 from django.http import FileResponse, HttpResponse ,StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
@@ -30,7 +33,20 @@ from .utils.flashcards import FlashcardGenerator
 import logging 
 import json 
 import cv2
-from .utils.mcq_generator import OptimizedMCQGenerator 
+from .utils.mcq_generator import MCQ_DUPLICATE_SIMILARITY, OptimizedMCQGenerator
+from .utils.document_store import DOCUMENT_STORE, ExtractedText
+from .utils.embeddings import EMBEDDING_SERVICE
+from .utils.sandbox import (
+    DocumentTooComplexError, extract_preview_sandboxed, extract_sections_sandboxed, extract_text_sandboxed
+)
+from .utils.jobs import SUMMARY_JOBS
+from .utils.model_registry import MODEL_REGISTRY, process_rss
+from .utils.question_bank import QUESTION_BANK, QUESTION_BANK_LOW_WATER
+from .utils.ingestion import ingest_upload
+from .utils.llm_cache import LLM_CACHE, cache_bypassed, llm_cache_bypass_from_request
+from .utils.rate_limit import GEMINI_GOVERNOR, llm_client_from_request
+from .utils.retry import LLMCallError, LLMDeadlineExceeded, llm_deadline_for_request
+from .utils.revisions import revision_key
 from .utils.video_generation import get_video_path
 from .utils.jarvis import JarvisAI
 from .utils.image import ImageProcessor
@@ -48,6 +64,7 @@ import uuid
 from django.utils.decorators import method_decorator
 import requests
 from django.views import View
+from django.urls import reverse
 import re
 from urllib.parse import urljoin, quote
 import time
@@ -78,6 +95,15 @@ class FileUploadAPIView(APIView):
 
         return Response({"message": f"File saved at {file_path}"}, status=status.HTTP_200_OK)
 
+def llm_error_response(error: LLMCallError) -> Response:
+    """504 when the request's Gemini deadline ran out, 503 when Gemini kept failing"""
+    timed_out = isinstance(error, LLMDeadlineExceeded)
+    return Response({
+        "error": "AI service timed out" if timed_out else "AI service unavailable",
+        "message": str(error)
+    }, status=status.HTTP_504_GATEWAY_TIMEOUT if timed_out else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
 class SummarizeAPIView(APIView):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -88,7 +114,8 @@ class SummarizeAPIView(APIView):
             logger.error(f"Analyzer initialization error: {e}")
             raise
     
-    def post(self, request):
+    def get_upload(self, request):
+        """The uploaded document and its extension, or a 400 Response explaining what is wrong"""
         # Log entire request for debugging
         logger.info(f"Received request: {request.data}")
         logger.info(f"Received files: {request.FILES}")
@@ -128,49 +155,49 @@ class SummarizeAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create upload directory
-        upload_dir = os.path.join(settings.MEDIA_ROOT, "uploads")
-        os.makedirs(upload_dir, exist_ok=True)
+        # Validate file size
+        max_file_size = 50 * 1024 * 1024  # 50 MB
+        if file.size > max_file_size:
+            return Response(
+                {
+                    "error": "File too large", 
+                    "max_size": "50 MB"
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Generate unique file path
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(upload_dir, unique_filename)
+        return file, file_extension
+    
+    @llm_client_from_request
+    @llm_cache_bypass_from_request
+    @llm_deadline_for_request
+    def post(self, request):
+        upload = self.get_upload(request)
+        if isinstance(upload, Response):
+            return upload
+        file, file_extension = upload
         
         try:
-            # Save the uploaded file
-            with open(file_path, 'wb') as destination:
-                for chunk in file.chunks():
-                    destination.write(chunk)
-            
-            # Validate file size
-            max_file_size = 50 * 1024 * 1024  # 50 MB
-            if os.path.getsize(file_path) > max_file_size:
-                os.remove(file_path)
-                return Response(
-                    {
-                        "error": "File too large", 
-                        "max_size": "50 MB"
-                    },
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Generate comprehensive summary with quota-friendly analyzer
-            summary = self.analyzer.create_comprehensive_summary(file_path)
-            
-            # Clean up the uploaded file
-            os.remove(file_path)
+            if request_option(request, 'mode') == 'preview':
+                return Response(self.preview(request, file, file_extension), status=status.HTTP_200_OK)
             
+            # Parse straight from the upload buffer instead of saving and reopening it
+            with ingest_upload(file) as document:
+                payload = self.summarize_document(file.name, file_extension, document.digest, document.source)
+            return Response(payload, status=status.HTTP_200_OK)
+        
+        except DocumentTooComplexError as e:
+            logger.warning(f"Document too complex: {file.name}: {e}")
             return Response({
-                "summary": summary,
-                "file_type": file_extension,
-                "file_name": file.name
-            }, status=status.HTTP_200_OK)
+                "error": "Document too complex",
+                "message": str(e)
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        
+        except LLMCallError as e:
+            logger.warning(f"Summarization of {file.name} gave up on Gemini: {e}")
+            return llm_error_response(e)
         
         except Exception as e:
-            # Ensure file is deleted if it exists
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            
             # Log the full traceback for debugging
             logger.error(f"Summarization error: {e}")
             logger.error(traceback.format_exc())
@@ -180,8 +207,203 @@ class SummarizeAPIView(APIView):
                 "message": str(e),
                 "details": traceback.format_exc()
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def summarize_document(self, file_name, file_extension, digest, source) -> dict:
+        """Full summary of a document and the details reported with it"""
+        # Reuse sections extracted by any earlier request for the same bytes
+        extracted = DOCUMENT_STORE.get_sections(
+            digest,
+            lambda: extract_sections_sandboxed(source, file_extension)
+        )
+        
+        # Generate comprehensive summary with quota-friendly analyzer
+        summary = self.analyzer.create_comprehensive_summary(
+            file_name, sections=extracted.sections,
+            revision_key=revision_key(file_name, self.analyzer.model.model_name)
+        )
+        
+        return {
+            "summary": summary,
+            "file_type": file_extension,
+            "file_name": file_name,
+            "sectioning_strategy": extracted.strategy,
+            "batch_timings": [asdict(timing) for timing in self.analyzer.batch_timings],
+            "compression": asdict(self.analyzer.compression),
+            "reused_batches": self.analyzer.reused_batches,
+            "boilerplate": {
+                "repeated_lines": extracted.boilerplate.repeated_lines,
+                "characters_saved": extracted.boilerplate.chars_removed,
+                "estimated_tokens_saved": extracted.boilerplate.tokens_saved
+            }
+        }
+    
+    def preview(self, request, file, file_extension) -> dict:
+        """
+        Overview from the outline, first pages and section titles only; with
+        background=true the full summary is queued as a job the client can poll
+        """
+        job_id = None
+        with ingest_upload(file) as document:
+            preview = extract_preview_sandboxed(document.source, document.extension)
+            # Overview first: when Gemini fails here, no full summary is left running with an id nobody got
+            overview = self.analyzer.preview_summary(file.name, preview)
+            if request_option(request, 'background').lower() in ('1', 'true', 'yes', 'on'):
+                # The upload is gone once this request ends, so the job works on its own copy
+                path = document.save_copy()
+                try:
+                    job_id = SUMMARY_JOBS.submit(summarize_in_background, file.name, file_extension, document.digest, path)
+                except Exception:
+                    os.remove(path)
+                    raise
+        
+        return {
+            "mode": "preview",
+            "overview": overview,
+            "file_type": file_extension,
+            "file_name": file.name,
+            "titles": preview.titles,
+            "page_count": preview.page_count,
+            "job_id": job_id,
+            "job_url": reverse('summary_job', args=[job_id]) if job_id else None
+        }
+
+
+def request_option(request, name: str) -> str:
+    """A form field, falling back to the query string"""
+    value = request.data.get(name) if hasattr(request.data, 'get') else None
+    if value is None:
+        value = request.GET.get(name, '')
+    return str(value).strip()
+
+
+def summarize_in_background(file_name, file_extension, digest, path) -> dict:
+    """Summary job body: summarize the job's copy of the upload, then delete the copy"""
+    try:
+        return SummarizeAPIView().summarize_document(file_name, file_extension, digest, path)
+    finally:
+        os.remove(path)
+
+
+def request_top_up_from_copy(document, mcq_gen) -> str:
+    """Queue a question bank top-up that reads the document's text from its own copy of the upload"""
+    path = document.save_copy()
+    try:
+        job_id = QUESTION_BANK.request_top_up(
+            document.digest,
+            functools.partial(generate_mcqs_from_copy, mcq_gen, document.digest, document.extension, path),
+            MCQ_DUPLICATE_SIMILARITY
+        )
+    except Exception:
+        os.remove(path)
+        raise
+    if job_id is None:
+        os.remove(path)  # A top-up is already pending or the bank is full
+    return job_id
+
+
+def generate_mcqs_from_copy(mcq_gen, digest, file_extension, path, count, avoid):
+    """Top-up generator: extract the copy (or reuse an earlier extraction), delete it, then generate"""
+    try:
+        text = DOCUMENT_STORE.get_text(digest, lambda: extract_text_sandboxed(path, file_extension)).text
+    finally:
+        os.remove(path)
+    if not text.strip():
+        raise ValueError("No readable text found in file")
+    return mcq_gen.generate_mcqs_with_embeddings(text, count, avoid=avoid)
+
+
+def sse_event(event: str, data: dict) -> str:
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def iterate_in_context(context: contextvars.Context, iterator):
+    """
+    Drive a generator inside a context captured in the view, so a streamed body
+    keeps the client identity and cache settings after the view has returned
+    """
+    while True:
+        try:
+            item = context.run(next, iterator)
+        except StopIteration:
+            return
+        yield item
+
+
+class SummarizeStreamAPIView(SummarizeAPIView):
+    """
+    Same summary as SummarizeAPIView, streamed as server-sent events:
+    "extracting", "extracted", "outline", one "batch" per finished batch or merge,
+    then "summary" with the markdown SummarizeAPIView would have returned
+    (or "error" if the document could not be processed).
+    """
+    
+    @llm_client_from_request
+    @llm_cache_bypass_from_request
+    @llm_deadline_for_request
+    def post(self, request):
+        upload = self.get_upload(request)
+        if isinstance(upload, Response):
+            return upload
+        file, file_extension = upload
+        
+        response = StreamingHttpResponse(
+            iterate_in_context(contextvars.copy_context(), self.stream_summary(file, file_extension)),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop nginx from holding events back
+        return response
+    
+    def stream_summary(self, file, file_extension):
+        # The upload stays open until the response is closed, so it is ingested here
+        yield sse_event("extracting", {"file_name": file.name, "file_type": file_extension})
+        try:
+            with ingest_upload(file) as document:
+                extracted = DOCUMENT_STORE.get_sections(
+                    document.digest,
+                    lambda: extract_sections_sandboxed(document.source, document.extension)
+                )
+                yield sse_event("extracted", {
+                    "sections": len(extracted.sections),
+                    "sectioning_strategy": extracted.strategy,
+                    "boilerplate": {
+                        "repeated_lines": extracted.boilerplate.repeated_lines,
+                        "characters_saved": extracted.boilerplate.chars_removed,
+                        "estimated_tokens_saved": extracted.boilerplate.tokens_saved
+                    }
+                })
+                
+                for event, data in self.analyzer.iter_summary_events(
+                    file.name, sections=extracted.sections,
+                    revision_key=revision_key(file.name, self.analyzer.model.model_name)
+                ):
+                    if event == "summary":
+                        data = dict(data, batch_timings=[asdict(timing) for timing in self.analyzer.batch_timings])
+                    yield sse_event(event, data)
+        
+        except DocumentTooComplexError as e:
+            logger.warning(f"Document too complex: {file.name}: {e}")
+            yield sse_event("error", {"error": "Document too complex", "message": str(e)})
+        
+        except LLMCallError as e:
+            logger.warning(f"Summarization of {file.name} gave up on Gemini: {e}")
+            timed_out = isinstance(e, LLMDeadlineExceeded)
+            yield sse_event("error", {
+                "error": "AI service timed out" if timed_out else "AI service unavailable",
+                "message": str(e)
+            })
+        
+        except Exception as e:
+            logger.error(f"Summarization error: {e}")
+            logger.error(traceback.format_exc())
+            yield sse_event("error", {"error": "Summarization failed", "message": str(e)})
+
 
 class GenerateMCQsAPIView(APIView):
+    @llm_client_from_request
+    @llm_cache_bypass_from_request
+    @llm_deadline_for_request
     def post(self, request):
         file = request.FILES.get('file')
         num_questions = request.data.get('num_questions', 10)
@@ -199,30 +421,52 @@ class GenerateMCQsAPIView(APIView):
                 "detail": "Supported formats: PDF, DOCX, TXT"
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Save file using FileSystemStorage
+        # Parse the upload in memory (large files are memory-mapped) instead of saving it
         try:
-            fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, "uploads"))
-            filename = fs.save(file.name, file)
-            file_path = fs.path(filename)
+            document = ingest_upload(file)
 
             # Initialize MCQ generator
             mcq_gen = OptimizedMCQGenerator()  # No longer need to pass api_key
 
             try:
-                # Extract text based on file type
-                if file_path.lower().endswith('.pdf'):
-                    text = mcq_gen.extract_text_from_pdf(file_path)
-                elif file_path.lower().endswith('.docx'):
-                    text = mcq_gen.extract_text_from_docx(file_path)
-                else:  # .txt file
-                    with open(file_path, 'r') as f:
-                        text = f.read()
-
-                if not text.strip():
-                    raise ValueError("No readable text found in file")
-
-                # Generate MCQs
-                mcqs = mcq_gen.generate_mcqs_from_text(text, num_questions=int(num_questions))
+                num_questions = int(num_questions)
+                digest = document.digest
+
+                # Serve questions this client has not had for the same file from the question bank
+                mcqs, unseen_left = ([], 0) if cache_bypassed() else QUESTION_BANK.take(digest, num_questions)
+                from_bank = len(mcqs)
+                extracted = ExtractedText(text="")
+                top_up_job_id = None
+
+                if len(mcqs) < num_questions:
+                    # Extract text (or reuse a previous extraction of the same bytes)
+                    extracted = DOCUMENT_STORE.get_text(
+                        digest, lambda: extract_text_sandboxed(document.source, document.extension)
+                    )
+                    text = extracted.text
+                    if not text.strip():
+                        raise ValueError("No readable text found in file")
+
+                    # Generate the questions the bank could not supply
+                    generated, embeddings = mcq_gen.generate_mcqs_with_embeddings(
+                        text, num_questions - len(mcqs), avoid=QUESTION_BANK.question_texts(digest)
+                    )
+                    QUESTION_BANK.add(digest, generated, embeddings, MCQ_DUPLICATE_SIMILARITY)
+                    if cache_bypassed():
+                        mcqs = generated[:num_questions]
+                    else:
+                        more, unseen_left = QUESTION_BANK.take(digest, num_questions - len(mcqs), allow_seen=True)
+                        mcqs += more
+
+                    # Top the bank up in the background before this client runs out
+                    if unseen_left < QUESTION_BANK_LOW_WATER:
+                        top_up_job_id = QUESTION_BANK.request_top_up(
+                            digest, functools.partial(mcq_gen.generate_mcqs_with_embeddings, text),
+                            MCQ_DUPLICATE_SIMILARITY
+                        )
+                elif unseen_left < QUESTION_BANK_LOW_WATER:
+                    # Served from the bank: the top-up job extracts the text itself
+                    top_up_job_id = request_top_up_from_copy(document, mcq_gen)
                 
                 if not mcqs:
                     raise ValueError("Failed to generate MCQs from the text")
@@ -230,11 +474,24 @@ class GenerateMCQsAPIView(APIView):
                 # Format response
                 response_data = {
                     "total_questions": len(mcqs),
-                    "mcqs": mcqs
+                    "mcqs": mcqs,
+                    "from_bank": from_bank,
+                    "top_up_job_id": top_up_job_id,
+                    "fallback_pages": extracted.fallback_pages,
+                    "degraded_pages": extracted.degraded_pages
                 }
 
                 return Response(response_data, status=status.HTTP_200_OK)
 
+            except DocumentTooComplexError as e:
+                logger.warning(f"Document too complex: {file.name}: {e}")
+                return Response({
+                    "error": "Document too complex",
+                    "detail": str(e)
+                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            except LLMCallError as e:
+                logger.warning(f"MCQ generation gave up on Gemini: {e}")
+                return llm_error_response(e)
             except ValueError as ve:
                 return Response({
                     "error": "Generation failed",
@@ -256,13 +513,16 @@ class GenerateMCQsAPIView(APIView):
 
         finally:
             # Cleanup
-            if 'fs' in locals() and 'filename' in locals():
+            if 'document' in locals():
                 try:
-                    fs.delete(filename)
+                    document.close()
                 except Exception as e:
-                    logger.error(f"Error cleaning up file: {str(e)}")
+                    logger.error(f"Error releasing upload: {str(e)}")
 
 class GenerateFlashcardsAPIView(APIView):
+    @llm_client_from_request
+    @llm_cache_bypass_from_request
+    @llm_deadline_for_request
     def post(self, request):
         file = request.FILES.get('file')
         num_cards = int(request.data.get('num_cards', 10))
@@ -286,25 +546,20 @@ class GenerateFlashcardsAPIView(APIView):
         if not model.startswith('gemini-'):
             model = 'gemini-2.0-flash'
             
-        # Create upload directory if it doesn't exist
-        upload_dir = os.path.join(settings.MEDIA_ROOT, "uploads")
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Save the uploaded file
-        file_path = os.path.join(upload_dir, file.name)
+        # Hold the upload in memory (large files are memory-mapped) instead of saving it
+        document = None
         try:
-            with open(file_path, 'wb+') as destination:
-                for chunk in file.chunks():
-                    destination.write(chunk)
+            document = ingest_upload(file)
                     
             # Log file details
-            file_size = os.path.getsize(file_path)
-            file_ext = os.path.splitext(file.name)[1].lower()
-            logger.info(f"Processing file: {file.name}, size: {file_size} bytes, type: {file_ext}")
+            logger.info(f"Processing file: {file.name}, size: {document.size} bytes, type: {document.extension}")
             
             # Generate flashcards
             flashcard_generator = FlashcardGenerator(api_key=api_key, model=model)
-            text = flashcard_generator.extract_text_from_file(file_path)
+            extracted = DOCUMENT_STORE.get_text(
+                document.digest, lambda: extract_text_sandboxed(document.source, document.extension)
+            )
+            text = extracted.text
             
             # Check if text extraction was successful
             if not text or len(text.strip()) < 50:
@@ -319,9 +574,6 @@ class GenerateFlashcardsAPIView(APIView):
             # Generate the flashcards
             flashcards_data = flashcard_generator.generate_flashcards(text, num_flashcards=num_cards)
             
-            # Clean up saved file
-            os.remove(file_path)
-            
             # Handle no flashcards case
             if not flashcards_data:
                 return Response(
@@ -334,20 +586,34 @@ class GenerateFlashcardsAPIView(APIView):
                 "flashcards": flashcards_data,
                 "count": len(flashcards_data),
                 "source_file": file.name,
-                "model_used": model
+                "model_used": model,
+                "fallback_pages": extracted.fallback_pages,
+                "degraded_pages": extracted.degraded_pages
             }, status=status.HTTP_200_OK)
             
+        except DocumentTooComplexError as e:
+            logger.warning(f"Document too complex: {file.name}: {e}")
+            return Response(
+                {"error": "Document too complex", "detail": str(e)},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        
+        except LLMCallError as e:
+            logger.warning(f"Flashcard generation gave up on Gemini: {e}")
+            return llm_error_response(e)
+            
         except Exception as e:
             logger.error(f"Error generating flashcards: {str(e)}", exc_info=True)
-            
-            # Clean up file if it exists
-            if os.path.exists(file_path):
-                os.remove(file_path)
                 
             return Response(
                 {"error": f"An error occurred: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        
+        finally:
+            # Release the in-memory buffer or spool file
+            if document is not None:
+                document.close()
 
 # New feature: File Deletion API
 class DeleteFileAPIView(APIView):
@@ -378,6 +644,7 @@ def get_video_path(topic):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@llm_client_from_request
 def process_audio_ultra_fast(request):
     """Ultra-fast audio processing optimized for Alexa-like speed"""
     start_time = time.time()
@@ -500,6 +767,7 @@ def process_audio_ultra_fast(request):
         }, status=500)
 
 @csrf_exempt  
+@llm_client_from_request
 def process_audio_streaming(request):
     """Streaming response version for real-time audio feedback"""
     if request.method != 'POST':
@@ -903,6 +1171,7 @@ def download_file(request, filename):
 class ImageAnalysisView(View):
     """Handle image upload and analysis"""
     
+    @llm_client_from_request
     def post(self, request):
         try:
             # Check if image file is present
@@ -975,6 +1244,28 @@ def health_check(request):
         'service': 'Image Processing Bot'
     })
 
+@require_http_methods(["GET"])
+def llm_metrics(request):
+    """Gemini admission queue depth and wait times per priority lane, and response cache counters"""
+    return JsonResponse({'lanes': GEMINI_GOVERNOR.metrics(), 'cache': LLM_CACHE.stats()})
+
+@require_http_methods(["GET"])
+def summary_job(request, job_id):
+    """Status of a background summary job, with its result once done"""
+    job = SUMMARY_JOBS.get(job_id)
+    if job is None:
+        return JsonResponse({'error': 'Unknown job'}, status=404)
+    return JsonResponse({'job_id': job_id, **job})
+
+@require_http_methods(["GET"])
+def model_status(request):
+    """Load and warmup times and resident memory of each model, embedding throughput, and this process's memory"""
+    return JsonResponse({
+        'models': MODEL_REGISTRY.stats(),
+        'embeddings': EMBEDDING_SERVICE.stats(),
+        'process_rss_bytes': process_rss()
+    })
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def search_paper(request):
@@ -1340,12 +1631,19 @@ def remove_duplicates(papers):
     """
     Remove duplicate papers based on title similarity
     """
+    titles = [paper.get('title', '').lower().strip() for paper in papers]
+    try:
+        # Titles that say the same thing, by embedding similarity (papers without a title are all kept)
+        titled = [i for i, title in enumerate(titles) if title]
+        kept = {titled[i] for i in EMBEDDING_SERVICE.unique([titles[i] for i in titled])}
+        return [paper for i, paper in enumerate(papers) if i in kept or not titles[i]]
+    except Exception as e:
+        logger.warning(f"Embedding title comparison unavailable, using word overlap: {e}")
+
     unique_papers = []
     seen_titles = set()
     
-    for paper in papers:
-        title = paper.get('title', '').lower().strip()
-        
+    for paper, title in zip(papers, titles):
         # Simple deduplication based on title
         is_duplicate = False
         for seen_title in seen_titles:
@@ -196,6 +196,82 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 DATA_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100MB
 
+# Extracted-document cache shared by the summarize, MCQ and flashcard endpoints
+DOCUMENT_STORE_DIR = os.path.join(BASE_DIR, 'document_store')
+DOCUMENT_STORE_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+# Uploads up to this size are parsed from memory; larger ones from a memory-mapped spool file
+DOCUMENT_SPOOL_THRESHOLD = 16 * 1024 * 1024  # 16 MB
+# Document parsing runs in supervised worker processes with these limits
+EXTRACTION_WORKERS = min(4, os.cpu_count() or 1)
+EXTRACTION_TIMEOUT = 120  # seconds per document
+EXTRACTION_MAX_RSS_BYTES = 1024 * 1024 * 1024  # 1 GB, including any page-range workers
+EXTRACTION_JOBS_PER_WORKER = 50  # Recycle workers after this many documents
+EXTRACTION_PAGE_WORKERS = 2  # Page-range processes per extraction worker (1 parses pages in-process)
+
+# Gemini quota for GEMINI_API_KEY, shared by every Gemini call in the process
+GEMINI_REQUESTS_PER_MINUTE = 15
+GEMINI_TOKENS_PER_MINUTE = 1_000_000
+# Server processes using the key; each admits calls at its share of the quota
+# (gunicorn.conf.py exports its worker count, runserver is a single process)
+GEMINI_PROCESSES = int(os.environ.get('GUNICORN_WORKERS', 1))
+# Reverse proxies in front of the server that append to X-Forwarded-For. With 0
+# the header is ignored, since a client can put any address in it.
+TRUSTED_PROXY_COUNT = 0
+
+# Gemini retries: attempts per call, backoff bounds in seconds, and the time a request may spend on Gemini
+GEMINI_MAX_ATTEMPTS = 4
+GEMINI_RETRY_BASE_DELAY = 1.0
+GEMINI_RETRY_MAX_DELAY = 30.0
+LLM_REQUEST_DEADLINE = 90.0
+
+# Summaries: partial summaries merged per call, and the most merge rounds per document
+SUMMARY_FAN_OUT = 4
+SUMMARY_MAX_DEPTH = 3
+# Estimated content tokens packed into each batch summary prompt
+SUMMARY_BATCH_TOKENS = 8000
+# Input tokens per prompt of the summarization model (gemini-2.0-flash); batches are capped below it
+SUMMARY_MODEL_INPUT_TOKENS = 1_048_576
+# Highest-ranked sentences kept from a document before summarizing, in batches: at least two
+# batches' worth, else a quarter of the document's tokens, but no more than 16 batches
+SUMMARY_EXTRACT_BATCHES = 2
+SUMMARY_EXTRACT_RATIO = 0.25
+SUMMARY_EXTRACT_MAX_BATCHES = 16
+# Preview summaries (mode=preview): pages or slides read, and the time allowed to read them
+PREVIEW_PAGES = 3
+PREVIEW_EXTRACTION_TIMEOUT = 15.0  # seconds
+# Full summaries queued from a preview: concurrent jobs per process, and the time each may spend on Gemini
+SUMMARY_JOB_WORKERS = 2
+SUMMARY_JOB_DEADLINE = 600.0  # seconds
+
+# MCQ prompts: estimated tokens of document text, chosen by maximal marginal relevance over chunk embeddings
+MCQ_CONTEXT_TOKENS = 2000
+MMR_LAMBDA = 0.7  # Relevance against novelty of each chunk picked
+# Larger MCQ requests are split into prompts of this many questions over separate parts of the document
+MCQ_QUESTIONS_PER_CALL = 10
+MCQ_MAX_CONCURRENCY = 4  # Prompts run at once per request
+MCQ_DUPLICATE_SIMILARITY = 0.9  # Cosine similarity at which two questions count as the same
+# Generated MCQs are kept per document and served to each client once before new ones are generated
+QUESTION_BANK_DIR = os.path.join(BASE_DIR, 'question_bank')
+QUESTION_BANK_LOW_WATER = 10  # Unseen questions left for a client below which the bank is topped up
+QUESTION_BANK_TOP_UP = 20  # Questions generated per background top-up
+QUESTION_BANK_MAX_QUESTIONS = 500  # Per document
+
+# Sentence embeddings: memory-mapped float16 vector cache, and micro-batching of concurrent encode calls
+EMBEDDING_CACHE_DIR = os.path.join(BASE_DIR, 'embedding_cache')
+EMBEDDING_CACHE_MAX_VECTORS = 200_000  # About 150 MB at 384 dimensions
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_BATCH_WAIT = 0.005  # seconds
+EMBEDDING_DUPLICATE_SIMILARITY = 0.9  # Flashcard questions and paper titles this similar are duplicates
+
+# Models loaded and warmed up when backend/wsgi.py is imported (before workers fork under gunicorn --preload),
+# out of 'sentence-embedder', 'whisper', 'sign-classifier' and 'hand-gesture-detector'; the rest load on first use
+MODEL_PRELOAD = []
+
+# Gemini responses are cached by (model, prompt, generation config); regenerate=true bypasses it
+LLM_CACHE_PATH = os.path.join(BASE_DIR, 'llm_cache', 'responses.sqlite3')
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+LLM_CACHE_TTL = 7 * 24 * 3600  # One week
+
 # Add MIME types
 import mimetypes
 mimetypes.add_type("video/mp4", ".mp4", True)
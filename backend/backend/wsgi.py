@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Load the models in MODEL_PRELOAD now, so workers forked from this process share them
+from app.utils.model_registry import MODEL_REGISTRY  # noqa: E402
+
+MODEL_REGISTRY.preload()
@@ -0,0 +1,12 @@
+# gunicorn -c gunicorn.conf.py backend.wsgi
+# The application (and the models in settings.MODEL_PRELOAD) is loaded once in the master
+# process before the workers are forked, so they share the model weights copy-on-write.
+import os
+
+bind = "0.0.0.0:8000"
+preload_app = True
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+# Read by settings.GEMINI_PROCESSES to split the Gemini quota between the workers
+os.environ["GUNICORN_WORKERS"] = str(workers)
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = 180  # Summaries may wait on the Gemini quota